@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Load test against local stand-ins for OpenAI and OpenWeatherMap
+Starts mock servers (see mock_servers.py), drives VirtualAssistant from
+many simulated sessions at once and reports latency percentiles,
+throughput, errors, upstream request counts and memory per turn as JSON
+
+Scenarios:
+    chat          free-form questions answered by the LLM
+    weather       weather questions for a rotating set of cities
+    capabilities  time, arithmetic and jokes (no network)
+    functions     the capability functions called directly, bypassing routing
+    faq           a small set of general questions, each asked in several wordings
+    mixed         60% chat, 25% weather, 15% capabilities
+
+Examples:
+    python bench/bench_load.py --scenario mixed --concurrency 16 --sessions 64 -o results.json
+    python bench/bench_load.py --latency 0.3 --error-rate 0.05 --stream
+    python bench/bench_load.py --baseline results.json   # exit code 1 on a regression
+    python bench/bench_load.py --latency 0.5 --fast-latency 0.05   # route simple turns to a fast local model
+    python bench/bench_load.py --scenario faq --semantic-cache      # reuse answers to reworded questions
+"""
+
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+# Add src directory to path
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from mock_servers import MockOpenAIServer, MockWeatherServer
+from virtual_assistant import TROUBLE_REPLY, WEATHER_ERROR, WEATHER_UNAVAILABLE, VirtualAssistant
+from config.settings import Config
+
+SCENARIOS = ('chat', 'weather', 'capabilities', 'functions', 'faq', 'mixed')
+CITIES = ('London', 'Paris', 'Tokyo', 'Berlin', 'Madrid', 'Rome', 'Oslo', 'Lima', 'Cairo', 'Sydney',
+          'Toronto', 'Dublin', 'Vienna', 'Prague', 'Lisbon', 'Seoul', 'Nairobi', 'Denver', 'Austin', 'Boston')
+TOPICS = ('black holes', 'sourdough bread', 'the Roman empire', 'jazz', 'volcanoes', 'chess openings',
+          'honey bees', 'the stock market', 'photosynthesis', 'marathon training')
+# Each group is one question in the kinds of wordings users send
+FAQS = (
+    ("What is the capital of Australia?", "what's the capital city of australia", "Australia's capital?"),
+    ("How many legs does a spider have?", "how many legs do spiders have", "spider legs, how many?"),
+    ("How far is the moon from earth?", "how far away is the moon from the earth", "moon distance from earth"),
+    ("What is the speed of light?", "whats the speed of light in a vacuum", "speed of light please"),
+    ("Why is the sky blue?", "why is the sky blue during the day", "tell me why the sky is blue"),
+    ("How do bees make honey?", "how do honey bees make honey", "can you explain how bees make honey"),
+)
+ERROR_REPLIES = {TROUBLE_REPLY, WEATHER_ERROR, WEATHER_UNAVAILABLE}
+
+# How much worse than the baseline a metric may get before --baseline reports a regression
+REGRESSION_CHECKS = (
+    # (path in the report, True if higher is worse)
+    (('latency_ms', 'p95'), True),
+    (('latency_ms', 'p99'), True),
+    (('throughput_per_s',), False),
+    (('memory', 'retained_bytes_per_turn'), True),
+    (('upstream', 'openai_requests_per_turn'), True),
+    (('upstream', 'weather_requests_per_turn'), True),
+)
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def latency_summary(values: list) -> dict:
+    return {
+        'p50': round(percentile(values, 0.5), 2),
+        'p95': round(percentile(values, 0.95), 2),
+        'p99': round(percentile(values, 0.99), 2),
+        'mean': round(sum(values) / len(values), 2) if values else 0.0,
+        'max': round(max(values), 2) if values else 0.0,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Workload
+# ---------------------------------------------------------------------------
+
+def make_turn(assistant: VirtualAssistant, scenario: str, rng: random.Random, index: int) -> Tuple[str, str]:
+    """Pick one turn: (kind, user text); 'functions' kinds name a capability function instead"""
+    if scenario == 'mixed':
+        scenario = rng.choices(('chat', 'weather', 'capabilities'), weights=(60, 25, 15))[0]
+    if scenario == 'chat':
+        # Numbered so answers are never served from the response cache
+        if rng.random() < 0.3:
+            return 'chat', f"Explain step by step how {rng.choice(TOPICS)} changed over the last century (question {index})"
+        return 'chat', f"Tell me something interesting about {rng.choice(TOPICS)} (question {index})"
+    if scenario == 'weather':
+        return 'weather', f"what's the weather in {rng.choice(CITIES)}"
+    if scenario == 'faq':
+        return 'faq', rng.choice(rng.choice(FAQS))
+    if scenario == 'capabilities':
+        return rng.choice((('time', "what time is it"),
+                           ('math', f"calculate {rng.randint(2, 99)} * {rng.randint(2, 99)} + 7"),
+                           ('joke', "tell me a joke")))
+    return rng.choice((('fn_weather', rng.choice(CITIES)),
+                       ('fn_math', f"calculate {rng.randint(2, 99)} * {rng.randint(2, 99)}"),
+                       ('fn_time', '')))
+
+
+def run_turn(assistant: VirtualAssistant, kind: str, text: str, history, stream: bool) -> Tuple[str, float]:
+    """Answer one turn; returns (reply, seconds to the first streamed chunk or to the whole reply)"""
+    start = time.perf_counter()
+    if kind == 'fn_weather':
+        return assistant._get_weather(f"weather in {text}", text), time.perf_counter() - start
+    if kind == 'fn_math':
+        return assistant._calculate(text), time.perf_counter() - start
+    if kind == 'fn_time':
+        return assistant._get_current_time(), time.perf_counter() - start
+    if not stream:
+        return assistant.process_text_input(text, history), time.perf_counter() - start
+
+    first_chunk = None
+    pieces = []
+    for piece in assistant.process_text_input_stream(text, history):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        pieces.append(piece)
+    return ''.join(pieces), first_chunk if first_chunk is not None else time.perf_counter() - start
+
+
+def run_session(assistant: VirtualAssistant, scenario: str, turns: int, seed: int, stream: bool) -> List[dict]:
+    """One simulated user: several turns in order with their own history"""
+    rng = random.Random(seed)
+    history = assistant.new_memory()
+    records = []
+    for index in range(turns):
+        kind, text = make_turn(assistant, scenario, rng, seed * turns + index)
+        start = time.perf_counter()
+        # An faq question opens a conversation of its own, as it would from a real user
+        turn_history = assistant.new_memory() if kind == 'faq' else history
+        reply, first = run_turn(assistant, kind, text, turn_history, stream)
+        records.append({'kind': kind, 'latency_ms': (time.perf_counter() - start) * 1000,
+                        'first_chunk_ms': first * 1000, 'error': reply in ERROR_REPLIES})
+    return records
+
+
+def run_load(assistant: VirtualAssistant, scenario: str, sessions: int, turns: int, concurrency: int,
+             stream: bool, seed: int) -> Tuple[List[dict], float]:
+    """Run all sessions, concurrency at a time; returns (turn records, wall seconds)"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load') as pool:
+        futures = [pool.submit(run_session, assistant, scenario, turns, seed + i, stream) for i in range(sessions)]
+        records = [record for future in futures for record in future.result()]
+    return records, time.perf_counter() - start
+
+
+def warm_up(assistant: VirtualAssistant):
+    """Load lazy imports and open the clients and connection pools before anything is measured"""
+    for kind, text in (('chat', "warm up"), ('weather', "weather in London"), ('time', "what time is it")):
+        run_turn(assistant, kind, text, assistant.new_memory(), False)
+
+
+def measure_memory(assistant: VirtualAssistant, scenario: str, turns: int, seed: int) -> dict:
+    """Allocation per turn for one growing session, traced separately because tracing slows everything down"""
+    rng = random.Random(seed)
+    history = assistant.new_memory()
+    warm_up(assistant)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    peaks = []
+    for index in range(turns):
+        kind, text = make_turn(assistant, scenario, rng, index)
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run_turn(assistant, kind, text, history, False)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {
+        'turns': turns,
+        'retained_bytes_per_turn': round(retained / turns),
+        'peak_bytes_per_turn_p50': round(percentile(peaks, 0.5)),
+        'peak_bytes_per_turn_max': max(peaks),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def build_report(args, records: List[dict], wall: float, memory: dict, openai_server, weather_server,
+                 local_server, assistant: VirtualAssistant) -> dict:
+    latencies = [record['latency_ms'] for record in records]
+    by_kind = {}
+    for kind in sorted({record['kind'] for record in records}):
+        kind_records = [record for record in records if record['kind'] == kind]
+        by_kind[kind] = {
+            'turns': len(kind_records),
+            'errors': sum(record['error'] for record in kind_records),
+            'latency_ms': latency_summary([record['latency_ms'] for record in kind_records]),
+        }
+    report = {
+        'config': {
+            'scenario': args.scenario, 'sessions': args.sessions, 'turns_per_session': args.turns,
+            'concurrency': args.concurrency, 'stream': args.stream, 'cache': args.cache, 'seed': args.seed,
+            'upstream_latency': args.latency, 'upstream_jitter': args.jitter, 'token_delay': args.token_delay,
+            'error_rate': args.error_rate, 'error_status': args.error_status,
+            'fast_latency': args.fast_latency, 'hedge_after': Config.LLM_HEDGE_AFTER,
+            'semantic_cache': args.semantic_cache,
+        },
+        'turns': len(records),
+        'errors': sum(record['error'] for record in records),
+        'wall_seconds': round(wall, 3),
+        'throughput_per_s': round(len(records) / wall, 2) if wall else 0.0,
+        'latency_ms': latency_summary(latencies),
+        'by_kind': by_kind,
+        'upstream': {
+            'openai_requests': openai_server.stats['requests'],
+            'openai_injected_errors': openai_server.stats['errors'],
+            'weather_requests': weather_server.stats['requests'],
+            'weather_injected_errors': weather_server.stats['errors'],
+            'openai_requests_per_turn': round(openai_server.stats['requests'] / len(records), 3),
+            'weather_requests_per_turn': round(weather_server.stats['requests'] / len(records), 3),
+        },
+        'circuits': {breaker.name: breaker.state
+                     for breaker in [*assistant.llm.breakers, *assistant.http.breakers.values()]},
+        'memory': memory,
+    }
+    if local_server is not None:
+        report['upstream'].update(local_requests=local_server.stats['requests'],
+                                  local_requests_per_turn=round(local_server.stats['requests'] / len(records), 3))
+    if assistant.semantic_cache is not None:
+        report['semantic_cache'] = dict(assistant.semantic_cache.stats)
+    if args.stream:
+        report['first_chunk_ms'] = latency_summary([record['first_chunk_ms'] for record in records])
+    return report
+
+
+def _lookup(report: dict, path: tuple):
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Metrics that got more than tolerance (a fraction) worse than in the baseline report"""
+    regressions = []
+    for path, higher_is_worse in REGRESSION_CHECKS:
+        old, new = _lookup(baseline, path), _lookup(report, path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (change > tolerance) if higher_is_worse else (change < -tolerance):
+            regressions.append(f"{'.'.join(path)}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def print_summary(report: dict):
+    latency = report['latency_ms']
+    print(f"{report['turns']} turns in {report['wall_seconds']}s - {report['throughput_per_s']}/s, "
+          f"{report['errors']} errors")
+    print(f"Latency ms: p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    if 'first_chunk_ms' in report:
+        first = report['first_chunk_ms']
+        print(f"First chunk ms: p50 {first['p50']}  p95 {first['p95']}  p99 {first['p99']}")
+    for kind, entry in report['by_kind'].items():
+        print(f"  {kind:<12} {entry['turns']:>6} turns  p50 {entry['latency_ms']['p50']:>8}  "
+              f"p95 {entry['latency_ms']['p95']:>8}  errors {entry['errors']}")
+    upstream = report['upstream']
+    print(f"Upstream: {upstream['openai_requests']} OpenAI requests ({upstream['openai_injected_errors']} failed), "
+          f"{upstream['weather_requests']} weather requests ({upstream['weather_injected_errors']} failed)"
+          + (f", {upstream['local_requests']} local model requests" if 'local_requests' in upstream else ''))
+    if 'semantic_cache' in report:
+        stats = report['semantic_cache']
+        lookups = stats['hits'] + stats['misses']
+        print(f"Semantic cache: {stats['hits']}/{lookups} hits, {stats['skipped']} questions not cacheable")
+    if report['memory']:
+        memory = report['memory']
+        print(f"Memory: {memory['retained_bytes_per_turn']} bytes retained per turn, "
+              f"peak {memory['peak_bytes_per_turn_p50']} bytes per turn (p50)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=SCENARIOS, default='mixed')
+    parser.add_argument('--sessions', type=int, default=32, help="simulated users (default: 32)")
+    parser.add_argument('--turns', type=int, default=5, help="turns per session (default: 5)")
+    parser.add_argument('--concurrency', type=int, default=8, help="sessions running at once (default: 8)")
+    parser.add_argument('--stream', action='store_true', help="use the streaming API and report time to first chunk")
+    parser.add_argument('--cache', action='store_true', help="leave the response cache on (off by default)")
+    parser.add_argument('--semantic-cache', action='store_true', help="reuse answers to reworded questions")
+    parser.add_argument('--latency', type=float, default=0.1, help="mock upstream latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.05, help="extra random upstream delay, up to this many seconds")
+    parser.add_argument('--token-delay', type=float, default=0.005, help="seconds between streamed words")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of upstream requests that fail")
+    parser.add_argument('--error-status', type=int, default=500, help="status of injected failures")
+    parser.add_argument('--fast-latency', type=float,
+                        help="also mock a local model with this latency and route simple turns to it")
+    parser.add_argument('--hedge-after', type=float, default=Config.LLM_HEDGE_AFTER,
+                        help=f"seconds before a slow model call is hedged (default: {Config.LLM_HEDGE_AFTER})")
+    parser.add_argument('--memory-turns', type=int, default=50, help="turns traced for memory use (0 to skip)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-o', '--output', help="write the JSON report to this file")
+    parser.add_argument('--json', action='store_true', help="print the JSON report instead of a summary")
+    parser.add_argument('--baseline', help="earlier JSON report; exit with status 1 if a metric regressed")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed regression as a fraction (default: 0.2)")
+    parser.add_argument('--verbose', action='store_true', help="keep the assistant's logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # Injected failures would otherwise log an error per turn; they are counted in the report instead
+        for name in ('virtual_assistant', 'llm_backends', 'http_transport', 'httpx', 'openai'):
+            logging.getLogger(name).setLevel(logging.CRITICAL)
+
+    common = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                  error_status=args.error_status, seed=args.seed)
+    openai_server = MockOpenAIServer(token_delay=args.token_delay, **common).start()
+    weather_server = MockWeatherServer(**common).start()
+    local_server = None
+    Config.LLM_FAST_BACKEND = ''
+    if args.fast_latency is not None:
+        local_server = MockOpenAIServer(token_delay=args.token_delay,
+                                        **dict(common, latency=args.fast_latency, seed=args.seed + 1)).start()
+        Config.LLM_FAST_BACKEND = 'local'
+        Config.LOCAL_LLM_URL = f"{local_server.url}/v1"
+
+    Config.LLM_BACKEND = 'openai'
+    Config.LLM_HEDGE_AFTER = args.hedge_after
+    Config.OPENAI_API_KEY = 'mock-key'
+    Config.OPENAI_BASE_URL = f"{openai_server.url}/v1"
+    Config.WEATHER_API_KEY = 'mock-key'
+    Config.WEATHER_API_URL = f"{weather_server.url}/data/2.5/weather"
+    Config.CACHE_ENABLED = args.cache
+    Config.SEMANTIC_CACHE_ENABLED = args.semantic_cache
+    Config.SEMANTIC_CACHE_DIR = ''
+    Config.REMINDERS_ENABLED = False
+    Config.OPENAI_MAX_CONNECTIONS = max(Config.OPENAI_MAX_CONNECTIONS, args.concurrency)
+
+    try:
+        assistant = VirtualAssistant()
+        memory = {}
+        if args.memory_turns > 0:
+            memory = measure_memory(assistant, args.scenario, args.memory_turns, args.seed - 1)
+        # Upstream counts and circuits should describe the load run only
+        assistant = VirtualAssistant()
+        warm_up(assistant)
+        for server in (openai_server, weather_server, local_server):
+            if server is not None:
+                server.stats.update(requests=0, errors=0)
+        records, wall = run_load(assistant, args.scenario, args.sessions, args.turns, args.concurrency,
+                                 args.stream, args.seed)
+        report = build_report(args, records, wall, memory, openai_server, weather_server, local_server, assistant)
+    finally:
+        for server in (openai_server, weather_server, local_server):
+            if server is not None:
+                server.stop()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_summary(report)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Intent router benchmark
+Checks routing accuracy against routing_corpus.jsonl and measures routing cost
+as the number of registered intents grows
+
+Usage: python bench/bench_router.py [--iterations N] [--json]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add the project root (for config) and src directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from intent_router import build_default_router
+
+CORPUS_PATH = Path(__file__).parent / 'routing_corpus.jsonl'
+
+
+def load_corpus() -> list:
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check_accuracy(router, corpus: list) -> dict:
+    """Route every corpus entry and compare intent and slots with the expected values"""
+    failures = []
+    for case in corpus:
+        match = router.route(case['text'])
+        intent = match.intent if match else None
+        slots = match.slots if match else {}
+        expected_slots = case.get('slots', {})
+        if intent != case['intent'] or any(slots.get(k, '').lower() != v.lower() for k, v in expected_slots.items()):
+            failures.append({'text': case['text'], 'expected': case['intent'], 'got': intent,
+                             'expected_slots': expected_slots, 'slots': slots})
+    return {'cases': len(corpus), 'correct': len(corpus) - len(failures),
+            'accuracy': (len(corpus) - len(failures)) / len(corpus), 'failures': failures}
+
+
+def add_synthetic_intents(router, count: int):
+    """Register filler intents so the cost of extra capabilities can be measured"""
+    for i in range(count):
+        router.register(f'synthetic_{i}', keywords=[f'alpha{i}', f'bravo{i} charlie', f'delta{i}x'], weight=2)
+
+
+def time_routing(router, corpus: list, iterations: int) -> float:
+    """Average microseconds per route call"""
+    texts = [case['text'] for case in corpus]
+    router.route(texts[0])  # compile outside the timed loop
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            router.route(text)
+    return (time.perf_counter() - start) / (iterations * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    results = {'accuracy': check_accuracy(build_default_router(), corpus), 'timings_us': {}}
+
+    for extra in (0, 10, 50, 100):
+        router = build_default_router()
+        add_synthetic_intents(router, extra)
+        results['timings_us'][len(router.intents)] = round(time_routing(router, corpus, args.iterations), 2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    accuracy = results['accuracy']
+    print(f"Routing accuracy: {accuracy['correct']}/{accuracy['cases']} ({accuracy['accuracy']:.1%})")
+    for failure in accuracy['failures']:
+        print(f"  ✗ {failure['text']!r}: expected {failure['expected']} {failure['expected_slots']}, "
+              f"got {failure['got']} {failure['slots']}")
+    print("\nRouting cost per input:")
+    for intents, micros in results['timings_us'].items():
+        print(f"  {intents:>4} intents: {micros:6.2f} µs")
+
+    if accuracy['failures']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
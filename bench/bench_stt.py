@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Speech-to-text benchmark
+Decodes recorded WAV fixtures the way voice mode does (energy segmentation,
+chunk-by-chunk decoding, early endpointing) and reports accuracy, decoding
+cost and how long after the end of speech each transcript is ready
+
+Fixtures: a directory of 16-bit WAV files, each next to a .txt file with the
+reference transcript (e.g. weather_london.wav + weather_london.txt). Recordings
+of real speech give the most meaningful numbers; --generate renders a starter
+set of typical requests with the assistant's text-to-speech voice instead.
+
+Usage: python bench/bench_stt.py [--fixtures DIR] [--backend vosk|google] [--no-early-endpoint] [--json]
+       python bench/bench_stt.py --generate [DIR]   # write spoken fixtures (default: bench/fixtures/stt)
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+import wave
+from pathlib import Path
+
+# Add the project root (for config) and src directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from audio_capture import WavFileSource, create_segmenter
+from stt_backends import Transcription, create_recognizer
+from config.settings import Config
+
+DEFAULT_FIXTURES = Path(__file__).parent / 'fixtures' / 'stt'
+
+# (fixture name, what is said) for --generate
+PHRASES = (
+    ('weather_london', "what's the weather in london"),
+    ('time', "what time is it"),
+    ('reminder', "remind me to call mom in ten minutes"),
+    ('joke', "tell me a joke"),
+    ('math', "what is twelve times eight"),
+    ('question', "how far away is the moon"),
+)
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance divided by the reference length"""
+    ref = re.findall(r"[\w']+", reference.lower())
+    hyp = re.findall(r"[\w']+", hypothesis.lower())
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(1, len(ref))
+
+
+def generate_fixtures(directory: Path) -> int:
+    """Render PHRASES with the assistant's TTS into directory as WAV + transcript pairs; returns how many"""
+    from voice_interface import VoiceInterface
+
+    voice = VoiceInterface(use_microphone=False)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = 0
+    for name, text in PHRASES:
+        rendered = voice._render(text)
+        if rendered is None:
+            print(f"Skipping {name}: the speech engine didn't produce 16-bit WAV audio", file=sys.stderr)
+            continue
+        pcm, sample_rate = rendered
+        # Lead-in silence so the segmenter sees speech start, as it would from a microphone
+        lead_in = bytes(2 * int(sample_rate * 0.3))
+        with wave.open(str(directory / f'{name}.wav'), 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(lead_in + pcm)
+        (directory / f'{name}.txt').write_text(text + '\n', encoding='utf-8')
+        written += 1
+    return written
+
+
+def decode_fixture(recognizer, path: Path, early_endpoint: float) -> dict:
+    """Run one WAV file through segmentation and the recognizer, timing everything on the audio clock"""
+    # Enough trailing silence for the pause threshold to end the last utterance
+    source = WavFileSource([str(path)], trailing_silence=Config.VOICE_PAUSE_THRESHOLD + 0.5)
+    chunk_seconds = source.chunk_size / source.sample_rate
+    segmenter = create_segmenter(source.sample_rate, source.sample_width, source.chunk_size)
+
+    texts, delays = [], []
+    compute = 0.0
+    audio_time = 0.0
+    last_loud_time = 0.0
+    early = 0
+    transcription = None
+
+    def finalize():
+        nonlocal compute
+        start = time.perf_counter()
+        text = transcription.finish()
+        finish_seconds = time.perf_counter() - start
+        compute += finish_seconds
+        if text:
+            texts.append(text)
+        # Audio that had to pass after the last word, plus the work left once it had
+        delays.append(audio_time - last_loud_time + finish_seconds)
+
+    for chunk in source.chunks():
+        audio_time += chunk_seconds
+        was_in_speech = segmenter.in_speech
+        started, utterance = segmenter.process(chunk)
+        if segmenter.last_loud:
+            last_loud_time = audio_time
+
+        if started:
+            transcription = Transcription(recognizer, source.sample_rate, source.sample_width, chunk_seconds,
+                                          early_endpoint)
+            pieces = [(piece, False) for piece in segmenter.speech_chunks[:-1]] + [(chunk, True)]
+        elif was_in_speech and transcription is not None:
+            pieces = [(chunk, segmenter.last_loud)]
+        else:
+            continue
+
+        start = time.perf_counter()
+        settled = False
+        for piece, loud in pieces:
+            settled = transcription.feed(piece, loud)
+        compute += time.perf_counter() - start
+
+        if settled:
+            early += 1
+            finalize()
+            transcription = None
+            segmenter.cut()
+        elif utterance is not None:
+            finalize()
+            transcription = None
+        elif was_in_speech and not segmenter.in_speech:
+            transcription = None  # too short to be speech
+
+    reference = path.with_suffix('.txt').read_text(encoding='utf-8').strip()
+    hypothesis = ' '.join(texts)
+    return {
+        'fixture': path.name,
+        'reference': reference,
+        'hypothesis': hypothesis,
+        'wer': round(word_error_rate(reference, hypothesis), 3),
+        'audio_seconds': round(audio_time, 2),
+        'compute_seconds': round(compute, 3),
+        'early_endpoints': early,
+        'latency_ms': [round(delay * 1000, 1) for delay in delays],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', type=Path, default=DEFAULT_FIXTURES, help="directory of .wav + .txt pairs")
+    parser.add_argument('--backend', default=Config.STT_BACKEND, help="speech recognition backend (default: STT_BACKEND)")
+    parser.add_argument('--no-early-endpoint', action='store_true', help="always wait for the full pause threshold")
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    parser.add_argument('--generate', type=Path, nargs='?', const=DEFAULT_FIXTURES, metavar='DIR',
+                        help="write spoken fixtures to DIR (default: bench/fixtures/stt) and exit")
+    args = parser.parse_args()
+
+    if args.generate:
+        try:
+            written = generate_fixtures(args.generate)
+        except Exception as e:
+            print(f"Could not render fixtures (needs pyttsx3 or macOS 'say'): {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Wrote {written} fixtures to {args.generate}")
+        return
+
+    fixtures = sorted(path for path in args.fixtures.glob('*.wav') if path.with_suffix('.txt').exists())
+    if not fixtures:
+        print(f"No fixtures in {args.fixtures} (expected name.wav files with name.txt transcripts; "
+              f"create a starter set with --generate)", file=sys.stderr)
+        sys.exit(1)
+
+    voice = None
+    if args.backend == 'google':
+        from voice_interface import VoiceInterface
+        voice = VoiceInterface(use_microphone=False)
+    recognizer = create_recognizer(voice, args.backend)
+    early_endpoint = 0 if args.no_early_endpoint else Config.STT_EARLY_ENDPOINT
+
+    results = [decode_fixture(recognizer, path, early_endpoint) for path in fixtures]
+    audio = sum(result['audio_seconds'] for result in results)
+    compute = sum(result['compute_seconds'] for result in results)
+    latencies = sorted(latency for result in results for latency in result['latency_ms'])
+    summary = {
+        'backend': recognizer.name,
+        'early_endpoint_seconds': early_endpoint,
+        'fixtures': len(results),
+        'mean_wer': round(sum(result['wer'] for result in results) / len(results), 3),
+        'real_time_factor': round(compute / audio, 3) if audio else None,
+        'latency_ms_p50': latencies[len(latencies) // 2] if latencies else None,
+        'latency_ms_p95': latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None,
+    }
+
+    if args.json:
+        print(json.dumps({'summary': summary, 'results': results}, indent=2))
+        return
+
+    for result in results:
+        print(f"{result['fixture']:<32} WER {result['wer']:5.1%}  latency {result['latency_ms']} ms  "
+              f"{result['hypothesis']!r}")
+    print(f"\nBackend: {summary['backend']} (early endpoint after {early_endpoint}s of stable partials)")
+    print(f"Mean WER: {summary['mean_wer']:.1%}   real-time factor: {summary['real_time_factor']}")
+    print(f"Latency after end of speech: p50 {summary['latency_ms_p50']} ms, p95 {summary['latency_ms_p95']} ms")
+
+
+if __name__ == "__main__":
+    main()
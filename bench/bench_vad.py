@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Voice activity detection benchmark
+Runs noisy WAV fixtures through each segmenter and reports missed and split
+utterances, false alarms, how long after the end of speech each utterance
+is ended, and CPU time per second of audio
+
+Fixtures: a directory of 16-bit mono WAV files, each next to a .json file
+listing the spoken stretches, e.g. {"utterances": [[1.0, 2.6], [4.5, 6.1]]}
+(seconds; a short pause inside an utterance is part of it). Without
+--fixtures a synthetic set is generated: harmonic speech-like phrases over
+white, pink, hum, fan and suddenly-louder noise at several SNRs.
+
+Usage: python bench/bench_vad.py [--fixtures DIR | --generate DIR] [--json]
+"""
+
+import argparse
+import json
+import math
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root (for config) and src directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from audio_capture import EnergySegmenter, SpectralSegmenter, WavFileSource, chunk_rms
+from config.settings import Config
+
+SAMPLE_RATE = 16000
+NOISES = ('white', 'pink', 'hum', 'fan', 'step')
+SNRS_DB = (15, 5)
+SPEECH_RMS = 3000
+
+
+# ---------------------------------------------------------------------------
+# Synthetic fixtures
+# ---------------------------------------------------------------------------
+
+def _phrase(rng: np.random.Generator, duration: float) -> np.ndarray:
+    """A voiced, speech-like phrase: a gliding harmonic tone shaped by formants and syllable envelopes"""
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = rng.uniform(100, 200) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.5, 1.5) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    formants = rng.uniform([400, 1200, 2300], [800, 1800, 3000])
+    signal = np.zeros_like(t)
+    for k in range(1, 25):
+        frequency = k * f0.mean()
+        if frequency > 4000:
+            break
+        gain = sum(math.exp(-((frequency - formant) / 250) ** 2) for formant in formants) + 0.05
+        signal += gain / k ** 0.5 * np.sin(k * phase)
+    syllables = np.clip(np.sin(np.pi * rng.uniform(4, 5.5) * t), 0, None) ** 0.5
+    signal *= np.maximum(syllables, 0.1)
+    return signal * SPEECH_RMS / np.sqrt(np.mean(signal ** 2))
+
+
+def _noise(rng: np.random.Generator, kind: str, samples: int) -> np.ndarray:
+    white = rng.standard_normal(samples)
+    if kind in ('white', 'step'):
+        noise = white
+    elif kind == 'pink':
+        spectrum = np.fft.rfft(white)
+        spectrum /= np.sqrt(np.maximum(np.fft.rfftfreq(samples, 1 / SAMPLE_RATE), 20))
+        noise = np.fft.irfft(spectrum, samples)
+    elif kind == 'hum':
+        t = np.arange(samples) / SAMPLE_RATE
+        noise = sum(np.sin(2 * np.pi * 50 * k * t) / k for k in (1, 2, 3)) + 0.05 * white
+    elif kind == 'fan':
+        spectrum = np.fft.rfft(white)
+        spectrum /= np.maximum(np.fft.rfftfreq(samples, 1 / SAMPLE_RATE), 20)
+        noise = np.fft.irfft(spectrum, samples)
+    else:
+        raise ValueError(f"Unknown noise type {kind}")
+    noise /= np.sqrt(np.mean(noise ** 2))
+    if kind == 'step':
+        # The noise gets twice as loud part way through (a fan or a car starting)
+        noise[int(samples * 0.35):] *= 2
+    return noise
+
+
+def generate_fixtures(directory: Path, seed: int = 7) -> int:
+    """Write synthetic noisy fixtures with their labels into directory; returns how many"""
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    count = 0
+    for noise_kind in NOISES:
+        for snr in SNRS_DB:
+            pieces, utterances, at = [np.zeros(int(1.5 * SAMPLE_RATE))], [], 1.5
+            for _ in range(3):
+                first, second = _phrase(rng, rng.uniform(0.6, 1.2)), _phrase(rng, rng.uniform(0.4, 0.9))
+                pause = np.zeros(int(rng.uniform(0.15, 0.3) * SAMPLE_RATE))  # a breath inside the utterance
+                utterance = np.concatenate([first, pause, second])
+                utterances.append([round(at, 3), round(at + len(utterance) / SAMPLE_RATE, 3)])
+                gap = np.zeros(int(rng.uniform(1.8, 2.5) * SAMPLE_RATE))
+                pieces += [utterance, gap]
+                at += (len(utterance) + len(gap)) / SAMPLE_RATE
+            clean = np.concatenate(pieces)
+            noise = _noise(rng, noise_kind, len(clean)) * SPEECH_RMS / 10 ** (snr / 20)
+            audio = np.clip(clean + noise, -32768, 32767).astype('<i2')
+
+            name = f"{noise_kind}_snr{snr}"
+            with wave.open(str(directory / f"{name}.wav"), 'wb') as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(SAMPLE_RATE)
+                wav.writeframes(audio.tobytes())
+            (directory / f"{name}.json").write_text(json.dumps({'utterances': utterances}))
+            count += 1
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------------
+
+def _calibrated_threshold(source: WavFileSource) -> float:
+    """What adjust_for_ambient_noise(duration=1) settles on: about 1.5x the RMS of the first second"""
+    chunks = []
+    for chunk in source.chunks():
+        chunks.append(chunk_rms(chunk))
+        if len(chunks) * source.chunk_size >= source.sample_rate:
+            break
+    return 1.5 * sum(chunks) / len(chunks)
+
+
+def make_segmenter(kind: str, source: WavFileSource) -> EnergySegmenter:
+    common = dict(pause_threshold=Config.VOICE_PAUSE_THRESHOLD, phrase_limit=Config.VOICE_PHRASE_LIMIT)
+    if kind == 'energy':
+        return EnergySegmenter(source.sample_rate, source.sample_width, source.chunk_size,
+                               energy_threshold=Config.VOICE_ENERGY_THRESHOLD, **common)
+    if kind == 'energy-calibrated':
+        return EnergySegmenter(source.sample_rate, source.sample_width, source.chunk_size,
+                               energy_threshold=_calibrated_threshold(source), **common)
+    return SpectralSegmenter(source.sample_rate, source.sample_width, source.chunk_size,
+                             end_silence=Config.VAD_END_SILENCE, margin_db=Config.VAD_MARGIN_DB,
+                             noise_window=Config.VAD_NOISE_WINDOW, **common)
+
+
+def evaluate(kind: str, path: Path) -> dict:
+    """Segment one fixture and score the utterances against its labels, on the audio clock"""
+    labels = json.loads(path.with_suffix('.json').read_text())['utterances']
+    source = WavFileSource([str(path)], trailing_silence=Config.VOICE_PAUSE_THRESHOLD + 0.5)
+    segmenter = make_segmenter(kind, source)
+    chunk_seconds = source.chunk_size / source.sample_rate
+
+    detections = []
+    audio_time = 0.0
+    started_at = None
+    cpu = 0.0
+    for chunk in source.chunks():
+        start = time.process_time()
+        started, utterance = segmenter.process(chunk)
+        cpu += time.process_time() - start
+        audio_time += chunk_seconds
+        if started:
+            started_at = audio_time - chunk_seconds
+        elif utterance is not None:
+            detections.append((started_at, audio_time))
+        elif started_at is not None and not segmenter.in_speech:
+            started_at = None  # dropped as too short
+
+    missed = split = 0
+    end_delays = []
+    matched = set()
+    for label_start, label_end in labels:
+        overlapping = [i for i, (start, end) in enumerate(detections) if start < label_end and end > label_start]
+        matched.update(overlapping)
+        if not overlapping:
+            missed += 1
+            continue
+        split += len(overlapping) > 1
+        end_delays.append(detections[overlapping[-1]][1] - label_end)
+
+    return {
+        'fixture': path.name,
+        'utterances': len(labels),
+        'missed': missed,
+        'split': split,
+        'false_alarms': len(detections) - len(matched),
+        'end_delay_ms': [round(delay * 1000) for delay in end_delays],
+        'audio_seconds': round(audio_time, 2),
+        'cpu_seconds': cpu,
+    }
+
+
+def summarize(kind: str, results: list) -> dict:
+    delays = sorted(delay for result in results for delay in result['end_delay_ms'])
+    audio = sum(result['audio_seconds'] for result in results)
+    return {
+        'segmenter': kind,
+        'utterances': sum(result['utterances'] for result in results),
+        'missed': sum(result['missed'] for result in results),
+        'split': sum(result['split'] for result in results),
+        'false_alarms': sum(result['false_alarms'] for result in results),
+        'end_delay_ms_p50': delays[len(delays) // 2] if delays else None,
+        'end_delay_ms_p95': delays[min(len(delays) - 1, int(0.95 * len(delays)))] if delays else None,
+        'cpu_ms_per_audio_second': round(1000 * sum(result['cpu_seconds'] for result in results) / audio, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', type=Path, help="directory of .wav + .json pairs (default: synthetic set)")
+    parser.add_argument('--generate', type=Path, metavar='DIR', help="write the synthetic fixtures to DIR and exit")
+    parser.add_argument('--segmenters', default='energy,energy-calibrated,spectral',
+                        help="comma-separated: energy, energy-calibrated, spectral")
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    if args.generate:
+        print(f"Wrote {generate_fixtures(args.generate)} fixtures to {args.generate}")
+        return
+
+    temporary = None
+    fixture_dir = args.fixtures
+    if fixture_dir is None:
+        temporary = tempfile.TemporaryDirectory()
+        fixture_dir = Path(temporary.name)
+        generate_fixtures(fixture_dir)
+
+    fixtures = sorted(path for path in fixture_dir.glob('*.wav') if path.with_suffix('.json').exists())
+    if not fixtures:
+        print(f"No fixtures in {fixture_dir} (expected name.wav files with name.json labels)", file=sys.stderr)
+        sys.exit(1)
+
+    report = {}
+    for kind in args.segmenters.split(','):
+        results = [evaluate(kind, path) for path in fixtures]
+        report[kind] = {'summary': summarize(kind, results), 'results': results}
+    if temporary is not None:
+        temporary.cleanup()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{len(fixtures)} fixtures, {report[kind]['summary']['utterances']} utterances\n")
+    print(f"{'segmenter':<18} {'missed':>6} {'split':>6} {'false':>6} {'end p50':>9} {'end p95':>9} {'CPU ms/s':>9}")
+    for kind, entry in report.items():
+        summary = entry['summary']
+        print(f"{kind:<18} {summary['missed']:>6} {summary['split']:>6} {summary['false_alarms']:>6} "
+              f"{summary['end_delay_ms_p50']!s:>9} {summary['end_delay_ms_p95']!s:>9} "
+              f"{summary['cpu_ms_per_audio_second']:>9}")
+    print("\nend p50/p95: milliseconds from the end of speech to the end of the utterance")
+
+
+if __name__ == "__main__":
+    main()
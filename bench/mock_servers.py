@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the OpenAI chat completions and OpenWeatherMap APIs
+Used by bench_load.py; also runnable on their own to point the assistant at
+(OPENAI_BASE_URL=http://127.0.0.1:8765/v1, WEATHER_API_URL=http://127.0.0.1:8766/data/2.5/weather)
+
+Both servers add latency (a base plus random jitter) and can inject errors
+on a fraction of requests, answering with error_status as a real provider
+would under load (429 comes with a Retry-After header).
+
+Usage: python bench/mock_servers.py [--openai-port 8765] [--weather-port 8766] [--latency 0.2] [--error-rate 0.0]
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Cities the weather mock has no data for, answered with 404 like the real API
+UNKNOWN_CITIES = ('atlantis', 'nowhere')
+CONDITIONS = ('clear sky', 'few clouds', 'light rain', 'overcast clouds', 'mist', 'light snow')
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is normal, e.g. after an error response
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class MockServer(ABC):
+    """A threaded HTTP server on 127.0.0.1 with injected latency and errors"""
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stats = {'requests': 0, 'errors': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real APIs
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+        self.httpd = _QuietHTTPServer(('127.0.0.1', port), Handler)
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str):
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.stats['errors'] += 1
+        time.sleep(delay)
+
+        if fail:
+            headers = {'Retry-After': '0.1'} if self.error_status == 429 else {}
+            self.send_json(handler, self.error_status, {'error': {'message': 'injected failure'}}, headers)
+            return
+        self.respond(handler, method, urlsplit(handler.path), body)
+
+    @abstractmethod
+    def respond(self, handler: BaseHTTPRequestHandler, method: str, url, body: bytes):
+        """Answer a request that passed the latency and error injection"""
+
+    @staticmethod
+    def send_json(handler: BaseHTTPRequestHandler, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+class MockOpenAIServer(MockServer):
+    """POST /v1/chat/completions, streamed or not; the answer is a few sentences about the last user message.
+
+    latency is the time to the first token; streamed answers then arrive
+    one word every token_delay seconds.
+    """
+
+    def __init__(self, *args, token_delay: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token_delay = token_delay
+
+    def respond(self, handler, method, url, body):
+        if method != 'POST' or not url.path.endswith('/chat/completions'):
+            self.send_json(handler, 404, {'error': {'message': f'no route for {url.path}'}})
+            return
+
+        request = json.loads(body or b'{}')
+        messages = request.get('messages', [])
+        question = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+        answer = (f"Here is a short answer about {question.strip()[:60].rstrip('?.!')}. "
+                  f"It draws on {len(messages)} messages of context. Let me know if you want more detail!")
+        prompt_tokens = sum(len(str(m.get('content', ''))) for m in messages) // 4
+        completion_tokens = len(answer) // 4
+        model = request.get('model', 'mock')
+
+        if not request.get('stream'):
+            self.send_json(handler, 200, {
+                'id': 'chatcmpl-mock', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                          'total_tokens': prompt_tokens + completion_tokens},
+            })
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        words = answer.split(' ')
+        for i, word in enumerate(words):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = {'id': 'chatcmpl-mock', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': {'content': word + (' ' if i < len(words) - 1 else '')},
+                                                  'finish_reason': None}]}
+            self._write_chunk(handler, f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        if (request.get('stream_options') or {}).get('include_usage'):
+            usage = {'id': 'chatcmpl-mock', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [],
+                     'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                               'total_tokens': prompt_tokens + completion_tokens}}
+            self._write_chunk(handler, f"data: {json.dumps(usage)}\n\n".encode('utf-8'))
+        self._write_chunk(handler, b"data: [DONE]\n\n")
+        self._write_chunk(handler, b'')
+
+    @staticmethod
+    def _write_chunk(handler, data: bytes):
+        handler.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        handler.wfile.flush()
+
+
+class MockWeatherServer(MockServer):
+    """GET /data/2.5/weather?q=<city> in the OpenWeatherMap format, with stable made-up readings per city"""
+
+    def respond(self, handler, method, url, body):
+        if method != 'GET' or not url.path.endswith('/weather'):
+            self.send_json(handler, 404, {'cod': '404', 'message': f'no route for {url.path}'})
+            return
+        query = parse_qs(url.query)
+        if not query.get('appid'):
+            self.send_json(handler, 401, {'cod': 401, 'message': 'Invalid API key.'})
+            return
+        city = query.get('q', [''])[0].strip()
+        if not city or city.lower() in UNKNOWN_CITIES:
+            self.send_json(handler, 404, {'cod': '404', 'message': 'city not found'})
+            return
+
+        seed = zlib.crc32(city.lower().encode('utf-8'))
+        self.send_json(handler, 200, {
+            'name': city.title(),
+            'sys': {'country': 'XX'},
+            'main': {'temp': round(-5 + seed % 350 / 10, 1), 'humidity': seed % 100},
+            'weather': [{'description': CONDITIONS[seed % len(CONDITIONS)]}],
+            'cod': 200,
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--openai-port', type=int, default=8765)
+    parser.add_argument('--weather-port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds before each response (default: 0.2)")
+    parser.add_argument('--jitter', type=float, default=0.05, help="extra random delay, up to this many seconds")
+    parser.add_argument('--token-delay', type=float, default=0.02, help="seconds between streamed words")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument('--error-status', type=int, default=500, help="status of injected failures")
+    args = parser.parse_args()
+
+    common = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, error_status=args.error_status)
+    openai_server = MockOpenAIServer(args.openai_port, token_delay=args.token_delay, **common).start()
+    weather_server = MockWeatherServer(args.weather_port, **common).start()
+    print(f"OPENAI_BASE_URL={openai_server.url}/v1")
+    print(f"WEATHER_API_URL={weather_server.url}/data/2.5/weather")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        openai_server.stop()
+        weather_server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 # Load environment variables
 load_dotenv()
 
@@ -8,16 +10,121 @@ class Config:
     # API Keys
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None  # Optional OpenAI-compatible endpoint
     
     # Assistant Settings
     ASSISTANT_NAME = os.getenv('ASSISTANT_NAME', 'Assistant')
     VOICE_RATE = int(os.getenv('ASSISTANT_VOICE_RATE', 200))
     VOICE_VOLUME = float(os.getenv('ASSISTANT_VOICE_VOLUME', 0.8))
+    STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', 'true').lower() == 'true'  # Print/speak replies as they are generated
+    
+    # Language Model Settings (src/llm_backends.py)
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai').lower()  # 'openai' (or any compatible server), 'local' or 'fake'
+    LLM_FAST_BACKEND = os.getenv('LLM_FAST_BACKEND', '').lower()  # Cheaper backend for short, simple turns (empty = none)
+    OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+    OPENAI_FAST_MODEL = os.getenv('OPENAI_FAST_MODEL', 'gpt-4o-mini')  # Used when LLM_FAST_BACKEND=openai
+    LOCAL_LLM_URL = os.getenv('LOCAL_LLM_URL', 'http://127.0.0.1:8081/v1')  # OpenAI-compatible local server, e.g. llama-server
+    LOCAL_LLM_MODEL = os.getenv('LOCAL_LLM_MODEL', 'local')
+    LOCAL_LLM_TIMEOUT = float(os.getenv('LOCAL_LLM_TIMEOUT', 10))  # Seconds; fails over instead of retrying
+    FAKE_LLM_LATENCY = float(os.getenv('FAKE_LLM_LATENCY', 0))  # Seconds before the fake backend answers
+    LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', 150))  # Reply length limit
+    LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE', 0.7))
+    LLM_SIMPLE_MAX_WORDS = int(os.getenv('LLM_SIMPLE_MAX_WORDS', 12))  # Longer turns always go to the main backend
+    LLM_HEDGE_AFTER = float(os.getenv('LLM_HEDGE_AFTER', 1.5))  # Seconds without an answer (first token) before also asking the other backend (0 = off)
     
     # Voice Recognition Settings
     VOICE_TIMEOUT = int(os.getenv('VOICE_TIMEOUT', 15))  # Time to wait for speech to start
     VOICE_PHRASE_LIMIT = int(os.getenv('VOICE_PHRASE_LIMIT', 15))  # Max phrase length
     VOICE_PAUSE_THRESHOLD = float(os.getenv('VOICE_PAUSE_THRESHOLD', 1.0))  # Silence before phrase end
+    VOICE_ENERGY_THRESHOLD = float(os.getenv('VOICE_ENERGY_THRESHOLD', 300))  # Minimum audio energy counted as speech
+    VOICE_BARGE_IN = os.getenv('VOICE_BARGE_IN', 'true').lower() == 'true'  # Let the user interrupt spoken answers
+    VOICE_BARGE_IN_MIN_SPEECH = float(os.getenv('VOICE_BARGE_IN_MIN_SPEECH', 0.3))  # Seconds of speech that interrupt
+    VOICE_BARGE_IN_FACTOR = float(os.getenv('VOICE_BARGE_IN_FACTOR', 2.0))  # Energy multiplier while the assistant talks
+    
+    # Voice Activity Detection
+    VAD_BACKEND = os.getenv('VAD_BACKEND', 'spectral').lower()  # 'spectral' (adaptive, needs numpy) or 'energy' (fixed threshold)
+    VAD_MARGIN_DB = float(os.getenv('VAD_MARGIN_DB', 6))  # How far above the noise floor speech must be
+    VAD_END_SILENCE = float(os.getenv('VAD_END_SILENCE', 0.5))  # Silence that ends a phrase (longer after mid-phrase pauses, up to VOICE_PAUSE_THRESHOLD)
+    VAD_NOISE_WINDOW = float(os.getenv('VAD_NOISE_WINDOW', 5))  # Seconds of audio the noise floor is estimated from
+    
+    # Speech Output Cache
+    TTS_CACHE_ENABLED = os.getenv('TTS_CACHE_ENABLED', 'true').lower() == 'true'  # Replay rendered speech instead of re-synthesizing
+    TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.join(PROJECT_ROOT, 'tts_cache'))
+    TTS_CACHE_MAX_MB = float(os.getenv('TTS_CACHE_MAX_MB', 50))  # Least recently played clips are removed beyond this
+    
+    # Speech Recognition Backend
+    STT_BACKEND = os.getenv('STT_BACKEND', 'google').lower()  # 'google' (online) or 'vosk' (offline, streaming)
+    VOSK_MODEL_PATH = os.getenv('VOSK_MODEL_PATH', os.path.join(PROJECT_ROOT, 'models', 'vosk-model-small-en-us-0.15'))
+    STT_EARLY_ENDPOINT = float(os.getenv('STT_EARLY_ENDPOINT', 0.3))  # Quiet seconds with an unchanged partial that end a phrase (0 = off)
+    
+    # Conversation Memory Settings
+    MEMORY_MAX_TOKENS = int(os.getenv('MEMORY_MAX_TOKENS', 1200))  # History tokens sent with each request
+    MEMORY_MAX_MESSAGES = int(os.getenv('MEMORY_MAX_MESSAGES', 20))  # Hard cap on remembered messages
+    MEMORY_SUMMARY_TOKENS = int(os.getenv('MEMORY_SUMMARY_TOKENS', 200))  # Size of the rolling summary
+    MEMORY_SUMMARIZER = os.getenv('MEMORY_SUMMARIZER', 'extractive').lower()  # 'extractive' or 'llm'
+    
+    # Reminder Settings
+    REMINDERS_ENABLED = os.getenv('REMINDERS_ENABLED', 'true').lower() == 'true'
+    REMINDER_DB_PATH = os.getenv('REMINDER_DB_PATH', os.path.join(PROJECT_ROOT, 'reminders.db'))
+    REMINDER_LOAD_HORIZON = float(os.getenv('REMINDER_LOAD_HORIZON', 3600))  # Seconds of reminders kept in memory
+    
+    # Response Cache Settings
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))  # In-memory LRU size
+    CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', '')  # Optional sqlite file for an on-disk tier
+    CACHE_DB_MAX_ENTRIES = int(os.getenv('CACHE_DB_MAX_ENTRIES', 10000))  # Rows kept in the on-disk tier
+    WEATHER_CACHE_TTL = float(os.getenv('WEATHER_CACHE_TTL', 600))  # Seconds, per normalized city
+    LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', 3600))  # Seconds, per prompt + history
+    SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'  # Reuse answers to reworded stand-alone questions
+    SEMANTIC_CACHE_EMBEDDER = os.getenv('SEMANTIC_CACHE_EMBEDDER', 'hashing')  # 'hashing' (built in) or 'sentence-transformers'
+    SEMANTIC_CACHE_MODEL = os.getenv('SEMANTIC_CACHE_MODEL', 'all-MiniLM-L6-v2')  # Model for the sentence-transformers embedder
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.8))  # Cosine similarity needed to reuse an answer
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 4096))
+    SEMANTIC_CACHE_MAX_WORDS = int(os.getenv('SEMANTIC_CACHE_MAX_WORDS', 20))  # Longer questions are never cached
+    SEMANTIC_CACHE_DIR = os.getenv('SEMANTIC_CACHE_DIR', '')  # Optional directory so the cache survives restarts
+    
+    # Outbound HTTP Settings (weather API and OpenAI)
+    WEATHER_API_URL = os.getenv('WEATHER_API_URL', 'https://api.openweathermap.org/data/2.5/weather')
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 2))  # Seconds to open a connection
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 5))  # Seconds to wait for a response
+    HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', 10))  # Keep-alive connections per host
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))  # Retries after the first attempt
+    HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 0.2))  # Seconds, doubled per retry with full jitter
+    HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 2))  # Cap on a single backoff
+    HTTP_RETRY_BUDGET = float(os.getenv('HTTP_RETRY_BUDGET', 0.2))  # Retries allowed per request, on average
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))  # Consecutive failures before failing fast
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', 30))  # Seconds before probing a failed provider again
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 30))  # Seconds per LLM request
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 2))  # Retries done by the openai client itself
+    OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 64))  # Pooled connections to the LLM API
+    
+    # Server Settings (src/server.py)
+    SERVER_HOST = os.getenv('SERVER_HOST', '127.0.0.1')
+    SERVER_PORT = int(os.getenv('SERVER_PORT', 8080))
+    MAX_CONCURRENT_LLM_REQUESTS = int(os.getenv('MAX_CONCURRENT_LLM_REQUESTS', 32))  # In-flight LLM calls
+    MAX_PENDING_REQUESTS = int(os.getenv('MAX_PENDING_REQUESTS', 256))  # Queued calls before rejecting
+    MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', 10000))  # Conversations cached in each worker's memory
+    SESSION_STORE = os.getenv('SESSION_STORE', 'memory')  # 'memory' (one worker) or 'sqlite' (workers sharing SESSION_DB_PATH)
+    SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', os.path.join(PROJECT_ROOT, 'sessions.db'))
+    SESSION_TTL = float(os.getenv('SESSION_TTL', 86400))  # Seconds a session may stay idle before it is removed
+    
+    # Capabilities (src/plugins.py)
+    PLUGINS_ENABLED = os.getenv('PLUGINS_ENABLED', 'true').lower() == 'true'  # Load capabilities from installed plugin packages
+    TOOL_WORKERS = int(os.getenv('TOOL_WORKERS', 8))  # Threads running the capabilities of one input together
+    
+    # Batch Settings (src/batch.py)
+    BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 8))  # Parallel session lanes
+    
+    # Telemetry (src/telemetry.py)
+    TELEMETRY_ENABLED = os.getenv('TELEMETRY_ENABLED', 'true').lower() == 'true'  # Span timings and counters
+    METRICS_PORT = int(os.getenv('METRICS_PORT', 0))  # Serve /metrics from the CLI on this port (0 = off; the server always has /metrics)
+    TRACE_FILE = os.getenv('TRACE_FILE', '')  # JSONL file for sampled traces (empty = no traces)
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.01))  # Fraction of traces written to TRACE_FILE
+    TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 3000))  # Slower traces are always written (0 = off); so are failed ones
+    TRACE_PAYLOADS = os.getenv('TRACE_PAYLOADS', 'false').lower() == 'true'  # Include inputs and replies in traces, not just their lengths
+    
+    # Startup
+    WARM_UP_IN_BACKGROUND = os.getenv('WARM_UP_IN_BACKGROUND', 'true').lower() == 'true'  # Preload heavy modules after the prompt appears
     
     # Development
     DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
@@ -26,6 +133,6 @@ class Config:
     @staticmethod
     def validate():
         """Validate required configuration"""
-        if not Config.OPENAI_API_KEY:
+        if 'openai' in (Config.LLM_BACKEND, Config.LLM_FAST_BACKEND) and not Config.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY is required. Please set it in .env file")
         return True
\ No newline at end of file
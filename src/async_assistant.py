@@ -0,0 +1,264 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, Optional
+
+from virtual_assistant import (TROUBLE_REPLY, WEATHER_ERROR, WEATHER_NEEDS_CITY, WEATHER_NOT_CONFIGURED,
+                               WEATHER_UNAVAILABLE, VirtualAssistant)
+from response_cache import make_key
+from conversation_memory import ConversationMemory
+from session_store import SessionStore
+from http_transport import AsyncCoalescer, AsyncHttpTransport, CircuitOpenError
+from llm_backends import LLMUnavailableError
+from config.settings import Config
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class AssistantBusyError(RuntimeError):
+    """Raised when too many requests are already waiting for the LLM"""
+
+
+class AsyncVirtualAssistant(VirtualAssistant):
+    """Asyncio version of the assistant that serves many conversations from one process.
+
+    Each conversation is identified by a session id and keeps its own history.
+    Histories are saved to a SessionStore after every turn, so with a shared
+    store any worker process can serve the next turn of a conversation; the
+    recently used ones are also cached in memory. Store calls run in a
+    thread, since a database store blocks.
+    Calls to the LLM are bounded by a semaphore, and new requests are rejected
+    with AssistantBusyError once too many are queued behind it. Reminders are
+    not offered: a session has no channel to announce them on once its
+    request is over.
+    """
+
+    delivers_reminders = False
+
+    def __init__(self):
+        super().__init__()
+
+        # Shares circuit breakers with the blocking transport so both agree on which providers are down
+        self.async_http = AsyncHttpTransport(breakers=self.http.breakers)
+        self.async_weather_calls = AsyncCoalescer()
+
+        # Per-session state, oldest sessions are dropped from memory first once MAX_SESSIONS is reached
+        self.session_store = SessionStore.from_config()
+        self.sessions: "OrderedDict[str, ConversationMemory]" = OrderedDict()
+        self.session_locks: Dict[str, asyncio.Lock] = {}
+
+        # Bounded concurrency and backpressure toward the LLM API
+        self.llm_semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_LLM_REQUESTS)
+        self.pending_requests = 0
+
+    async def process_text_input_async(self, user_input: str, session_id: str = 'default') -> str:
+        """Process text input for a session and return response"""
+        async with self._session_lock(session_id):
+            with telemetry.span('turn', stream=False) as span:
+                span.payload('input', user_input)
+                history = await self._get_history(session_id)
+                history.append({"role": "user", "content": user_input})
+
+                response = await self._check_capabilities_async(user_input)
+
+                if not response:
+                    response = await self._generate_ai_response_async(history)
+
+                self._remember_response(response, history)
+                await asyncio.to_thread(self.session_store.save, session_id, history)
+                span.payload('output', response)
+                return response
+
+    async def process_text_input_stream_async(self, user_input: str, session_id: str = 'default') -> AsyncIterator[str]:
+        """Process text input for a session and yield the response as it is generated"""
+        async with self._session_lock(session_id):
+            with telemetry.span('turn', stream=True) as span:
+                span.payload('input', user_input)
+                history = await self._get_history(session_id)
+                history.append({"role": "user", "content": user_input})
+
+                response = await self._check_capabilities_async(user_input)
+                parts = []
+
+                try:
+                    if response:
+                        yield response
+                    else:
+                        async with aclosing(self._generate_ai_response_stream_async(history)) as tokens:
+                            async for token in tokens:
+                                parts.append(token)
+                                yield token
+                finally:
+                    # A reply cut short (the client went away or stopped reading) is remembered as far as it got
+                    if not response:
+                        response = ''.join(parts).strip()
+                    self._remember_response(response, history)
+                    await asyncio.to_thread(self.session_store.save, session_id, history)
+                    span.payload('output', response)
+
+    async def reset_session(self, session_id: str):
+        """Forget a session's conversation history"""
+        self._drop_session(session_id)
+        await asyncio.to_thread(self.session_store.delete, session_id)
+
+    def _drop_session(self, session_id: str):
+        """Drop a session from memory; its stored history is kept"""
+        self.sessions.pop(session_id, None)
+        self.session_locks.pop(session_id, None)
+
+    async def close(self):
+        """Release network resources"""
+        await self.async_http.close()
+        await self.llm.close_async()
+        self.session_store.close()
+        if self.semantic_cache is not None:
+            self.semantic_cache.close()
+
+    def new_memory(self) -> ConversationMemory:
+        """Session memories always use the extractive summary; an LLM summary call would block the event loop"""
+        return ConversationMemory()
+
+    async def _get_history(self, session_id: str) -> ConversationMemory:
+        """Return the history for a session, loading or creating it if needed"""
+        history = self.sessions.get(session_id)
+        if history is None:
+            history = self.sessions[session_id] = self.new_memory()
+
+            # Evict the least recently used idle session to bound memory
+            if len(self.sessions) > Config.MAX_SESSIONS:
+                for old_id in list(self.sessions):
+                    lock = self.session_locks.get(old_id)
+                    if old_id != session_id and not (lock and lock.locked()):
+                        self._drop_session(old_id)
+                        break
+        else:
+            self.sessions.move_to_end(session_id)
+
+        # Also picks up turns other workers served since this one last saw the session
+        return await asyncio.to_thread(self.session_store.load, session_id, history)
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        """Lock that keeps turns within one session in order"""
+        lock = self.session_locks.get(session_id)
+        if lock is None:
+            lock = self.session_locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def _check_capabilities_async(self, user_input: str) -> Optional[str]:
+        """Check if input matches specific capabilities without blocking the event loop"""
+        match = self._route(user_input)
+
+        if match:
+            return await self.capabilities.run_async(self.capabilities.plan(user_input, match))
+
+        return None
+
+    def _reserve_llm_slot(self):
+        """Apply backpressure before queueing for the LLM semaphore"""
+        if self.pending_requests >= Config.MAX_PENDING_REQUESTS:
+            raise AssistantBusyError("Too many requests are waiting for the language model")
+        self.pending_requests += 1
+
+    async def _generate_ai_response_async(self, history: ConversationMemory) -> str:
+        """Generate AI response using the async OpenAI client"""
+        messages = self._build_messages(history)
+
+        with telemetry.span('llm', stream=False, messages=len(messages)) as span:
+            cache_key = make_key('llm', messages)
+            cached = self._cached_answer(cache_key, messages)
+            if cached is not None:
+                span.set(cached=True)
+                return cached
+
+            self._reserve_llm_slot()
+            try:
+                async with self.llm_semaphore:
+                    span.set(queued_ms=span.elapsed_ms())
+                    content = (await self.llm.complete_async(messages)).text
+
+                self._cache_answer(cache_key, messages, content)
+                return content
+
+            except LLMUnavailableError:
+                logger.warning("Language model is unavailable, not calling it")
+                span.fail('circuit_open')
+                return TROUBLE_REPLY
+            except Exception as e:
+                logger.error(f"Error generating AI response: {e}")
+                span.fail(type(e).__name__)
+                return TROUBLE_REPLY
+            finally:
+                self.pending_requests -= 1
+
+    async def _generate_ai_response_stream_async(self, history: ConversationMemory) -> AsyncIterator[str]:
+        """Generate AI response using the async OpenAI client, yielding tokens as they arrive"""
+        messages = self._build_messages(history)
+
+        with telemetry.span('llm', stream=True, messages=len(messages)) as span:
+            cache_key = make_key('llm', messages)
+            cached = self._cached_answer(cache_key, messages)
+            if cached is not None:
+                span.set(cached=True)
+                yield cached
+                return
+
+            self._reserve_llm_slot()
+            received_any = False
+            try:
+                async with self.llm_semaphore:
+                    span.set(queued_ms=span.elapsed_ms())
+                    parts = []
+                    async for token in self.llm.stream_async(messages):
+                        if not received_any:
+                            span.set(first_token_ms=span.elapsed_ms())
+                        received_any = True
+                        parts.append(token)
+                        yield token
+
+                self._cache_answer(cache_key, messages, ''.join(parts).strip())
+
+            except LLMUnavailableError:
+                logger.warning("Language model is unavailable, not calling it")
+                span.fail('circuit_open')
+                yield TROUBLE_REPLY
+            except Exception as e:
+                logger.error(f"Error streaming AI response: {e}")
+                span.fail(type(e).__name__)
+                if not received_any:
+                    yield TROUBLE_REPLY
+            finally:
+                self.pending_requests -= 1
+
+    async def _get_weather_async(self, query: str, city: Optional[str] = None) -> str:
+        """Get weather information using a shared async HTTP session"""
+        if not Config.WEATHER_API_KEY:
+            return WEATHER_NOT_CONFIGURED
+
+        city = city or self._extract_city_from_query(query)
+        if not city:
+            return WEATHER_NEEDS_CITY
+
+        cache_key = self._weather_cache_key(city)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            return await self.async_weather_calls.do(cache_key, lambda: self._fetch_weather_async(city, cache_key))
+        except CircuitOpenError:
+            return WEATHER_UNAVAILABLE
+        except Exception as e:
+            logger.error(f"Weather API error: {e}")
+            return WEATHER_ERROR
+
+    async def _fetch_weather_async(self, city: str, cache_key: str) -> str:
+        """Call the weather API through the pooled async transport and cache good answers"""
+        params = {'q': city, 'appid': Config.WEATHER_API_KEY, 'units': 'metric'}
+        status, data = await self.async_http.get_json(Config.WEATHER_API_URL, params)
+        answer = self._format_weather(city, status, data)
+
+        if status == 200:
+            self._cache_set(cache_key, answer, Config.WEATHER_CACHE_TTL)
+        return answer
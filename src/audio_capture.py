@@ -0,0 +1,398 @@
+import importlib.util
+import logging
+import math
+import threading
+import time
+import wave
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from config.settings import Config
+
+# numpy is imported on first use by SpectralSegmenter; without it the energy threshold is used
+
+logger = logging.getLogger(__name__)
+
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
+# Frames per chunk, the same as speech_recognition.Microphone
+CHUNK_SIZE = 1024
+
+
+@dataclass
+class Utterance:
+    """One stretch of speech cut out of the audio stream (16-bit mono PCM)"""
+    pcm: bytes
+    sample_rate: int
+    sample_width: int
+    ended_at: float  # time.monotonic() when the end of speech was detected
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / (self.sample_rate * self.sample_width)
+
+
+# ---------------------------------------------------------------------------
+# Sources
+# ---------------------------------------------------------------------------
+
+class MicrophoneSource:
+    """Reads raw chunks from a speech_recognition.Microphone until closed"""
+
+    def __init__(self, microphone):
+        self.microphone = microphone
+        self.sample_rate = microphone.SAMPLE_RATE
+        self.sample_width = microphone.SAMPLE_WIDTH
+        self.chunk_size = microphone.CHUNK
+        self._closed = threading.Event()
+
+    def chunks(self) -> Iterator[bytes]:
+        with self.microphone as source:
+            while not self._closed.is_set():
+                yield source.stream.read(self.chunk_size)
+
+    def close(self):
+        self._closed.set()
+
+
+class WavFileSource:
+    """Plays 16-bit PCM WAV files into the pipeline in place of a microphone.
+
+    Each file is followed by trailing_silence seconds of silence so the end of
+    the utterance is detected. With realtime=True chunks are delivered at the
+    rate a microphone would deliver them, which is needed to exercise barge-in.
+    """
+
+    def __init__(self, paths: Iterable[str], chunk_size: int = CHUNK_SIZE, realtime: bool = False,
+                 trailing_silence: float = 1.5):
+        self.paths: List[str] = list(paths)
+        if not self.paths:
+            raise ValueError("WavFileSource needs at least one file")
+        self.chunk_size = chunk_size
+        self.realtime = realtime
+        self.trailing_silence = trailing_silence
+        self.sample_rate, self.sample_width = self._format(self.paths[0])
+        self._closed = threading.Event()
+
+    @staticmethod
+    def _format(path: str) -> Tuple[int, int]:
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+            return wav.getframerate(), wav.getsampwidth()
+
+    def chunks(self) -> Iterator[bytes]:
+        chunk_seconds = self.chunk_size / self.sample_rate
+        silence = bytes(self.chunk_size * self.sample_width)
+        next_at = time.monotonic()
+
+        for path in self.paths:
+            if self._format(path) != (self.sample_rate, self.sample_width):
+                raise ValueError(f"{path}: sample rate differs from {self.paths[0]}")
+
+            with wave.open(path, 'rb') as wav:
+                channels = wav.getnchannels()
+                pieces = self._read_mono(wav, channels)
+                pieces += [silence] * math.ceil(self.trailing_silence / chunk_seconds)
+
+            for chunk in pieces:
+                if self._closed.is_set():
+                    return
+                if self.realtime:
+                    next_at += chunk_seconds
+                    time.sleep(max(0.0, next_at - time.monotonic()))
+                yield chunk
+
+    def _read_mono(self, wav: wave.Wave_read, channels: int) -> List[bytes]:
+        pieces = []
+        while True:
+            data = wav.readframes(self.chunk_size)
+            if not data:
+                return pieces
+            if channels > 1:
+                # Keep the first channel
+                data = array('h', data)[::channels].tobytes()
+            if len(data) < self.chunk_size * self.sample_width:
+                data += bytes(self.chunk_size * self.sample_width - len(data))
+            pieces.append(data)
+
+    def close(self):
+        self._closed.set()
+
+
+# ---------------------------------------------------------------------------
+# Segmentation
+# ---------------------------------------------------------------------------
+
+def chunk_rms(chunk: bytes) -> float:
+    """Root mean square energy of a chunk of 16-bit samples"""
+    samples = array('h', chunk)
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+
+class EnergySegmenter:
+    """Cuts utterances out of a chunk stream by comparing chunk energy to a threshold.
+
+    Speech starts at the first loud chunk (a little audio from before it is
+    kept) and ends after pause_threshold seconds of quiet, or when
+    phrase_limit is reached. Bursts with less than min_speech seconds of loud
+    audio (clicks, bumps) are dropped. threshold_scale raises the threshold
+    temporarily, e.g. while the assistant's own voice is playing.
+    """
+
+    def __init__(self, sample_rate: int, sample_width: int = 2, chunk_size: int = CHUNK_SIZE,
+                 energy_threshold: float = 300, pause_threshold: float = 1.0, phrase_limit: float = 15,
+                 pre_roll: float = 0.3, min_speech: float = 0.15):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.chunk_seconds = chunk_size / sample_rate
+        self.energy_threshold = energy_threshold
+        self.threshold_scale = 1.0
+        self.pause_threshold = pause_threshold
+        self.pause_chunks = max(1, math.ceil(pause_threshold / self.chunk_seconds))
+        self.limit_chunks = max(1, math.ceil(phrase_limit / self.chunk_seconds))
+        self.min_speech = min_speech
+        self._pre_roll = deque(maxlen=max(1, math.ceil(pre_roll / self.chunk_seconds)))
+        self._speech: List[bytes] = []
+        self._quiet_chunks = 0
+        self._loud_chunks = 0
+        self.last_loud = False  # whether the last chunk passed to process() was speech
+
+    @property
+    def in_speech(self) -> bool:
+        return bool(self._speech)
+
+    @property
+    def speech_duration(self) -> float:
+        """Seconds of loud audio in the current utterance"""
+        return self._loud_chunks * self.chunk_seconds
+
+    @property
+    def speech_chunks(self) -> List[bytes]:
+        """Chunks of the current utterance so far, including the pre-roll"""
+        return list(self._speech)
+
+    def reset(self):
+        self._pre_roll.clear()
+        self._speech = []
+        self._quiet_chunks = 0
+        self._loud_chunks = 0
+
+    def is_speech(self, chunk: bytes) -> bool:
+        return chunk_rms(chunk) > self.energy_threshold * self.threshold_scale
+
+    def process(self, chunk: bytes) -> Tuple[bool, Optional[Utterance]]:
+        """Feed one chunk; returns (speech started with this chunk, finished utterance or None)"""
+        loud = self.last_loud = self.is_speech(chunk)
+
+        if not self._speech:
+            if not loud:
+                self._pre_roll.append(chunk)
+                return False, None
+            self._speech = list(self._pre_roll)
+            self._pre_roll.clear()
+            self._speech.append(chunk)
+            self._loud_chunks = 1
+            self._quiet_chunks = 0
+            return True, None
+
+        self._speech.append(chunk)
+        if loud:
+            self._loud_chunks += 1
+            self._quiet_chunks = 0
+        else:
+            self._quiet_chunks += 1
+
+        if self._pause_over() or len(self._speech) >= self.limit_chunks:
+            return False, self.cut()
+
+        return False, None
+
+    def _pause_over(self) -> bool:
+        """Whether the quiet since the last speech ends the utterance"""
+        return self._quiet_chunks >= self.pause_chunks
+
+    def cut(self) -> Optional[Utterance]:
+        """End the current utterance now, e.g. once a streaming recognizer has endpointed it"""
+        if not self._speech or self.speech_duration < self.min_speech:
+            self.reset()
+            return None
+        # Trailing silence is dropped, except for a short tail
+        speech = self._speech[:len(self._speech) - max(0, self._quiet_chunks - 2)]
+        utterance = Utterance(b''.join(speech), self.sample_rate, self.sample_width, time.monotonic())
+        self.reset()
+        return utterance
+
+
+# Analysis frame length for SpectralSegmenter (each chunk is split into frames of about this size)
+FRAME_SECONDS = 0.016
+# Voiced speech has a peaky spectrum; steady noise is flat (white noise is about 0.56)
+MAX_FLATNESS = 0.45
+# Share of the energy that must fall in the speech band, which rejects hum and rumble
+MIN_BAND_RATIO = 0.3
+SPEECH_BAND = (250, 4000)
+# How often the noise floor is re-estimated from the recent frame energies
+NOISE_UPDATE_SECONDS = 0.25
+# Fastest the noise floor may rise; a louder background is followed within a few seconds
+NOISE_RISE_DB_PER_SECOND = 10.0
+# Floor for the noise estimate, so near-digital silence doesn't make every click speech
+MIN_NOISE_DB = 30.0
+# The end-of-utterance pause grows to this multiple of the longest pause already heard in the utterance
+GAP_FACTOR = 1.5
+
+
+class SpectralSegmenter(EnergySegmenter):
+    """Voice activity detection on energy and spectral shape, with a noise floor that keeps adapting.
+
+    Each chunk is viewed as a block of 16 ms frames without copying the
+    captured bytes and the energy of all frames is computed at once; frames
+    margin_db above the noise floor also get spectral flatness and
+    speech-band share. A frame is speech when it is loud enough and looks
+    voiced, so fans, hum and hiss that would pass a fixed energy threshold
+    don't open an utterance.
+
+    The noise floor is a low percentile of the frame energies over the last
+    noise_window seconds, re-estimated as audio arrives, so no up-front
+    calibration is needed. It drops immediately when the background gets
+    quieter and rises by at most NOISE_RISE_DB_PER_SECOND when it gets
+    louder, so someone talking from the first moment isn't taken for noise.
+
+    Utterances end after end_silence seconds without speech frames, measured
+    per frame. If the speaker has already paused within the utterance the
+    required silence grows to GAP_FACTOR times the longest pause, but never
+    beyond pause_threshold.
+    """
+
+    def __init__(self, sample_rate: int, sample_width: int = 2, chunk_size: int = CHUNK_SIZE,
+                 pause_threshold: float = 1.0, phrase_limit: float = 15, end_silence: float = 0.5,
+                 margin_db: float = 6.0, noise_window: float = 5.0, pre_roll: float = 0.3, min_speech: float = 0.15):
+        if sample_width != 2:
+            raise ValueError("SpectralSegmenter needs 16-bit audio")
+        import numpy as np
+        self._np = np
+        self._longest_gap = 0
+        self._quiet_frames = 0
+        super().__init__(sample_rate, sample_width, chunk_size, energy_threshold=0, pause_threshold=pause_threshold,
+                         phrase_limit=phrase_limit, pre_roll=pre_roll, min_speech=min_speech)
+
+        self.frame_size = chunk_size // max(1, round(self.chunk_seconds / FRAME_SECONDS))
+        self.frame_seconds = self.frame_size / sample_rate
+        self.end_silence = end_silence
+        self.margin_db = margin_db
+        self.noise_db = MIN_NOISE_DB
+
+        self._window = np.hanning(self.frame_size).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.frame_size, 1 / sample_rate)
+        self._band = (freqs >= SPEECH_BAND[0]) & (freqs <= SPEECH_BAND[1])
+        # Ring buffer of recent frame energies, a whole number of chunks long so chunks are written as slices
+        frames_per_chunk = chunk_size // self.frame_size
+        chunks = max(1, round(noise_window / (frames_per_chunk * self.frame_seconds)))
+        self._history = np.zeros(chunks * frames_per_chunk, dtype=np.float32)
+        self._history_pos = 0
+        self._frames_seen = 0
+        self._estimate_every = max(1, round(NOISE_UPDATE_SECONDS / self.frame_seconds))
+        self._until_estimate = 0
+
+    def reset(self):
+        super().reset()
+        self._longest_gap = 0
+        self._quiet_frames = 0
+
+    def frame_features(self, chunk: bytes):
+        """Frames of a chunk of 16-bit samples as float32 rows, and each frame's energy in dB"""
+        np = self._np
+        samples = np.frombuffer(chunk, dtype=np.int16)  # a view of the captured bytes
+        usable = len(samples) - len(samples) % self.frame_size
+        frames = samples[:usable].reshape(-1, self.frame_size).astype(np.float32)
+        energy_db = 10 * np.log10(np.einsum('ij,ij->i', frames, frames) / self.frame_size + 1e-9)
+        return frames, energy_db
+
+    def spectral_shape(self, frames):
+        """Spectral flatness and speech-band share of each frame"""
+        np = self._np
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2 + 1e-9
+        mean_power = power.mean(axis=1)
+        flatness = np.exp(np.log(power).mean(axis=1)) / mean_power
+        band_ratio = power[:, self._band].sum(axis=1) / (mean_power * power.shape[1])
+        return flatness, band_ratio
+
+    def is_speech(self, chunk: bytes) -> bool:
+        np = self._np
+        frames, energy_db = self.frame_features(chunk)
+        if not len(energy_db):
+            return False
+
+        threshold = self.noise_db + self.margin_db + 20 * math.log10(max(self.threshold_scale, 1e-3))
+        speech = energy_db > threshold
+        if speech.any():
+            # Only frames loud enough to matter pay for an FFT
+            flatness, band_ratio = self.spectral_shape(frames[speech])
+            speech[speech] = (flatness < MAX_FLATNESS) & (band_ratio > MIN_BAND_RATIO)
+        self._update_noise(energy_db)
+
+        count = len(speech)
+        loud = 2 * int(speech.sum()) >= count
+        if loud:
+            voiced = np.flatnonzero(speech)
+            if self._speech:
+                self._longest_gap = max(self._longest_gap, self._quiet_frames + int(voiced[0]))
+            self._quiet_frames = count - 1 - int(voiced[-1])
+        else:
+            self._quiet_frames += count
+        return loud
+
+    def _update_noise(self, energy_db):
+        """Add frame energies to the ring buffer and periodically re-estimate the noise floor"""
+        np = self._np
+        size = len(self._history)
+        count = len(energy_db)
+        end = self._history_pos + count
+        if end <= size:
+            self._history[self._history_pos:end] = energy_db
+        else:
+            self._history[(self._history_pos + np.arange(count)) % size] = energy_db
+        self._history_pos = end % size
+        self._frames_seen += count
+
+        self._until_estimate -= count
+        if self._until_estimate <= 0:
+            self._until_estimate = self._estimate_every
+            filled = self._history[:min(self._frames_seen, size)]
+            rank = len(filled) // 10  # 10th percentile
+            estimate = float(np.partition(filled, rank)[rank])
+            # Falls at once, rises gradually: speech right after start-up must not become the noise floor
+            rise_limit = self.noise_db + NOISE_RISE_DB_PER_SECOND * self._estimate_every * self.frame_seconds
+            self.noise_db = max(MIN_NOISE_DB, min(estimate, rise_limit))
+
+    def _pause_over(self) -> bool:
+        required = max(self.end_silence, GAP_FACTOR * self._longest_gap * self.frame_seconds)
+        return self._quiet_frames * self.frame_seconds >= min(required, self.pause_threshold)
+
+
+def spectral_vad_enabled() -> bool:
+    """Whether VAD_BACKEND selects the adaptive spectral VAD and NumPy is installed"""
+    return Config.VAD_BACKEND == 'spectral' and NUMPY_AVAILABLE
+
+
+def create_segmenter(sample_rate: int, sample_width: int = 2, chunk_size: int = CHUNK_SIZE,
+                     energy_threshold: Optional[float] = None) -> EnergySegmenter:
+    """Segmenter for VAD_BACKEND, falling back to the fixed energy threshold without NumPy"""
+    if spectral_vad_enabled():
+        return SpectralSegmenter(sample_rate, sample_width, chunk_size,
+                                 pause_threshold=Config.VOICE_PAUSE_THRESHOLD,
+                                 phrase_limit=Config.VOICE_PHRASE_LIMIT,
+                                 end_silence=Config.VAD_END_SILENCE,
+                                 margin_db=Config.VAD_MARGIN_DB,
+                                 noise_window=Config.VAD_NOISE_WINDOW)
+    if Config.VAD_BACKEND == 'spectral':
+        logger.warning("VAD_BACKEND=spectral needs numpy (pip install numpy); using the energy threshold")
+    elif Config.VAD_BACKEND != 'energy':
+        logger.warning(f"Unknown VAD_BACKEND '{Config.VAD_BACKEND}'; using the energy threshold")
+    return EnergySegmenter(sample_rate, sample_width, chunk_size,
+                           energy_threshold=energy_threshold or Config.VOICE_ENERGY_THRESHOLD,
+                           pause_threshold=Config.VOICE_PAUSE_THRESHOLD,
+                           phrase_limit=Config.VOICE_PHRASE_LIMIT)
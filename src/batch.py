@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Virtual Assistant Batch Mode
+Answer queries from a JSONL/CSV/text file (or stdin) and write JSONL results
+
+Examples:
+    python src/batch.py queries.jsonl -o answers.jsonl --workers 8
+    python src/batch.py queries.csv -o answers.jsonl --resume
+    cat questions.txt | python src/batch.py - --format text > answers.jsonl
+
+Each input record may have "id", "session_id" and "query" (or "message"/"text").
+Records of the same session are answered in order with a shared history;
+records without a session_id are independent. Without an id, the line number
+is used, which --resume relies on to skip work that is already in the output.
+Failed records, including ones the assistant could only apologize for, are
+written with an "error" and retried by --resume.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set
+
+# Add src directory to path
+sys.path.append(str(Path(__file__).parent))
+
+from virtual_assistant import TROUBLE_REPLY, WEATHER_ERROR, WEATHER_UNAVAILABLE, VirtualAssistant
+from plugins import TOOL_ERROR_REPLY, TOOL_TIMEOUT_REPLY
+from conversation_memory import ConversationMemory
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+QUERY_FIELDS = ('query', 'message', 'text')
+
+# Replies that mean the query wasn't answered, so the record is written as failed
+FAILURE_REPLIES = frozenset((TROUBLE_REPLY, WEATHER_ERROR, WEATHER_UNAVAILABLE, TOOL_ERROR_REPLY, TOOL_TIMEOUT_REPLY))
+
+
+def read_records(stream, fmt: str) -> Iterator[dict]:
+    """Yield {"id", "session_id", "query"} dicts from a JSONL, CSV or plain text stream (session_id may be None)"""
+    if fmt == 'csv':
+        rows = csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        rows = (json.loads(line) for line in stream if line.strip())
+    else:
+        rows = ({'query': line.rstrip('\n')} for line in stream if line.strip())
+
+    for line_number, row in enumerate(rows, start=1):
+        query = next((row[field] for field in QUERY_FIELDS if row.get(field)), None)
+        if not query:
+            logger.warning(f"Skipping record {line_number}: no query field")
+            continue
+        record_id = str(row.get('id') or line_number)
+        session_id = row.get('session_id')
+        yield {'id': record_id, 'session_id': str(session_id) if session_id else None, 'query': query}
+
+
+def detect_format(path: str) -> str:
+    suffix = Path(path).suffix.lower()
+    return {'.csv': 'csv', '.txt': 'text'}.get(suffix, 'jsonl')
+
+
+class ResultWriter:
+    """Thread-safe JSONL writer that flushes every line and fsyncs periodically"""
+
+    def __init__(self, stream, fsync_every: int = 100):
+        self.stream = stream
+        self.fsync_every = fsync_every
+        self.written = 0
+        self.errors = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def write(self, result: dict):
+        line = json.dumps(result, ensure_ascii=False) + '\n'
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+            self.written += 1
+            self.latencies.append(result['latency_ms'])
+            if 'error' in result:
+                self.errors += 1
+            if self.fsync_every and self.written % self.fsync_every == 0 and self.stream.fileno() > 2:
+                os.fsync(self.stream.fileno())
+
+
+class BatchRunner:
+    """Spreads sessions over worker lanes.
+
+    Each session is hashed to one lane, and each lane is a thread with its own
+    bounded queue, so turns of a session stay in order while different
+    sessions run in parallel. The bounded queues stop the reader from getting
+    far ahead of the workers on very large inputs. Only sessions with an id
+    keep a history; an independent record gets a fresh one that is dropped
+    once it is answered.
+    """
+
+    def __init__(self, assistant: VirtualAssistant, writer: ResultWriter, workers: int = 8,
+                 completed: Optional[Set[str]] = None, histories: Optional[Dict[str, ConversationMemory]] = None):
+        self.assistant = assistant
+        self.writer = writer
+        self.completed = completed or set()
+        self.histories = histories if histories is not None else {}
+        self.skipped = 0
+        self.lanes = [queue.Queue(maxsize=64) for _ in range(max(1, workers))]
+        self.threads = [
+            threading.Thread(target=self._work, args=(lane,), name=f'batch-{i}', daemon=True)
+            for i, lane in enumerate(self.lanes)
+        ]
+
+    def run(self, records: Iterator[dict]):
+        for thread in self.threads:
+            thread.start()
+
+        for record in records:
+            if record['id'] in self.completed:
+                self.skipped += 1
+                continue
+            lane = zlib.crc32((record['session_id'] or record['id']).encode('utf-8')) % len(self.lanes)
+            self.lanes[lane].put(record)
+
+        for lane in self.lanes:
+            lane.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _work(self, lane: queue.Queue):
+        while True:
+            record = lane.get()
+            if record is None:
+                return
+
+            session_id = record['session_id']
+            history = self.histories.get(session_id) if session_id else None
+            if history is None:
+                history = self.assistant.new_memory()
+                if session_id:
+                    self.histories[session_id] = history
+
+            result = dict(record)
+            start = time.perf_counter()
+            try:
+                response = self.assistant.process_text_input(record['query'], history)
+                if response in FAILURE_REPLIES:
+                    result['error'] = response
+                else:
+                    result['response'] = response
+            except Exception as e:
+                logger.error(f"Record {record['id']} failed: {e}")
+                result['error'] = str(e)
+            result['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            self.writer.write(result)
+
+
+def load_checkpoint(path: str, assistant: VirtualAssistant):
+    """Read an existing output file: completed ids, plus each session's history replayed in order"""
+    completed: Set[str] = set()
+    histories: Dict[str, ConversationMemory] = {}
+    if not os.path.exists(path):
+        return completed, histories
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            if 'response' not in result:
+                continue  # failed records are retried
+            completed.add(result['id'])
+            if not result.get('session_id'):
+                continue
+            history = histories.get(result['session_id'])
+            if history is None:
+                history = histories[result['session_id']] = assistant.new_memory()
+            history.append({"role": "user", "content": result['query']})
+            history.append({"role": "assistant", "content": result['response']})
+    return completed, histories
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    """Batch entry point"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="input file, or '-' for stdin")
+    parser.add_argument('-o', '--output', help="output JSONL file (default: stdout)")
+    parser.add_argument('--format', choices=['jsonl', 'csv', 'text'], help="input format (default: from extension)")
+    parser.add_argument('--workers', type=int, default=Config.BATCH_WORKERS, help="number of parallel session lanes")
+    parser.add_argument('--resume', action='store_true', help="skip records already answered in the output file")
+    parser.add_argument('--verbose', action='store_true', help="log every query and response")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        for name in ('virtual_assistant', 'httpx'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+
+    # Reminders would be scheduled and never delivered in a batch run
+    Config.REMINDERS_ENABLED = False
+
+    try:
+        assistant = VirtualAssistant()
+    except Exception as e:
+        print(f"Failed to start assistant: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    completed, histories = load_checkpoint(args.output, assistant) if args.resume else (set(), {})
+
+    fmt = args.format or ('jsonl' if args.input == '-' else detect_format(args.input))
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8', newline='')
+    sink = open(args.output, 'a' if args.resume else 'w', encoding='utf-8') if args.output else sys.stdout
+
+    writer = ResultWriter(sink)
+    runner = BatchRunner(assistant, writer, args.workers, completed, histories)
+
+    start = time.perf_counter()
+    try:
+        runner.run(read_records(source, fmt))
+    except KeyboardInterrupt:
+        print("\nInterrupted - rerun with --resume to continue", file=sys.stderr)
+    finally:
+        elapsed = time.perf_counter() - start
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    print(f"Answered {writer.written} queries ({writer.errors} errors, {runner.skipped} already done) "
+          f"in {elapsed:.1f}s - {writer.written / elapsed if elapsed else 0:.1f}/s, "
+          f"p50 {percentile(writer.latencies, 0.5):.0f} ms, p95 {percentile(writer.latencies, 0.95):.0f} ms",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import logging
+import re
+from collections import deque
+from typing import Callable, Deque, Iterator, List, Optional, Tuple
+
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+FIRST_SENTENCE = re.compile(r'^(.+?[.!?])(?:\s|$)', re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English text)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+class Message:
+    """One remembered message; __slots__ keep long and many histories small"""
+
+    __slots__ = ('seq', 'role', 'content', 'tokens')
+
+    def __init__(self, seq: int, role: str, content: str, tokens: int):
+        self.seq = seq
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+
+    def as_dict(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+class ConversationMemory:
+    """Conversation history bounded by a token budget.
+
+    Messages live in a deque together with their token counts, and the running
+    total is updated on every append, so no list is rebuilt per turn. When the
+    budget or the message limit is exceeded the oldest messages age out and
+    are folded into a rolling summary, which is sent to the model ahead of the
+    remaining messages.
+
+    The summarizer receives the previous summary and the aged-out messages and
+    returns the new summary. By default a cheap extractive summary is kept.
+
+    Every message gets a sequence number. Messages and summaries added since
+    the last take_unsaved() call are what a SessionStore appends after a
+    turn, and restore_message()/restore_summary() rebuild a memory from
+    those records.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, max_messages: Optional[int] = None,
+                 summary_tokens: Optional[int] = None,
+                 summarizer: Optional[Callable[[str, List[dict]], str]] = None,
+                 token_counter: Callable[[str], int] = estimate_tokens):
+        self.max_tokens = max_tokens if max_tokens is not None else Config.MEMORY_MAX_TOKENS
+        self.max_messages = max_messages if max_messages is not None else Config.MEMORY_MAX_MESSAGES
+        self.summary_tokens = summary_tokens if summary_tokens is not None else Config.MEMORY_SUMMARY_TOKENS
+        self.summarizer = summarizer or self._extractive_summary
+        self.count_tokens = token_counter
+
+        self._messages: Deque[Message] = deque()
+        self._aged: List[Message] = []
+        self.total_tokens = 0
+        self.summary = ''
+        self.next_seq = 0  # sequence number of the next message
+        self._unsaved: List[Message] = []
+        self._summary_changed = False
+
+    def append(self, message: dict):
+        """Add a message, aging out the oldest ones once over budget"""
+        record = Message(self.next_seq, message['role'], message['content'],
+                         self.count_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS)
+        self._add(record)
+        self._unsaved.append(record)
+
+        # Fold at the end of a turn so a summarizer call happens at most once per exchange
+        if self._aged and record.role == 'assistant':
+            self.fold()
+
+    def _add(self, record: Message):
+        self._messages.append(record)
+        self.total_tokens += record.tokens
+        self.next_seq = record.seq + 1
+
+        # Always keep the newest message, even if it alone exceeds the budget
+        while len(self._messages) > 1 and (self.total_tokens > self.max_tokens or len(self._messages) > self.max_messages):
+            old = self._messages.popleft()
+            self.total_tokens -= old.tokens
+            self._aged.append(old)
+
+    def fold(self):
+        """Fold aged-out messages into the rolling summary"""
+        aged, self._aged = [message.as_dict() for message in self._aged], []
+        try:
+            self.summary = self.summarizer(self.summary, aged)
+        except Exception as e:
+            logger.error(f"Conversation summary error: {e}")
+            self.summary = self._extractive_summary(self.summary, aged)
+        self._summary_changed = True
+
+    def prompt_messages(self) -> List[dict]:
+        """Messages to send to the model: summary first, then the recent history"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        messages.extend(message.as_dict() for message in self._aged)
+        messages.extend(message.as_dict() for message in self._messages)
+        return messages
+
+    def take_unsaved(self) -> Tuple[List[Message], Optional[Tuple[str, int]]]:
+        """Messages added since the last call, and (summary, first message it doesn't cover) if it changed"""
+        messages, self._unsaved = self._unsaved, []
+        summary = None
+        if self._summary_changed:
+            first = self._aged[0] if self._aged else (self._messages[0] if self._messages else None)
+            summary = (self.summary, first.seq if first else self.next_seq)
+            self._summary_changed = False
+        return messages, summary
+
+    def restore_message(self, seq: int, role: str, content: str):
+        """Add a stored message, without folding and without marking it unsaved"""
+        if seq >= self.next_seq:
+            self._add(Message(seq, role, content, self.count_tokens(content) + MESSAGE_OVERHEAD_TOKENS))
+
+    def restore_summary(self, summary: str, first_seq: int):
+        """Apply a stored summary, dropping the messages it covers"""
+        self.summary = summary
+        self._aged = [message for message in self._aged if message.seq >= first_seq]
+        while self._messages and self._messages[0].seq < first_seq:
+            self.total_tokens -= self._messages.popleft().tokens
+
+    def clear(self):
+        self._messages.clear()
+        self._aged = []
+        self.total_tokens = 0
+        self.summary = ''
+        self.next_seq = 0
+        self._unsaved = []
+        self._summary_changed = False
+
+    def _extractive_summary(self, summary: str, aged: List[dict]) -> str:
+        """Keep the first sentence of each aged message, dropping the oldest lines beyond summary_tokens"""
+        lines = summary.splitlines() if summary else []
+        for message in aged:
+            content = ' '.join(message['content'].split())
+            first = FIRST_SENTENCE.match(content)
+            text = first.group(1) if first else content
+            if len(text) > 160:
+                text = text[:157] + '...'
+            speaker = 'User' if message['role'] == 'user' else 'Assistant'
+            lines.append(f"- {speaker}: {text}")
+
+        while len(lines) > 1 and self.count_tokens('\n'.join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return '\n'.join(lines)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[dict]:
+        return (message.as_dict() for message in self._messages)
+
+    def __getitem__(self, index: int) -> dict:
+        return self._messages[index].as_dict()
@@ -0,0 +1,403 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from config.settings import Config
+
+# requests, aiohttp and httpx are imported on first use to keep startup fast
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class TransportError(RuntimeError):
+    """Raised when an outbound request fails after retries"""
+
+
+class CircuitOpenError(TransportError):
+    """Raised without touching the network while a provider's circuit is open"""
+
+
+class RetryableStatusError(TransportError):
+    """The provider kept answering with a retryable status"""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+# Connection and timeout errors of the optional client libraries, by (package, class name) so none is imported here
+TRANSPORT_ERRORS = frozenset({
+    ('requests', 'ConnectionError'), ('requests', 'Timeout'),
+    ('aiohttp', 'ClientConnectionError'), ('aiohttp', 'ClientPayloadError'),
+    ('httpx', 'TransportError'), ('openai', 'APIConnectionError'),
+    ('asyncio', 'TimeoutError'),
+})
+
+
+def response_status(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an error raised for a response, None if no response came back"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    return status if isinstance(status, int) else None
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """True for connection errors and timeouts, whichever client library raised them"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any((cls.__module__.partition('.')[0], cls.__name__) in TRANSPORT_ERRORS for cls in type(error).__mro__)
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """True for errors that mean the provider is unhealthy (connection errors, timeouts, 429/5xx)"""
+    status = response_status(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    return is_transport_error(error)
+
+
+# ---------------------------------------------------------------------------
+# Retry policy, retry budget and circuit breaker
+# ---------------------------------------------------------------------------
+
+@dataclass
+class RetryPolicy:
+    retries: int = 2
+    base_delay: float = 0.2
+    max_delay: float = 2.0
+
+    @classmethod
+    def from_config(cls) -> 'RetryPolicy':
+        return cls(Config.HTTP_MAX_RETRIES, Config.HTTP_BACKOFF_BASE, Config.HTTP_BACKOFF_MAX)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number attempt (0-based): exponential with full jitter"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class RetryBudget:
+    """Caps retries at a fraction of first attempts.
+
+    Every request deposits ``ratio`` tokens and every retry spends one, so
+    during an outage retries add at most ``ratio`` extra load instead of
+    multiplying it. ``reserve`` tokens are available up front so a quiet
+    process can still retry.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._tokens = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.reserve, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """Fails fast while a provider is down.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are refused for ``reset_timeout`` seconds. Then a single probe is
+    let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, name: str) -> 'CircuitBreaker':
+        return cls(name, Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_TIMEOUT)
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit for {self.name} closed")
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def abandon(self):
+        """A call let through by allow() ended without telling either way (it was cancelled)"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self._opened_at is None and self.failures >= self.failure_threshold):
+                if not self._probing:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+# ---------------------------------------------------------------------------
+# Request coalescing
+# ---------------------------------------------------------------------------
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class Coalescer:
+    """Lets concurrent callers with the same key share one in-flight call"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncCoalescer:
+    """Asyncio version of Coalescer; the shared call keeps running if a waiter is cancelled"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+
+# ---------------------------------------------------------------------------
+# Transports
+# ---------------------------------------------------------------------------
+
+def _breaker_for(breakers: Dict[str, CircuitBreaker], url: str) -> CircuitBreaker:
+    host = urlsplit(url).netloc
+    breaker = breakers.get(host)
+    if breaker is None:
+        breaker = breakers.setdefault(host, CircuitBreaker.from_config(host))
+    return breaker
+
+
+def _retry_after(headers) -> Optional[float]:
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpTransport:
+    """Shared outbound HTTP for the blocking assistant.
+
+    One pooled keep-alive requests.Session (at most HTTP_POOL_PER_HOST
+    connections per host), retries with jittered backoff under a retry
+    budget, and a circuit breaker per host.
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, budget: Optional[RetryBudget] = None):
+        self.policy = policy or RetryPolicy.from_config()
+        self.budget = budget or RetryBudget(Config.HTTP_RETRY_BUDGET)
+        self.timeout = (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    # pool_block makes extra threads wait for a connection instead of opening unpooled ones
+                    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=Config.HTTP_POOL_PER_HOST, pool_block=True)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        return _breaker_for(self.breakers, url)
+
+    def get_json(self, url: str, params: Optional[dict] = None) -> Tuple[int, Any]:
+        """GET url and return (status, decoded JSON), retrying transient failures"""
+        import requests
+
+        breaker = self.breaker(url)
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"{breaker.name} is unavailable")
+
+            retry_after = None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                if not is_transport_error(e):
+                    breaker.abandon()
+                    raise
+                breaker.record_failure()
+                error: Exception = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response.status_code, response.json()
+                breaker.record_failure()
+                error = RetryableStatusError(response.status_code)
+                retry_after = _retry_after(response.headers)
+
+            if attempt >= self.policy.retries or not self.budget.withdraw():
+                raise error
+            time.sleep(self.policy.backoff(attempt, retry_after))
+            attempt += 1
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class AsyncHttpTransport:
+    """aiohttp counterpart of HttpTransport for the async assistant; sharing breakers keeps one view of provider health"""
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, budget: Optional[RetryBudget] = None,
+                 breakers: Optional[Dict[str, CircuitBreaker]] = None):
+        self.policy = policy or RetryPolicy.from_config()
+        self.budget = budget or RetryBudget(Config.HTTP_RETRY_BUDGET)
+        self.breakers = breakers if breakers is not None else {}
+        self._session = None
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        return _breaker_for(self.breakers, url)
+
+    def _get_session(self):
+        import aiohttp
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=Config.HTTP_POOL_PER_HOST, ttl_dns_cache=300)
+            timeout = aiohttp.ClientTimeout(sock_connect=Config.HTTP_CONNECT_TIMEOUT, sock_read=Config.HTTP_READ_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def get_json(self, url: str, params: Optional[dict] = None) -> Tuple[int, Any]:
+        """GET url and return (status, decoded JSON), retrying transient failures"""
+        import aiohttp
+
+        session = self._get_session()
+        breaker = self.breaker(url)
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"{breaker.name} is unavailable")
+
+            retry_after = None
+            try:
+                async with session.get(url, params=params) as response:
+                    status = response.status
+                    body = await response.read()
+                    retry_after = _retry_after(response.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not is_transport_error(e):
+                    breaker.abandon()
+                    raise
+                breaker.record_failure()
+                error: Exception = e
+            else:
+                if status not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return status, json.loads(body)
+                breaker.record_failure()
+                error = RetryableStatusError(status)
+
+            if attempt >= self.policy.retries or not self.budget.withdraw():
+                raise error
+            await asyncio.sleep(self.policy.backoff(attempt, retry_after))
+            attempt += 1
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+def openai_client_options(async_client: bool = False, timeout: Optional[float] = None,
+                          max_retries: Optional[int] = None) -> dict:
+    """Timeouts, retries and a bounded keep-alive pool for openai.OpenAI / openai.AsyncOpenAI"""
+    import httpx
+    import openai
+
+    limits = httpx.Limits(max_connections=Config.OPENAI_MAX_CONNECTIONS,
+                          max_keepalive_connections=Config.OPENAI_MAX_CONNECTIONS)
+    http_client_class = openai.DefaultAsyncHttpxClient if async_client else openai.DefaultHttpxClient
+    return {
+        'timeout': httpx.Timeout(Config.OPENAI_TIMEOUT if timeout is None else timeout,
+                                 connect=Config.HTTP_CONNECT_TIMEOUT),
+        'max_retries': Config.OPENAI_MAX_RETRIES if max_retries is None else max_retries,
+        'http_client': http_client_class(limits=limits),
+    }
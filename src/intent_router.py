@@ -0,0 +1,150 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IntentMatch:
+    """Result of routing one input"""
+    intent: str
+    score: float
+    slots: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class _Intent:
+    name: str
+    priority: int
+    slot_patterns: List[Pattern]
+
+
+# Words as the router sees them; apostrophes stay inside words so "what's" is one token
+WORD_PATTERN = re.compile(r"\w+(?:'\w+)*")
+
+
+class IntentRouter:
+    """Routes input to a registered intent in a single pass.
+
+    Keywords are whole words or phrases kept in a hash table keyed by their
+    word tuple, so routing costs one lookup per word (times the longest phrase
+    length) however many intents are registered. Raw regex triggers, which
+    should be rare, are compiled into one alternation. Each trigger carries a
+    weight; the intent with the highest total weight wins, ties go to the
+    higher priority and then to the earliest match. Slots (e.g. the city of a
+    weather query) are extracted with the winning intent's slot patterns.
+    """
+
+    def __init__(self):
+        self._intents: Dict[str, _Intent] = {}
+        self._phrases: Dict[Tuple[str, ...], Tuple[str, float]] = {}  # words -> (intent, weight)
+        self._max_phrase_length = 0
+        self._patterns: List[Tuple[str, str, float]] = []  # (intent, regex source, weight)
+        self._compiled: Optional[Pattern] = None
+        self._group_lookup: Dict[str, Tuple[str, float]] = {}
+
+    def register(self, intent: str, keywords: Iterable[str] = (), patterns: Iterable[str] = (),
+                 weight: float = 1.0, priority: int = 0, slots: Iterable[str] = ()):
+        """Add triggers for an intent.
+
+        keywords are literal words or phrases matched on word boundaries,
+        patterns are raw regexes. slots are regexes with named groups that are
+        tried in order against the input once this intent has won. Calling
+        register again for the same intent adds more triggers and slots. A
+        keyword already registered for another intent keeps its first owner.
+        """
+        entry = self._intents.get(intent)
+        if entry is None:
+            entry = self._intents[intent] = _Intent(intent, priority, [])
+        else:
+            entry.priority = max(entry.priority, priority)
+        entry.slot_patterns.extend(re.compile(slot, re.IGNORECASE) for slot in slots)
+
+        for keyword in keywords:
+            words = tuple(WORD_PATTERN.findall(keyword.lower()))
+            if not words:
+                continue
+            owner = self._phrases.get(words)
+            if owner is not None and owner[0] != intent:
+                logger.warning(f"Keyword '{keyword}' already routes to '{owner[0]}', not adding it to '{intent}'")
+                continue
+            self._phrases[words] = (intent, weight)
+            self._max_phrase_length = max(self._max_phrase_length, len(words))
+        for pattern in patterns:
+            self._patterns.append((intent, pattern, weight))
+
+        self._compiled = None
+
+    @property
+    def intents(self) -> List[str]:
+        return list(self._intents)
+
+    def compile(self):
+        """Build the combined pattern regex (done lazily on the first route after a change)"""
+        alternatives = []
+        self._group_lookup = {}
+        for index, (intent, source, weight) in enumerate(self._patterns):
+            group = f"p{index}"
+            self._group_lookup[group] = (intent, weight)
+            alternatives.append(f"(?P<{group}>{source})")
+
+        self._compiled = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def route(self, text: str) -> Optional[IntentMatch]:
+        """Return the best matching intent for the text, or None"""
+        if self._compiled is None and self._patterns:
+            self.compile()
+
+        scores: Dict[str, float] = {}
+        first_seen: Dict[str, int] = {}
+
+        # Longest phrase starting at each word wins, and its words are not reused
+        words = WORD_PATTERN.findall(text.lower())
+        position = 0
+        while position < len(words):
+            step = 1
+            for length in range(min(self._max_phrase_length, len(words) - position), 0, -1):
+                found = self._phrases.get(tuple(words[position:position + length]))
+                if found:
+                    intent, weight = found
+                    scores[intent] = scores.get(intent, 0.0) + weight
+                    first_seen.setdefault(intent, position)
+                    step = length
+                    break
+            position += step
+
+        if self._compiled is not None:
+            for match in self._compiled.finditer(text):
+                intent, weight = self._group_lookup[match.lastgroup]
+                scores[intent] = scores.get(intent, 0.0) + weight
+                first_seen.setdefault(intent, len(words))
+
+        if not scores:
+            return None
+
+        best = max(scores, key=lambda name: (scores[name], self._intents[name].priority, -first_seen[name]))
+        return IntentMatch(best, scores[best], self.extract_slots(best, text))
+
+    def extract_slots(self, intent: str, text: str) -> Dict[str, str]:
+        """Collect named groups from the intent's slot patterns (first pattern to set a slot wins)"""
+        slots: Dict[str, str] = {}
+        for pattern in self._intents[intent].slot_patterns:
+            found = pattern.search(text)
+            if not found:
+                continue
+            for name, value in found.groupdict().items():
+                if value and name not in slots:
+                    slots[name] = value.strip()
+        return slots
+
+
+def build_default_router() -> IntentRouter:
+    """Router with the trigger words and slots of the built-in capabilities (declared in plugins.py)"""
+    from plugins import BUILTIN_CAPABILITIES, register_triggers
+
+    router = IntentRouter()
+    for capability in BUILTIN_CAPABILITIES:
+        register_triggers(router, capability)
+    return router
@@ -0,0 +1,713 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import re
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator, List, Optional
+
+from config.settings import Config
+from http_transport import CircuitBreaker, TransportError, is_provider_failure, openai_client_options, response_status
+import telemetry
+
+# openai is imported on first use to keep startup fast
+
+logger = logging.getLogger(__name__)
+
+LLM_TOKENS = telemetry.counter('assistant_llm_tokens_total', "Tokens used by language model calls", ('backend', 'kind'))
+LLM_ANSWERS = telemetry.counter('assistant_llm_answers_total',
+                                "Language model answers by backend and how it was picked (primary, hedge, failover)",
+                                ('backend', 'route'))
+
+# Words that mark a turn as more than small talk, so it goes to the main model
+COMPLEX_HINTS = re.compile(r"\b(explain|why|how (?:do|does|can|would|should)|compare|difference|analy[sz]e|"
+                           r"summari[sz]e|write|code|program|step by step|plan|translate|essay|story|recipe|list)\b",
+                           re.IGNORECASE)
+FAKE_OPENERS = ("Sure!", "Good question.", "Happy to help.", "Here's what I know.")
+
+
+class LLMUnavailableError(TransportError):
+    """Raised without calling anything when every backend's circuit is open"""
+
+
+@dataclass
+class Completion:
+    text: str
+    backend: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+def _last_user_message(messages: list) -> str:
+    return next((message['content'] for message in reversed(messages) if message.get('role') == 'user'), '')
+
+
+def is_simple(messages: list) -> bool:
+    """Short small talk a fast local model answers as well as the main one"""
+    question = _last_user_message(messages)
+    return len(question.split()) <= Config.LLM_SIMPLE_MAX_WORDS and not COMPLEX_HINTS.search(question)
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class LLMBackend(ABC):
+    """A place answers come from, with its own circuit breaker.
+
+    Subclasses implement _complete/_stream and their async twins; the public
+    methods add a span per call, token accounting and circuit bookkeeping.
+    Callers check breaker.allow() before calling (LLMRouter does).
+    """
+
+    def __init__(self, name: str, model: str, max_tokens: Optional[int] = None, temperature: Optional[float] = None):
+        self.name = name
+        self.model = model
+        self.max_tokens = Config.LLM_MAX_TOKENS if max_tokens is None else max_tokens
+        self.temperature = Config.LLM_TEMPERATURE if temperature is None else temperature
+        self.breaker = CircuitBreaker.from_config(name)
+
+    def warm_up(self):
+        """Create clients ahead of the first request"""
+
+    async def close_async(self):
+        """Release async network resources"""
+
+    def complete(self, messages: list, max_tokens: Optional[int] = None,
+                 temperature: Optional[float] = None) -> Completion:
+        with telemetry.span(f'llm.{self.name}', model=self.model) as span, self._outcome(span):
+            completion = self._complete(messages, *self._options(max_tokens, temperature))
+            self._record_usage(span, completion.prompt_tokens, completion.completion_tokens)
+            return completion
+
+    def stream(self, messages: list, max_tokens: Optional[int] = None,
+               temperature: Optional[float] = None) -> Iterator[str]:
+        with telemetry.span(f'llm.{self.name}', model=self.model, stream=True) as span, self._outcome(span):
+            usage = {}
+            yield from self._stream(messages, *self._options(max_tokens, temperature), usage)
+            self._record_usage(span, usage.get('prompt_tokens'), usage.get('completion_tokens'))
+
+    async def complete_async(self, messages: list, max_tokens: Optional[int] = None,
+                             temperature: Optional[float] = None) -> Completion:
+        with telemetry.span(f'llm.{self.name}', model=self.model) as span, self._outcome(span):
+            completion = await self._complete_async(messages, *self._options(max_tokens, temperature))
+            self._record_usage(span, completion.prompt_tokens, completion.completion_tokens)
+            return completion
+
+    async def stream_async(self, messages: list, max_tokens: Optional[int] = None,
+                           temperature: Optional[float] = None) -> AsyncIterator[str]:
+        with telemetry.span(f'llm.{self.name}', model=self.model, stream=True) as span, self._outcome(span):
+            usage = {}
+            async for token in self._stream_async(messages, *self._options(max_tokens, temperature), usage):
+                yield token
+            self._record_usage(span, usage.get('prompt_tokens'), usage.get('completion_tokens'))
+
+    def _options(self, max_tokens: Optional[int], temperature: Optional[float]) -> tuple:
+        return (self.max_tokens if max_tokens is None else max_tokens,
+                self.temperature if temperature is None else temperature)
+
+    @contextmanager
+    def _outcome(self, span):
+        """Count timeouts, connection errors and 429/5xx against the circuit; other responses mean it is up"""
+        try:
+            yield
+        except Exception as e:
+            span.fail(type(e).__name__)
+            if is_provider_failure(e):
+                self.breaker.record_failure()
+            elif response_status(e) is not None:
+                self.breaker.record_success()
+            else:
+                # A bug or bad input on our side says nothing about the provider
+                self.breaker.abandon()
+            raise
+        except BaseException:
+            # Cancelled or closed early, e.g. the losing side of a hedge or a barge-in
+            self.breaker.abandon()
+            raise
+        else:
+            self.breaker.record_success()
+
+    def _record_usage(self, span, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        if prompt_tokens is None:
+            return
+        span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        LLM_TOKENS.inc(prompt_tokens, backend=self.name, kind='prompt')
+        LLM_TOKENS.inc(completion_tokens or 0, backend=self.name, kind='completion')
+
+    @abstractmethod
+    def _complete(self, messages, max_tokens, temperature) -> Completion:
+        """One full answer"""
+
+    @abstractmethod
+    def _stream(self, messages, max_tokens, temperature, usage: dict) -> Iterator[str]:
+        """Answer tokens as they arrive; token counts go into ``usage`` when the backend reports them"""
+
+    @abstractmethod
+    async def _complete_async(self, messages, max_tokens, temperature) -> Completion:
+        """_complete for the event loop"""
+
+    @abstractmethod
+    def _stream_async(self, messages, max_tokens, temperature, usage: dict) -> AsyncIterator[str]:
+        """_stream for the event loop (an async generator)"""
+
+
+class OpenAIBackend(LLMBackend):
+    """Any server speaking the OpenAI chat completions API: OpenAI itself, vLLM, llama.cpp's llama-server, ..."""
+
+    def __init__(self, name: str = 'openai', model: Optional[str] = None, base_url: Optional[str] = None,
+                 api_key: Optional[str] = None, timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 **kwargs):
+        super().__init__(name, model or Config.OPENAI_MODEL, **kwargs)
+        self.base_url = base_url or Config.OPENAI_BASE_URL
+        self.api_key = api_key or Config.OPENAI_API_KEY
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._client = None
+        self._async_client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Blocking client, created on first use so startup doesn't pay for importing openai"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import openai
+                    self._client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url,
+                                                 **openai_client_options(timeout=self.timeout,
+                                                                         max_retries=self.max_retries))
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import openai
+            self._async_client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                                    **openai_client_options(async_client=True, timeout=self.timeout,
+                                                                            max_retries=self.max_retries))
+        return self._async_client
+
+    def warm_up(self):
+        self.client
+
+    async def close_async(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+
+    def _request(self, messages, max_tokens, temperature, stream=False) -> dict:
+        request = dict(model=self.model, messages=messages, max_tokens=max_tokens, temperature=temperature)
+        if stream:
+            # Usage arrives in a last chunk without choices
+            request.update(stream=True, stream_options={"include_usage": True})
+        return request
+
+    def _completion(self, response) -> Completion:
+        usage = response.usage
+        return Completion(response.choices[0].message.content.strip(), self.name,
+                          usage.prompt_tokens if usage else None, usage.completion_tokens if usage else None)
+
+    @staticmethod
+    def _token(chunk, usage: dict) -> Optional[str]:
+        if chunk.usage is not None:
+            usage.update(prompt_tokens=chunk.usage.prompt_tokens, completion_tokens=chunk.usage.completion_tokens)
+        if not chunk.choices:
+            return None
+        return chunk.choices[0].delta.content
+
+    def _complete(self, messages, max_tokens, temperature) -> Completion:
+        return self._completion(self.client.chat.completions.create(**self._request(messages, max_tokens, temperature)))
+
+    def _stream(self, messages, max_tokens, temperature, usage):
+        stream = self.client.chat.completions.create(**self._request(messages, max_tokens, temperature, stream=True))
+        try:
+            for chunk in stream:
+                token = self._token(chunk, usage)
+                if token:
+                    yield token
+        finally:
+            # Frees the connection when the reader stops early
+            stream.close()
+
+    async def _complete_async(self, messages, max_tokens, temperature) -> Completion:
+        response = await self.async_client.chat.completions.create(**self._request(messages, max_tokens, temperature))
+        return self._completion(response)
+
+    async def _stream_async(self, messages, max_tokens, temperature, usage):
+        stream = await self.async_client.chat.completions.create(
+            **self._request(messages, max_tokens, temperature, stream=True))
+        try:
+            async for chunk in stream:
+                token = self._token(chunk, usage)
+                if token:
+                    yield token
+        finally:
+            await stream.close()
+
+
+class LocalBackend(OpenAIBackend):
+    """A model on this machine behind an OpenAI-compatible server, e.g. llama.cpp's
+    ``llama-server -m model.gguf --port 8081``.
+
+    It fails fast (LOCAL_LLM_TIMEOUT, no client retries) so the router can
+    move on to another backend instead of waiting on a busy CPU.
+    """
+
+    def __init__(self, name: str = 'local', model: Optional[str] = None, base_url: Optional[str] = None, **kwargs):
+        super().__init__(name, model or Config.LOCAL_LLM_MODEL, base_url or Config.LOCAL_LLM_URL, api_key='local',
+                         timeout=Config.LOCAL_LLM_TIMEOUT, max_retries=0, **kwargs)
+
+
+class FakeBackend(LLMBackend):
+    """Deterministic answers without a model or network, for tests, benches and offline demos.
+
+    The reply depends only on the last user message; latency adds a fixed
+    delay before the first word.
+    """
+
+    def __init__(self, name: str = 'fake', latency: Optional[float] = None, **kwargs):
+        super().__init__(name, 'fake', **kwargs)
+        self.latency = Config.FAKE_LLM_LATENCY if latency is None else latency
+
+    def _words(self, messages, max_tokens) -> List[str]:
+        question = _last_user_message(messages).strip()
+        opener = FAKE_OPENERS[zlib.crc32(question.encode('utf-8')) % len(FAKE_OPENERS)]
+        words = f"{opener} You asked about {question[:60].rstrip('?.!') or 'nothing'}.".split(' ')
+        return words[:max(1, max_tokens)]
+
+    def _completion(self, messages, words) -> Completion:
+        prompt_tokens = sum(len(str(message.get('content', ''))) for message in messages) // 4
+        return Completion(' '.join(words), self.name, prompt_tokens, len(words))
+
+    def _complete(self, messages, max_tokens, temperature) -> Completion:
+        time.sleep(self.latency)
+        return self._completion(messages, self._words(messages, max_tokens))
+
+    def _stream(self, messages, max_tokens, temperature, usage):
+        time.sleep(self.latency)
+        words = self._words(messages, max_tokens)
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + ' '
+        completion = self._completion(messages, words)
+        usage.update(prompt_tokens=completion.prompt_tokens, completion_tokens=completion.completion_tokens)
+
+    async def _complete_async(self, messages, max_tokens, temperature) -> Completion:
+        await asyncio.sleep(self.latency)
+        return self._completion(messages, self._words(messages, max_tokens))
+
+    async def _stream_async(self, messages, max_tokens, temperature, usage):
+        await asyncio.sleep(self.latency)
+        words = self._words(messages, max_tokens)
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + ' '
+        completion = self._completion(messages, words)
+        usage.update(prompt_tokens=completion.prompt_tokens, completion_tokens=completion.completion_tokens)
+
+
+BACKENDS = {'openai': OpenAIBackend, 'local': LocalBackend, 'fake': FakeBackend}
+
+
+def create_backend(kind: str, name: Optional[str] = None, model: Optional[str] = None) -> LLMBackend:
+    """Build a backend by kind: 'openai', 'local' or 'fake'"""
+    backend_class = BACKENDS.get(kind)
+    if backend_class is None:
+        raise ValueError(f"Unknown LLM backend '{kind}' (expected one of: {', '.join(BACKENDS)})")
+    kwargs = {'model': model} if model else {}
+    return backend_class(name or kind, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Routing, hedging and failover
+# ---------------------------------------------------------------------------
+
+class LLMRouter:
+    """Picks a backend per turn, hedges slow calls and fails over.
+
+    Simple turns (see is_simple) go to the fast backend first and the rest
+    to the main one; the other backend is the fallback. If the first one
+    hasn't answered (or, when streaming, sent its first token) within
+    hedge_after seconds, the fallback is asked as well and whichever answers
+    first wins. Backends that fail or whose circuit is open are skipped.
+    Once a streamed answer has started it is never switched.
+    """
+
+    def __init__(self, main: LLMBackend, fast: Optional[LLMBackend] = None, hedge_after: float = 0.0):
+        self.main = main
+        self.fast = fast
+        self.hedge_after = hedge_after
+        self.backends = [backend for backend in (main, fast) if backend is not None]
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> 'LLMRouter':
+        main = create_backend(Config.LLM_BACKEND)
+        fast = None
+        if Config.LLM_FAST_BACKEND:
+            kind = Config.LLM_FAST_BACKEND
+            fast = create_backend(kind, name=f'{kind}-fast' if kind == main.name else kind,
+                                  model=Config.OPENAI_FAST_MODEL if kind == 'openai' else None)
+        return cls(main, fast, Config.LLM_HEDGE_AFTER)
+
+    @property
+    def breakers(self) -> List[CircuitBreaker]:
+        return [backend.breaker for backend in self.backends]
+
+    def warm_up(self):
+        for backend in self.backends:
+            backend.warm_up()
+
+    async def close_async(self):
+        for backend in self.backends:
+            await backend.close_async()
+
+    def plan(self, messages: list, simple: Optional[bool] = None) -> List[LLMBackend]:
+        """Backends in the order they should be tried"""
+        if self.fast is None:
+            return [self.main]
+        if simple is None:
+            simple = is_simple(messages)
+        telemetry.current_span().set(simple=simple)
+        return [self.fast, self.main] if simple else [self.main, self.fast]
+
+    def _hedging(self, order: list) -> bool:
+        return self.hedge_after > 0 and len(order) > 1
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=2 * Config.OPENAI_MAX_CONNECTIONS,
+                                                        thread_name_prefix='llm')
+        return self._executor
+
+    @staticmethod
+    def _next(candidates: Iterator[LLMBackend]) -> Optional[LLMBackend]:
+        """The next backend whose circuit lets a call through"""
+        for backend in candidates:
+            if backend.breaker.allow():
+                return backend
+            logger.info(f"Skipping {backend.name}, its circuit is open")
+        return None
+
+    @staticmethod
+    def _answered(span, backend: LLMBackend, route: str):
+        span.set(backend=backend.name, route=route)
+        LLM_ANSWERS.inc(backend=backend.name, route=route)
+
+    @staticmethod
+    def _failed(backend: LLMBackend, error: Exception):
+        logger.warning(f"Language model backend {backend.name} failed: {error}")
+
+    def complete(self, messages: list, simple: Optional[bool] = None, **options) -> Completion:
+        """Answer in one piece; raises the last backend error (or LLMUnavailableError) if none could answer"""
+        order = self.plan(messages, simple)
+        span = telemetry.current_span()  # the caller's; a streaming backend's own span is current while it yields
+        candidates = iter(order)
+        last_error: Exception = LLMUnavailableError("No language model backend is available")
+
+        if not self._hedging(order):
+            route = 'primary'
+            while (backend := self._next(candidates)) is not None:
+                try:
+                    completion = backend.complete(messages, **options)
+                except Exception as e:
+                    self._failed(backend, e)
+                    last_error, route = e, 'failover'
+                    continue
+                self._answered(span, backend, route)
+                return completion
+            raise last_error
+
+        running = {}  # future -> (backend, route)
+
+        def launch(route: str) -> bool:
+            backend = self._next(candidates)
+            if backend is None:
+                return False
+            # Copy the context so the backend's span nests under the caller's
+            future = self._pool().submit(contextvars.copy_context().run, backend.complete, messages, **options)
+            running[future] = (backend, route)
+            return True
+
+        if not launch('primary'):
+            raise last_error
+        hedged = False
+        while running:
+            done, _ = wait(running, timeout=None if hedged else self.hedge_after, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                launch('hedge')
+                continue
+            for future in done:
+                backend, route = running.pop(future)
+                try:
+                    completion = future.result()
+                except Exception as e:
+                    self._failed(backend, e)
+                    last_error = e
+                    continue
+                # A slower call still running finishes in the background and is ignored
+                self._answered(span, backend, route)
+                return completion
+            if not running:
+                launch('failover')
+        raise last_error
+
+    def stream(self, messages: list, simple: Optional[bool] = None, **options) -> Iterator[str]:
+        """Yield the answer as it arrives, hedging and failing over until the first token"""
+        order = self.plan(messages, simple)
+        span = telemetry.current_span()  # the caller's; a streaming backend's own span is current while it yields
+        candidates = iter(order)
+        last_error: Exception = LLMUnavailableError("No language model backend is available")
+
+        if not self._hedging(order):
+            route = 'primary'
+            while (backend := self._next(candidates)) is not None:
+                started = False
+                try:
+                    for token in backend.stream(messages, **options):
+                        if not started:
+                            started = True
+                            self._answered(span, backend, route)
+                        yield token
+                    return
+                except Exception as e:
+                    if started:
+                        raise
+                    self._failed(backend, e)
+                    last_error, route = e, 'failover'
+            raise last_error
+
+        # Each backend streams from a pool thread into one queue; the first to send a token wins
+        events: "queue.Queue[tuple]" = queue.Queue()
+        stops = {}  # backend -> event that tells its pump to stop
+
+        def pump(backend: LLMBackend, stop: threading.Event):
+            try:
+                tokens = backend.stream(messages, **options)
+                try:
+                    for token in tokens:
+                        if stop.is_set():
+                            break
+                        events.put((backend, 'token', token))
+                finally:
+                    tokens.close()
+                events.put((backend, 'end', None))
+            except Exception as e:
+                events.put((backend, 'error', e))
+
+        routes = {}
+        running = 0
+
+        def launch(route: str) -> bool:
+            nonlocal running
+            backend = self._next(candidates)
+            if backend is None:
+                return False
+            stop = stops[backend] = threading.Event()
+            routes[backend] = route
+            running += 1
+            self._pool().submit(contextvars.copy_context().run, pump, backend, stop)
+            return True
+
+        if not launch('primary'):
+            raise last_error
+        deadline = time.monotonic() + self.hedge_after
+        hedged = False
+        winner = None
+        try:
+            while running:
+                try:
+                    timeout = None if hedged or winner else max(0.0, deadline - time.monotonic())
+                    backend, kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedged = True
+                    launch('hedge')
+                    continue
+
+                if kind != 'token':
+                    running -= 1
+                if winner is not None and backend is not winner:
+                    continue  # the loser winding down
+
+                if kind == 'token':
+                    if winner is None:
+                        winner = backend
+                        self._answered(span, backend, routes[backend])
+                        for other, stop in stops.items():
+                            if other is not backend:
+                                stop.set()
+                    yield value
+                elif kind == 'end':
+                    if winner is None:
+                        self._answered(span, backend, routes[backend])  # an empty answer is still an answer
+                    return
+                else:
+                    if winner is not None:
+                        raise value
+                    self._failed(backend, value)
+                    last_error = value
+                    if not running:
+                        launch('failover')
+            raise last_error
+        finally:
+            # Also reached when the reader stops early (barge-in)
+            for stop in stops.values():
+                stop.set()
+
+    async def complete_async(self, messages: list, simple: Optional[bool] = None, **options) -> Completion:
+        """complete() for the event loop; the losing side of a hedge is cancelled"""
+        order = self.plan(messages, simple)
+        span = telemetry.current_span()  # the caller's; a streaming backend's own span is current while it yields
+        candidates = iter(order)
+        last_error: Exception = LLMUnavailableError("No language model backend is available")
+
+        if not self._hedging(order):
+            route = 'primary'
+            while (backend := self._next(candidates)) is not None:
+                try:
+                    completion = await backend.complete_async(messages, **options)
+                except Exception as e:
+                    self._failed(backend, e)
+                    last_error, route = e, 'failover'
+                    continue
+                self._answered(span, backend, route)
+                return completion
+            raise last_error
+
+        running = {}  # task -> (backend, route)
+
+        def launch(route: str) -> bool:
+            backend = self._next(candidates)
+            if backend is None:
+                return False
+            running[asyncio.ensure_future(backend.complete_async(messages, **options))] = (backend, route)
+            return True
+
+        if not launch('primary'):
+            raise last_error
+        hedged = False
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, timeout=None if hedged else self.hedge_after,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    launch('hedge')
+                    continue
+                for task in done:
+                    backend, route = running.pop(task)
+                    try:
+                        completion = task.result()
+                    except Exception as e:
+                        self._failed(backend, e)
+                        last_error = e
+                        continue
+                    self._answered(span, backend, route)
+                    return completion
+                if not running:
+                    launch('failover')
+            raise last_error
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def stream_async(self, messages: list, simple: Optional[bool] = None, **options) -> AsyncIterator[str]:
+        """stream() for the event loop; the losing side of a hedge is cancelled"""
+        order = self.plan(messages, simple)
+        span = telemetry.current_span()  # the caller's; a streaming backend's own span is current while it yields
+        candidates = iter(order)
+        last_error: Exception = LLMUnavailableError("No language model backend is available")
+
+        if not self._hedging(order):
+            route = 'primary'
+            while (backend := self._next(candidates)) is not None:
+                started = False
+                try:
+                    async for token in backend.stream_async(messages, **options):
+                        if not started:
+                            started = True
+                            self._answered(span, backend, route)
+                        yield token
+                    return
+                except Exception as e:
+                    if started:
+                        raise
+                    self._failed(backend, e)
+                    last_error, route = e, 'failover'
+            raise last_error
+
+        events: "asyncio.Queue[tuple]" = asyncio.Queue()
+        tasks = {}  # backend -> (task, route)
+
+        async def pump(backend: LLMBackend):
+            try:
+                async for token in backend.stream_async(messages, **options):
+                    await events.put((backend, 'token', token))
+                await events.put((backend, 'end', None))
+            except Exception as e:
+                await events.put((backend, 'error', e))
+
+        def launch(route: str) -> bool:
+            backend = self._next(candidates)
+            if backend is None:
+                return False
+            tasks[backend] = (asyncio.ensure_future(pump(backend)), route)
+            return True
+
+        def cancel(keep: Optional[LLMBackend] = None):
+            for backend, (task, _) in tasks.items():
+                if backend is not keep:
+                    task.cancel()
+
+        if not launch('primary'):
+            raise last_error
+        deadline = time.monotonic() + self.hedge_after
+        hedged = False
+        winner = None
+        running = 1
+        try:
+            while running:
+                try:
+                    if hedged or winner:
+                        backend, kind, value = await events.get()
+                    else:
+                        backend, kind, value = await asyncio.wait_for(events.get(),
+                                                                      max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    hedged = True
+                    running += launch('hedge')
+                    continue
+
+                if kind != 'token':
+                    running -= 1
+                if winner is not None and backend is not winner:
+                    continue
+
+                if kind == 'token':
+                    if winner is None:
+                        winner = backend
+                        self._answered(span, backend, tasks[backend][1])
+                        cancel(keep=backend)
+                    yield value
+                elif kind == 'end':
+                    if winner is None:
+                        self._answered(span, backend, tasks[backend][1])
+                    return
+                else:
+                    if winner is not None:
+                        raise value
+                    self._failed(backend, value)
+                    last_error = value
+                    if not running:
+                        running += launch('failover')
+            raise last_error
+        finally:
+            cancel()
@@ -4,24 +4,92 @@ Virtual Assistant Main Application
 Run this file to start the assistant
 """
 
+import time
+_STARTED_AT = time.perf_counter()
+
 import sys
 import logging
+import argparse
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+# (component, seconds) pairs reported by --profile-startup
+STARTUP_TIMINGS = []
+
+
+@contextmanager
+def timed(component: str):
+    """Record how long a startup step takes"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS.append((component, time.perf_counter() - start))
+
+
 # Add src directory to path
 sys.path.append(str(Path(__file__).parent))
 
-from virtual_assistant import VirtualAssistant
-from voice_interface import VoiceInterface, VOICE_AVAILABLE
+with timed("import virtual_assistant"):
+    from virtual_assistant import STATIC_REPLIES, VirtualAssistant
 from config.settings import Config
+import telemetry
+with timed("import voice_interface"):
+    from voice_interface import VoiceInterface, VOICE_AVAILABLE, load_voice_modules
+    from voice_pipeline import GOODBYE, VoicePipeline
+    from audio_capture import MicrophoneSource, WavFileSource
+    from stt_backends import create_recognizer
 
 logger = logging.getLogger(__name__)
 
 class AssistantApp:
     def __init__(self):
-        self.assistant = VirtualAssistant()
-        self.voice = VoiceInterface() if VOICE_AVAILABLE else None
+        with timed("init VirtualAssistant"):
+            self.assistant = VirtualAssistant()
+        
+        # The voice stack (speech libraries, microphone, calibration) starts on first use
+        self._voice = None
+        self._voice_lock = threading.Lock()
         self.running = True
+        self.mode = 'text'
+        self.pipeline = None
+        self.recognizer = None  # speech-to-text backend, loaded on entering voice mode
+        
+        # Reminders fire on a background thread; voice mode queues them for speaking
+        if self.assistant.reminders:
+            self.assistant.reminders.add_listener(self._on_reminder)
+    
+    @property
+    def voice(self):
+        """Voice interface, created the first time voice mode is used"""
+        if self._voice is None and VOICE_AVAILABLE:
+            with self._voice_lock:
+                if self._voice is None:
+                    print("🎤 Starting voice interface...")
+                    self._voice = VoiceInterface()
+                    self._voice.prerender(STATIC_REPLIES + (GOODBYE,))
+        return self._voice
+    
+    def start_warm_up(self):
+        """Import the OpenAI client and speech libraries in the background while the user types"""
+        def warm_up():
+            try:
+                self.assistant.warm_up()
+                if VOICE_AVAILABLE:
+                    load_voice_modules()
+            except Exception as e:
+                logger.debug(f"Warm-up failed (modules will load on first use): {e}")
+        
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    
+    def _on_reminder(self, reminder):
+        """Deliver a due reminder (called from the reminder thread)"""
+        pipeline = self.pipeline
+        if self.mode == 'voice' and pipeline is not None:
+            pipeline.say(f"Reminder: {reminder.text}")
+        else:
+            print(f"\n⏰ {Config.ASSISTANT_NAME}: Reminder - {reminder.text}\nYou: ", end="", flush=True)
     
     def run_text_mode(self):
         """Run assistant in text-only mode"""
@@ -39,7 +107,7 @@ class AssistantApp:
                 
                 # Check for exit commands
                 if user_input.lower() in ['quit', 'exit', 'bye', 'goodbye']:
-                    print(f"\n{Config.ASSISTANT_NAME}: Goodbye! Have a great day!")
+                    print(f"\n{Config.ASSISTANT_NAME}: {GOODBYE}")
                     break
                 
                 # Check for voice mode switch
@@ -51,8 +119,15 @@ class AssistantApp:
                     continue
                 
                 # Process input
-                response = self.assistant.process_text_input(user_input)
-                print(f"{Config.ASSISTANT_NAME}: {response}")
+                if Config.STREAM_RESPONSES:
+                    # Print tokens as they arrive instead of waiting for the full reply
+                    print(f"{Config.ASSISTANT_NAME}: ", end="", flush=True)
+                    for token in self.assistant.process_text_input_stream(user_input):
+                        print(token, end="", flush=True)
+                    print()
+                else:
+                    response = self.assistant.process_text_input(user_input)
+                    print(f"{Config.ASSISTANT_NAME}: {response}")
                 
             except KeyboardInterrupt:
                 print(f"\n\n{Config.ASSISTANT_NAME}: Goodbye!")
@@ -61,8 +136,8 @@ class AssistantApp:
                 logger.error(f"Error in text mode: {e}")
                 print(f"{Config.ASSISTANT_NAME}: Sorry, I encountered an error. Please try again.")
     
-    def run_voice_mode(self):
-        """Run assistant in voice mode"""
+    def run_voice_mode(self, source=None):
+        """Run assistant in voice mode, listening to the microphone unless another audio source is given"""
         if not self.voice or not hasattr(self.voice, 'available') or not self.voice.available:
             print("Voice mode is not available. The voice interface failed to initialize.")
             return
@@ -72,57 +147,103 @@ class AssistantApp:
         print("Say 'goodbye' to quit")
         print("-" * 50)
         
-        while self.running:
-            try:
-                # Listen for speech
-                user_input = self.voice.listen_for_speech()
-                
-                if not user_input:
-                    continue
-                
-                print(f"You said: {user_input}")
-                
-                # Check for mode switch or exit commands
-                if any(phrase in user_input.lower() for phrase in ['stop listening', 'text mode']):
-                    print("Switching to text mode...")
-                    return
-                
-                if any(phrase in user_input.lower() for phrase in ['goodbye', 'quit', 'exit']):
-                    response = "Goodbye! Have a great day!"
-                    print(f"{Config.ASSISTANT_NAME}: {response}")
-                    print("🔊 Speaking...")
-                    self.voice.speak(response)
-                    self.running = False
-                    break
-                
-                # Process input
-                response = self.assistant.process_text_input(user_input)
-                print(f"{Config.ASSISTANT_NAME}: {response}")
-                
-                # Speak response and wait for completion
-                print("🔊 Speaking...")
-                self.voice.speak(response)
-                print("🎤 Ready to listen again...")
-                
-            except KeyboardInterrupt:
+        if source is None:
+            source = MicrophoneSource(self.voice.microphone)
+        if self.recognizer is None:
+            self.recognizer = create_recognizer(self.voice)
+        
+        # Capture, recognition, generation and playback overlap; see VoicePipeline
+        pipeline = self.pipeline = VoicePipeline(self.assistant, self.voice, source, self.recognizer,
+                                                 energy_threshold=self.voice.recognizer.energy_threshold)
+        self.mode = 'voice'
+        try:
+            outcome = pipeline.run()
+        finally:
+            self.mode = 'text'
+            self.pipeline = None
+        
+        if outcome in ('exit', 'interrupted'):
+            if outcome == 'interrupted':
                 print(f"\n\n{Config.ASSISTANT_NAME}: Goodbye!")
-                break
-            except Exception as e:
-                logger.error(f"Error in voice mode: {e}")
-                print(f"{Config.ASSISTANT_NAME}: Sorry, I encountered an error.")
+            self.running = False
+        elif outcome == 'error':
+            print(f"{Config.ASSISTANT_NAME}: Sorry, I encountered an error.")
+        return pipeline
+    
+    def run_wav_input(self, paths):
+        """Run voice mode on recorded WAV files instead of the microphone, then exit"""
+        if VOICE_AVAILABLE:
+            self._voice = VoiceInterface(use_microphone=False)
+            self._voice.prerender(STATIC_REPLIES + (GOODBYE,))
+        pipeline = self.run_voice_mode(WavFileSource(paths, realtime=True))
+        if pipeline is not None:
+            latencies = ', '.join(f"{seconds * 1000:.0f} ms" for seconds in pipeline.latencies)
+            print(f"Time to first spoken sentence per turn: {latencies or 'n/a'}")
+
+def profile_startup(app: AssistantApp):
+    """Print startup timings, then load the deferred components to show what they would have cost"""
+    time_to_prompt = time.perf_counter() - _STARTED_AT
+    
+    deferred = []
+    def measure(component, load):
+        start = time.perf_counter()
+        try:
+            load()
+            deferred.append((component, time.perf_counter() - start, ''))
+        except Exception as e:
+            deferred.append((component, time.perf_counter() - start, f"failed: {e}"))
+    
+    measure("language model clients", app.assistant.llm.warm_up)
+    measure("requests", lambda: __import__('requests'))
+    if VOICE_AVAILABLE:
+        measure("speech libraries", load_voice_modules)
+        measure("VoiceInterface init (microphone + calibration)", lambda: app.voice)
+    
+    print("\n⏱️  Startup profile (from the start of main.py; interpreter startup not included)")
+    for component, seconds in STARTUP_TIMINGS:
+        print(f"  {component:<50} {seconds * 1000:8.1f} ms")
+    print(f"  {'time to prompt':<50} {time_to_prompt * 1000:8.1f} ms")
+    print("\n  Deferred until first use:")
+    for component, seconds, note in deferred:
+        print(f"  {component:<50} {seconds * 1000:8.1f} ms {note}")
+
 
 def main():
     """Main application entry point"""
+    parser = argparse.ArgumentParser(description="Run the virtual assistant")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="report import and init timings per component, then exit")
+    parser.add_argument('--no-warm-up', action='store_true',
+                        help="don't preload the OpenAI client and speech libraries in the background")
+    parser.add_argument('--voice-input', nargs='+', metavar='WAV',
+                        help="run voice mode on 16-bit PCM WAV files instead of the microphone, then exit")
+    args = parser.parse_args()
+    
     try:
         print("🚀 Starting Virtual Assistant...")
         
         # Initialize application
         app = AssistantApp()
         
+        if args.profile_startup:
+            profile_startup(app)
+            return
+        
+        if args.voice_input:
+            app.run_wav_input(args.voice_input)
+            return
+        
+        if Config.METRICS_PORT:
+            telemetry.start_metrics_server(Config.METRICS_PORT)
+            print(f"📈 Metrics at http://127.0.0.1:{Config.METRICS_PORT}/metrics")
+        
+        if Config.WARM_UP_IN_BACKGROUND and not args.no_warm_up:
+            app.start_warm_up()
+        
         # Show available modes
         print("\nAvailable modes:")
         print("  • Text mode: Always available")
-        voice_status = "Available" if (app.voice and app.voice.available) else "Not available (install speech libraries)"
+        voice_status = "Available (starts when you type 'voice')" if VOICE_AVAILABLE else "Not available (install speech libraries)"
         print(f"  • Voice mode: {voice_status}")
         
         # Start in text mode
@@ -0,0 +1,517 @@
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# NumPy is optional and only used for vectorized evaluation; it is imported on first use
+np = None
+
+# Hard limits so a single input can't pin a CPU or exhaust memory
+MAX_EXPRESSION_LENGTH = 300
+MAX_TOKENS = 100
+MAX_STEPS = 200
+MAX_EXPONENT = 1000
+MAX_MAGNITUDE = 1e100
+
+
+class MathError(ValueError):
+    """Raised for expressions that can't be parsed or break a limit"""
+
+
+class NoExpressionError(MathError):
+    """Raised when the text contains nothing to calculate"""
+
+
+# ---------------------------------------------------------------------------
+# Vocabulary
+# ---------------------------------------------------------------------------
+
+NUMBER_WORDS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13,
+    'fourteen': 14, 'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18,
+    'nineteen': 19, 'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60,
+    'seventy': 70, 'eighty': 80, 'ninety': 90,
+}
+SCALE_WORDS = {'hundred': 100, 'thousand': 1000, 'million': 10 ** 6, 'billion': 10 ** 9}
+
+# Multi-word phrases first so "divided by" wins over "by"
+OPERATOR_PHRASES = [
+    ('to the power of', '^'), ('raised to', '^'), ('multiplied by', '*'), ('divided by', '/'),
+    ('square root of', 'sqrt'), ('square root', 'sqrt'), ('percent of', '% of'),
+    ('plus', '+'), ('minus', '-'), ('times', '*'),
+    ('over', '/'), ('mod', 'mod'), ('modulo', 'mod'), ('percent', '%'),
+    ('squared', '^ 2'), ('cubed', '^ 3'),
+]
+OPERATOR_PHRASE_PATTERN = re.compile(
+    r'\b(' + '|'.join(re.escape(phrase) for phrase, _ in OPERATOR_PHRASES) + r')\b'
+)
+OPERATOR_PHRASE_MAP = dict(OPERATOR_PHRASES)
+
+FUNCTIONS = {
+    'sqrt': (1, math.sqrt), 'abs': (1, abs), 'round': (1, round), 'floor': (1, math.floor),
+    'ceil': (1, math.ceil), 'log': (1, math.log10), 'ln': (1, math.log), 'log2': (1, math.log2),
+    'exp': (1, math.exp), 'sin': (1, math.sin), 'cos': (1, math.cos), 'tan': (1, math.tan),
+    'min': (2, min), 'max': (2, max),
+}
+CONSTANTS = {'pi': math.pi, 'e': math.e, 'tau': math.tau}
+
+# Linear units: name -> (dimension, factor to the base unit)
+UNITS = {
+    'mm': ('length', 0.001), 'millimeter': ('length', 0.001), 'millimeters': ('length', 0.001),
+    'cm': ('length', 0.01), 'centimeter': ('length', 0.01), 'centimeters': ('length', 0.01),
+    'm': ('length', 1.0), 'meter': ('length', 1.0), 'meters': ('length', 1.0),
+    'km': ('length', 1000.0), 'kilometer': ('length', 1000.0), 'kilometers': ('length', 1000.0),
+    'inch': ('length', 0.0254), 'inches': ('length', 0.0254),
+    'ft': ('length', 0.3048), 'foot': ('length', 0.3048), 'feet': ('length', 0.3048),
+    'yd': ('length', 0.9144), 'yard': ('length', 0.9144), 'yards': ('length', 0.9144),
+    'mi': ('length', 1609.344), 'mile': ('length', 1609.344), 'miles': ('length', 1609.344),
+    'g': ('mass', 0.001), 'gram': ('mass', 0.001), 'grams': ('mass', 0.001),
+    'kg': ('mass', 1.0), 'kilogram': ('mass', 1.0), 'kilograms': ('mass', 1.0),
+    'oz': ('mass', 0.028349523125), 'ounce': ('mass', 0.028349523125), 'ounces': ('mass', 0.028349523125),
+    'lb': ('mass', 0.45359237), 'lbs': ('mass', 0.45359237), 'pound': ('mass', 0.45359237), 'pounds': ('mass', 0.45359237),
+    'ml': ('volume', 0.001), 'milliliter': ('volume', 0.001), 'milliliters': ('volume', 0.001),
+    'l': ('volume', 1.0), 'liter': ('volume', 1.0), 'liters': ('volume', 1.0),
+    'gallon': ('volume', 3.785411784), 'gallons': ('volume', 3.785411784),
+    's': ('time', 1.0), 'sec': ('time', 1.0), 'second': ('time', 1.0), 'seconds': ('time', 1.0),
+    'min': ('time', 60.0), 'minute': ('time', 60.0), 'minutes': ('time', 60.0),
+    'h': ('time', 3600.0), 'hr': ('time', 3600.0), 'hour': ('time', 3600.0), 'hours': ('time', 3600.0),
+    'day': ('time', 86400.0), 'days': ('time', 86400.0),
+}
+TEMPERATURE_UNITS = {
+    'c': 'C', 'celsius': 'C', 'f': 'F', 'fahrenheit': 'F', 'k': 'K', 'kelvin': 'K',
+}
+CONVERT_WORDS = {'in', 'to', 'into', 'as'}
+
+# Words dropped from a question; any other word next to a value is an error rather than being ignored
+FILLER_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'be', 'what', 'whats', 's', 'how', 'much', 'many', 'does', 'do', 'it',
+    'that', 'this', 'i', 'me', 'you', 'can', 'could', 'would', 'please', 'tell', 'give', 'get', 'know',
+    'calculate', 'compute', 'convert', 'evaluate', 'solve', 'work', 'out', 'figure', 'find', 'result', 'answer', 'value',
+    'equal', 'equals', 'math', 'maths', 'some', 'quick', 'question', 'hey', 'hi', 'hello', 'there', 'ok', 'okay',
+    'so', 'now', 'then', 'also', 'and', 'thanks', 'thank', 'assistant', 'by', 'number', 'dollar', 'dollars',
+    'euro', 'euros', 'bucks',
+}
+
+TOKEN_PATTERN = re.compile(r"\s*(?:((?:\d+(?:,\d{3})*(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?)|(\*\*|[-+*/^%(),×÷])|([a-z]+\d*))")
+# Inside function arguments a comma separates arguments rather than grouping thousands
+ARGUMENT_TOKEN_PATTERN = re.compile(r"\s*(?:((?:\d+(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?)|(\*\*|[-+*/^%(),×÷])|([a-z]+\d*))")
+
+# Token kinds
+NUM, CONST, OP, FUNC, NAME, UNIT, CONVERT, LPAREN, RPAREN, COMMA = (
+    'num', 'const', 'op', 'func', 'name', 'unit', 'convert', '(', ')', ','
+)
+# Tokens that stand for a value, and those that can start one
+VALUE_KINDS = (NUM, CONST, NAME, UNIT, RPAREN)
+VALUE_START_KINDS = (NUM, CONST, NAME, FUNC, LPAREN)
+
+
+# ---------------------------------------------------------------------------
+# Tokenizer
+# ---------------------------------------------------------------------------
+
+def tokenize(text: str, variables: Sequence[str] = ()) -> List[Tuple[str, object]]:
+    """Turn free text into math tokens, dropping filler words.
+
+    Number words become numbers, operator words become symbols, and unit
+    words are only recognised right after a value so that e.g. "c" in a
+    sentence isn't mistaken for Celsius. A word the engine doesn't know is
+    dropped too, unless it is next to a value ("factorial 5"), where
+    ignoring it would give a confident wrong answer.
+    """
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise MathError("Expression is too long")
+
+    text = text.lower().replace('×', '*').replace('÷', '/')
+    text = OPERATOR_PHRASE_PATTERN.sub(lambda m: f" {OPERATOR_PHRASE_MAP[m.group(1)]} ", text)
+
+    tokens: List[Tuple[str, object]] = []
+    pending_words: List[str] = []
+    call_parens: List[bool] = []  # one entry per open paren, True if it opened a function call
+    unknown: Optional[str] = None  # an unknown word, rejected if a value follows it
+
+    def flush_number_words():
+        if pending_words:
+            tokens.append((NUM, _number_from_words(pending_words)))
+            pending_words.clear()
+
+    position = 0
+    while position < len(text):
+        pattern = ARGUMENT_TOKEN_PATTERN if any(call_parens) else TOKEN_PATTERN
+        match = pattern.match(text, position)
+        if not match:
+            # Skip punctuation we don't understand (?, !, quotes, ...)
+            position += 1
+            continue
+        position = match.end()
+        number, symbol, word = match.groups()
+
+        if word and (word in NUMBER_WORDS or word in SCALE_WORDS or (word == 'and' and pending_words)):
+            if unknown:
+                raise MathError(f"Unknown word '{unknown}'")
+            pending_words.append(word)
+            continue
+        flush_number_words()
+        emitted = len(tokens)
+
+        if number:
+            value = number.replace(',', '')
+            value = float(value) if '.' in value or 'e' in value else int(value)
+            if not abs(value) <= MAX_MAGNITUDE:
+                raise MathError("Number is too large")
+            tokens.append((NUM, value))
+        elif symbol:
+            symbol = '^' if symbol == '**' else symbol
+            kind = {'(': LPAREN, ')': RPAREN, ',': COMMA}.get(symbol, OP)
+            if kind == LPAREN:
+                call_parens.append(bool(tokens) and tokens[-1][0] == FUNC)
+            elif kind == RPAREN and call_parens:
+                call_parens.pop()
+            tokens.append((kind, symbol))
+        elif word:
+            after_value = bool(tokens) and tokens[-1][0] in (NUM, CONST, RPAREN, NAME)
+            after_convert = bool(tokens) and tokens[-1][0] == CONVERT
+            if word in variables:
+                tokens.append((NAME, word))
+            elif (after_value or after_convert) and (word in UNITS or word in TEMPERATURE_UNITS):
+                tokens.append((UNIT, word))
+            elif word in CONVERT_WORDS and tokens and tokens[-1][0] == UNIT:
+                tokens.append((CONVERT, word))
+            elif word == 'mod':
+                tokens.append((OP, 'mod'))
+            elif word == 'x' and after_value:
+                tokens.append((OP, '*'))
+            elif word == 'of' and tokens and tokens[-1] == (OP, '%'):
+                tokens.append((OP, '*'))
+            elif word in FUNCTIONS:
+                tokens.append((FUNC, word))
+            elif word in CONSTANTS:
+                tokens.append((CONST, word))
+            elif not (word in FILLER_WORDS or word in UNITS or word in TEMPERATURE_UNITS or word in CONVERT_WORDS
+                      or word in ('x', 'of')):
+                if tokens and tokens[-1][0] in VALUE_KINDS:
+                    raise MathError(f"Unknown word '{word}'")
+                unknown = word
+
+        if len(tokens) > emitted:
+            if unknown and tokens[-1][0] in VALUE_START_KINDS:
+                raise MathError(f"Unknown word '{unknown}'")
+            unknown = None
+
+        if len(tokens) > MAX_TOKENS:
+            raise MathError("Expression is too long")
+
+    flush_number_words()
+    return tokens
+
+
+def _number_from_words(words: List[str]) -> int:
+    """'one hundred and twenty five' -> 125"""
+    total, current = 0, 0
+    for word in words:
+        if word == 'and':
+            continue
+        if word in NUMBER_WORDS:
+            current += NUMBER_WORDS[word]
+        elif word == 'hundred':
+            current = max(current, 1) * 100
+        else:
+            total += max(current, 1) * SCALE_WORDS[word]
+            current = 0
+    return total + current
+
+
+# ---------------------------------------------------------------------------
+# Pratt parser
+# ---------------------------------------------------------------------------
+
+# Binding powers for infix operators
+INFIX_POWER = {'+': 10, '-': 10, '*': 20, '/': 20, 'mod': 20, '^': 40}
+PREFIX_POWER = 30  # unary minus binds looser than ^, so -2^2 == -4
+POSTFIX_POWER = 50  # percent
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, object]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Tuple[Optional[str], object]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def next(self) -> Tuple[Optional[str], object]:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect(self, kind: str):
+        if self.peek()[0] != kind:
+            raise MathError(f"Expected '{kind}'")
+        return self.next()
+
+    def parse(self):
+        if not self.tokens:
+            raise NoExpressionError("No expression found")
+
+        node = self.expression(0)
+
+        # Optional unit conversion: <expr> <unit> [in|to] <unit>
+        if self.peek()[0] == UNIT:
+            from_unit = self.next()[1]
+            if self.peek()[0] == CONVERT:
+                self.next()
+            to_unit = self.expect(UNIT)[1]
+            node = ('convert', node, from_unit, to_unit)
+
+        if self.peek()[0] is not None:
+            raise MathError(f"Unexpected '{self.peek()[1]}'")
+        return node
+
+    def expression(self, min_power: int):
+        node = self.prefix()
+
+        while True:
+            kind, value = self.peek()
+
+            if kind == OP and value == '%':
+                if POSTFIX_POWER < min_power:
+                    break
+                self.next()
+                node = ('pct', node)
+                continue
+
+            # Implicit multiplication: 2(3 + 4), 2 pi, 3 sqrt(4)
+            if kind in (LPAREN, FUNC, NAME, CONST) or (kind == NUM and self.tokens[self.position - 1][0] == RPAREN):
+                value, kind = '*', OP
+                implicit = True
+            else:
+                implicit = False
+
+            if kind != OP or value not in INFIX_POWER:
+                break
+
+            power = INFIX_POWER[value]
+            if power < min_power:
+                break
+            if not implicit:
+                self.next()
+
+            # ^ is right associative
+            right = self.expression(power if value == '^' else power + 1)
+            node = ('bin', value, node, right)
+
+        return node
+
+    def prefix(self):
+        kind, value = self.next()
+
+        if kind == NUM:
+            return ('num', value)
+        if kind == CONST:
+            return ('num', CONSTANTS[value])
+        if kind == NAME:
+            return ('var', value)
+        if kind == OP and value in ('-', '+'):
+            operand = self.expression(PREFIX_POWER)
+            return ('neg', operand) if value == '-' else operand
+        if kind == LPAREN:
+            node = self.expression(0)
+            self.expect(RPAREN)
+            return node
+        if kind == FUNC:
+            arity = FUNCTIONS[value][0]
+            if self.peek()[0] == LPAREN:
+                self.next()
+                args = [self.expression(0)]
+                while self.peek()[0] == COMMA:
+                    self.next()
+                    args.append(self.expression(0))
+                self.expect(RPAREN)
+            else:
+                # "sqrt 16", "square root of 16"
+                args = [self.expression(PREFIX_POWER)]
+            if len(args) != arity:
+                raise MathError(f"{value} takes {arity} argument{'s' if arity > 1 else ''}")
+            return ('call', value, args)
+
+        raise MathError("Incomplete expression" if kind is None else f"Unexpected '{value}'")
+
+
+@lru_cache(maxsize=1024)
+def _compile(tokens: Tuple[Tuple[str, object], ...]):
+    """Parse tokens into an AST; cached by the normalized token sequence"""
+    return _Parser(list(tokens)).parse()
+
+
+def compile_expression(text: str, variables: Sequence[str] = ()):
+    """Tokenize and parse text, reusing the cached AST for equivalent expressions"""
+    return _compile(tuple(tokenize(text, variables)))
+
+
+# ---------------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------------
+
+class _Evaluator:
+    """Walks an AST with a step budget and magnitude checks"""
+
+    def __init__(self, variables: Optional[Dict[str, object]] = None, vectorized: bool = False):
+        self.variables = variables or {}
+        self.vectorized = vectorized
+        self.steps = 0
+
+    def run(self, node):
+        self.steps += 1
+        if self.steps > MAX_STEPS:
+            raise MathError("Expression is too complex")
+
+        kind = node[0]
+        if kind == 'num':
+            return node[1]
+        if kind == 'var':
+            return self.variables[node[1]]
+        if kind == 'neg':
+            return self.check(-self.run(node[1]))
+        if kind == 'pct':
+            return self.check(self.run(node[1]) / 100)
+        if kind == 'bin':
+            return self.binary(node[1], self.run(node[2]), self.run(node[3]))
+        if kind == 'call':
+            return self.call(node[1], [self.run(arg) for arg in node[2]])
+        if kind == 'convert':
+            return self.convert(self.run(node[1]), node[2], node[3])
+        raise MathError(f"Unknown node '{kind}'")
+
+    def binary(self, op: str, left, right):
+        if op == '+':
+            return self.check(left + right)
+        if op == '-':
+            return self.check(left - right)
+        if op == '*':
+            return self.check(left * right)
+        if op in ('/', 'mod'):
+            if (np.any(right == 0) if self.vectorized else right == 0):
+                raise MathError("Division by zero")
+            if op == 'mod':
+                return self.check(left % right)
+            result = left / right
+            # Keep exact integers when the division is exact
+            if not self.vectorized and isinstance(left, int) and isinstance(right, int) and left % right == 0:
+                result = left // right
+            return self.check(result)
+        if op == '^':
+            return self.power(left, right)
+        raise MathError(f"Unknown operator '{op}'")
+
+    def power(self, base, exponent):
+        if self.vectorized:
+            if np.any(np.abs(exponent) > MAX_EXPONENT):
+                raise MathError("Exponent is too large")
+            return self.check(np.power(np.asarray(base, dtype=float), exponent))
+
+        if abs(exponent) > MAX_EXPONENT:
+            raise MathError("Exponent is too large")
+        # Estimate the size of the result before computing it
+        if base not in (0, 1, -1) and exponent > 0 and exponent * math.log10(abs(base)) > math.log10(MAX_MAGNITUDE):
+            raise MathError("Result is too large")
+        if isinstance(base, int) and isinstance(exponent, int) and exponent >= 0:
+            return self.check(base ** exponent)
+        try:
+            result = float(base) ** float(exponent)
+        except (OverflowError, ZeroDivisionError) as e:
+            raise MathError(str(e))
+        if isinstance(result, complex):
+            raise MathError("Result is not a real number")
+        return self.check(result)
+
+    def call(self, name: str, args: list):
+        if self.vectorized:
+            numpy_functions = {'sqrt': np.sqrt, 'abs': np.abs, 'round': np.round, 'floor': np.floor,
+                               'ceil': np.ceil, 'log': np.log10, 'ln': np.log, 'log2': np.log2, 'exp': np.exp,
+                               'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'min': np.minimum, 'max': np.maximum}
+            with np.errstate(all='ignore'):
+                return self.check(numpy_functions[name](*args))
+
+        try:
+            return self.check(FUNCTIONS[name][1](*args))
+        except (ValueError, OverflowError) as e:
+            raise MathError(f"{name}: {e}")
+
+    def convert(self, value, from_unit: str, to_unit: str):
+        if from_unit in TEMPERATURE_UNITS and to_unit in TEMPERATURE_UNITS:
+            celsius = {'C': lambda v: v, 'F': lambda v: (v - 32) * 5 / 9, 'K': lambda v: v - 273.15}
+            from_celsius = {'C': lambda v: v, 'F': lambda v: v * 9 / 5 + 32, 'K': lambda v: v + 273.15}
+            return self.check(from_celsius[TEMPERATURE_UNITS[to_unit]](celsius[TEMPERATURE_UNITS[from_unit]](value)))
+
+        if from_unit not in UNITS or to_unit not in UNITS:
+            raise MathError(f"Can't convert {from_unit} to {to_unit}")
+        from_dimension, from_factor = UNITS[from_unit]
+        to_dimension, to_factor = UNITS[to_unit]
+        if from_dimension != to_dimension:
+            raise MathError(f"Can't convert {from_dimension} to {to_dimension}")
+        return self.check(value * from_factor / to_factor)
+
+    def check(self, value):
+        """Reject results that are too large or not finite"""
+        if self.vectorized:
+            array = np.asarray(value, dtype=float)
+            if not np.all(np.isfinite(array)) or np.any(np.abs(array) > MAX_MAGNITUDE):
+                raise MathError("Result is too large or undefined")
+            return value
+        if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+            raise MathError("Result is too large or undefined")
+        if abs(value) > MAX_MAGNITUDE:
+            raise MathError("Result is too large")
+        return value
+
+
+def evaluate(text: str, variables: Optional[Dict[str, float]] = None):
+    """Evaluate a math expression written in symbols or words.
+
+    Raises MathError if nothing can be parsed or a limit is hit.
+    """
+    variables = variables or {}
+    ast = compile_expression(text, tuple(variables))
+    return _Evaluator(variables).run(ast)
+
+
+def evaluate_batch(expressions: Sequence[str]) -> List[object]:
+    """Evaluate many expressions, computing duplicates once.
+
+    Each item is either the result or the MathError raised for it.
+    """
+    results: Dict[str, object] = {}
+    output = []
+    for text in expressions:
+        if text not in results:
+            try:
+                results[text] = evaluate(text)
+            except MathError as e:
+                results[text] = e
+        output.append(results[text])
+    return output
+
+
+def evaluate_vectorized(text: str, **variables):
+    """Evaluate one expression over NumPy arrays of variable values (e.g. x=np.arange(10))"""
+    global np
+    if np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            raise MathError("NumPy is required for vectorized evaluation")
+    ast = compile_expression(text, tuple(variables))
+    arrays = {name: np.asarray(values, dtype=float) for name, values in variables.items()}
+    return _Evaluator(arrays, vectorized=True).run(ast)
+
+
+def format_number(value) -> str:
+    """Format a result for speech/text: integers as-is, floats to 10 significant digits"""
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    if isinstance(value, float):
+        return f"{value:.10g}"
+    return str(value)
@@ -0,0 +1,364 @@
+import asyncio
+import contextvars
+import importlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from config.settings import Config
+from intent_router import IntentMatch, IntentRouter
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = 'virtual_assistant.capabilities'
+
+TOOL_TIMEOUT_REPLY = "Sorry, looking that up is taking too long."
+TOOL_ERROR_REPLY = "Sorry, something went wrong while doing that."
+
+# Where one request in a turn ends and the next begins: "weather in Paris and London, and the time"
+CLAUSE_BOUNDARY = re.compile(r"\s*(?:[,;]|\band\b|\balso\b|\bthen\b)\s*", re.IGNORECASE)
+
+# Slot values that contain "and" themselves, so they are never split into two requests
+JOINED_NAMES = frozenset((
+    'antigua and barbuda', 'bosnia and herzegovina', 'heard island and mcdonald islands',
+    'saint kitts and nevis', 'saint pierre and miquelon', 'saint vincent and the grenadines',
+    'sao tome and principe', 'south georgia and the south sandwich islands', 'trinidad and tobago',
+    'turks and caicos', 'turks and caicos islands', 'wallis and futuna',
+))
+
+# Clauses that follow a request without being one ("weather in Rome, thanks")
+COURTESY_CLAUSES = frozenset(('thanks', 'thank you', 'please', 'ok', 'okay', 'cheers'))
+
+
+@dataclass
+class Trigger:
+    """Words, phrases or regexes that point the router at a capability (see IntentRouter.register)"""
+    keywords: Sequence[str] = ()
+    patterns: Sequence[str] = ()
+    weight: float = 1.0
+
+
+@dataclass
+class Capability:
+    """Something the assistant can do without the language model.
+
+    handler is a callable, the name of a method of the assistant, or a
+    "module:function" string imported on first use, so a plugin's heavy
+    imports only happen when it is first asked for. It is called with the
+    keyword arguments named in ``arguments``: ``query`` is the text of the
+    request, other names come from the router's slots and are converted with
+    the given type (missing or unconvertible ones are left out, so the
+    handler's defaults apply). io_bound capabilities run on the tool pool when
+    a turn asks for several things, and async_handler (same forms) is used by
+    the async assistant instead of a thread. repeatable capabilities take
+    follow-on requests that name no capability ("weather in Paris and
+    London").
+    """
+    name: str
+    handler: Union[Callable[..., str], str]
+    triggers: Sequence[Trigger] = ()
+    slots: Sequence[str] = ()
+    arguments: Dict[str, type] = field(default_factory=dict)
+    priority: int = 0
+    timeout: float = 10.0
+    io_bound: bool = False
+    repeatable: bool = False
+    async_handler: Union[Callable[..., Any], str, None] = None
+
+
+@dataclass
+class ToolCall:
+    """One capability to run for part of a turn"""
+    capability: Capability
+    kwargs: Dict[str, Any]
+
+
+BUILTIN_CAPABILITIES = (
+    Capability('weather', '_get_weather', async_handler='_get_weather_async',
+               triggers=(Trigger(keywords=('weather', 'temperature', 'forecast'), weight=2),
+                         Trigger(keywords=('raining', 'sunny', 'snowing', 'how hot', 'how cold'))),
+               slots=(r"\b(?:in|for|at)\s+(?P<city>[a-z][a-z .'-]*?)\s*(?:today|tomorrow|now|right now|please)?\s*[?.!]*$",),
+               arguments={'query': str, 'city': str}, timeout=15.0, io_bound=True, repeatable=True),
+    Capability('time', '_get_current_time',
+               triggers=(Trigger(keywords=('what time', 'time is it', 'current time', 'the time', 'what hour'), weight=3),
+                         Trigger(keywords=('time', 'clock')))),
+    Capability('calculation', '_calculate',
+               triggers=(Trigger(keywords=('calculate', 'compute', 'math', 'plus', 'minus', 'multiplied by', 'divided by',
+                                           'square root', 'squared', 'percent of', 'convert'), weight=2),
+                         # An actual arithmetic expression is the strongest signal, a lone hyphen is not
+                         Trigger(patterns=(r"\d\s*(?:[-+*/^x]|\*\*|times)\s*[(\d]", r"\d\s*%"), weight=3)),
+               arguments={'query': str}),
+    Capability('reminder', '_set_reminder', triggers=(Trigger(keywords=('remind', 'reminder', 'schedule'), weight=2),),
+               arguments={'query': str}),
+    Capability('joke', '_tell_joke', triggers=(Trigger(keywords=('joke', 'jokes', 'funny', 'laugh'), weight=2),)),
+)
+
+
+def register_triggers(router: IntentRouter, capability: Capability):
+    for trigger in capability.triggers:
+        router.register(capability.name, keywords=trigger.keywords, patterns=trigger.patterns,
+                        weight=trigger.weight, priority=capability.priority)
+    if capability.slots:
+        router.register(capability.name, slots=capability.slots, priority=capability.priority)
+
+
+def discover_plugins() -> List[Capability]:
+    """Capabilities advertised by installed packages under the virtual_assistant.capabilities entry point group.
+
+    An entry point names a Capability, a list of them, or a function returning
+    either. A plugin that fails to load is logged and skipped.
+    """
+    from importlib.metadata import entry_points
+
+    found = entry_points()
+    group = found.select(group=ENTRY_POINT_GROUP) if hasattr(found, 'select') else found.get(ENTRY_POINT_GROUP, ())
+    capabilities = []
+    for entry_point in group:
+        try:
+            loaded = entry_point.load()
+            if callable(loaded) and not isinstance(loaded, Capability):
+                loaded = loaded()
+            loaded = [loaded] if isinstance(loaded, Capability) else list(loaded)
+            if not all(isinstance(capability, Capability) for capability in loaded):
+                raise TypeError("expected Capability objects")
+            capabilities.extend(loaded)
+        except Exception as e:
+            logger.warning(f"Skipping plugin {entry_point.name}: {e}")
+    return capabilities
+
+
+class CapabilityRegistry:
+    """The capabilities an assistant can dispatch to, built-in and from plugins.
+
+    Routing is one pass of an IntentRouter over every capability's triggers.
+    Plugins are discovered on first use rather than at startup, because
+    scanning installed packages takes tens of milliseconds. When the input
+    routes to a capability, plan() splits it into clauses so one turn can
+    ask for several things; run() then calls the I/O-bound ones together on
+    a thread pool, each within its timeout, and joins the replies in order.
+    """
+
+    def __init__(self, owner: Any = None, capabilities: Iterable[Capability] = BUILTIN_CAPABILITIES,
+                 load_plugins: bool = True):
+        self.owner = owner
+        self.router = IntentRouter()
+        self._capabilities: Dict[str, Capability] = {}
+        self._handlers: Dict[tuple, Callable] = {}
+        self._plugins_loaded = not load_plugins
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        for capability in capabilities:
+            self.register(capability)
+
+    @classmethod
+    def from_config(cls, owner: Any) -> 'CapabilityRegistry':
+        return cls(owner, load_plugins=Config.PLUGINS_ENABLED)
+
+    def register(self, capability: Capability):
+        """Add a capability; names are unique and the first one registered keeps a name"""
+        if capability.name in self._capabilities:
+            logger.warning(f"Capability '{capability.name}' is already registered, ignoring the new one")
+            return
+        self._capabilities[capability.name] = capability
+        register_triggers(self.router, capability)
+
+    def load_plugins(self):
+        """Discover and register plugin capabilities once (safe to call from a background thread)"""
+        if self._plugins_loaded:
+            return
+        with self._lock:
+            if self._plugins_loaded:
+                return
+            for capability in discover_plugins():
+                self.register(capability)
+                logger.info(f"Loaded plugin capability '{capability.name}'")
+            self._plugins_loaded = True
+
+    def route(self, text: str) -> Optional[IntentMatch]:
+        self.load_plugins()
+        return self.router.route(text)
+
+    def plan(self, text: str, match: IntentMatch) -> List[ToolCall]:
+        """Tool calls for a turn the router matched: one per request when every clause is part of one"""
+        single = [self._call(match, text)]
+        spans, start = [], 0
+        for boundary in CLAUSE_BOUNDARY.finditer(text):
+            spans.append((start, boundary.start()))
+            start = boundary.end()
+        spans = [(start, end) for start, end in spans + [(start, len(text))] if end > start]
+        if len(spans) < 2:
+            return single
+
+        requests = []  # [match, start, end, wording before a bare slot value or None] per request
+        for start, end in spans:
+            clause_match = self.router.route(text[start:end])
+            last = requests[-1] if requests else None
+            if clause_match is None:
+                if last is None:
+                    return single
+                intent = last[0].intent
+                joined = self.router.extract_slots(intent, text[last[1]:end])
+                slots, lead = {}, None
+                if (self._capabilities[intent].repeatable and JOINED_NAMES.isdisjoint(
+                        value.lower() for value in joined.values())):
+                    slots, lead = self._repeat_slots(last, text, start, end)
+                if not slots:
+                    # Still part of the last request ("remind me to buy milk and eggs",
+                    # "weather in Bosnia and Herzegovina"), so read its slots again over all of it
+                    last[0] = IntentMatch(intent, last[0].score, joined or last[0].slots)
+                    last[2] = end
+                    continue
+                # The same kind of request again ("weather in Paris and London")
+                requests.append([IntentMatch(intent, 0.0, slots), start, end, lead])
+                continue
+            elif last is not None and clause_match.intent == last[0].intent and not clause_match.slots:
+                # More about the same request ("weather in Paris and is it raining")
+                last[2] = end
+                continue
+            requests.append([clause_match, start, end, None])
+
+        if len(requests) < 2:
+            # One request after all, but its slots are better read from where it was made
+            return [self._call(requests[0][0], text)]
+        return [self._call(request, text[start:end]) for request, start, end, _ in requests]
+
+    def _repeat_slots(self, last: list, text: str, start: int, end: int) -> Tuple[Dict[str, str], Optional[str]]:
+        """Slots of a clause that repeats the last request for something else, and the wording used.
+
+        A clause that fills the slots itself ("and in London") is read as is;
+        a bare value ("and London") is read after the wording that came before
+        the last request's slot value ("weather in Paris" -> "weather in London").
+        """
+        clause = text[start:end]
+        if clause.lower().strip(' .!?') in COURTESY_CLAUSES:
+            return {}, None
+        match, lead = last[0], last[3]
+        found = self.router.extract_slots(match.intent, clause)
+        if found or not match.slots:
+            return found, None
+        if lead is None:
+            request = text[last[1]:last[2]].lower()
+            positions = [request.rfind(value.lower()) for value in match.slots.values()]
+            at = max(positions)
+            if at < 0:
+                return {}, None
+            lead = text[last[1]:last[1] + at]
+        return self.router.extract_slots(match.intent, lead + clause), lead
+
+    def _call(self, match: IntentMatch, text: str) -> ToolCall:
+        capability = self._capabilities[match.intent]
+        kwargs = {}
+        for name, kind in capability.arguments.items():
+            value = text if name == 'query' else match.slots.get(name)
+            if value is None:
+                continue
+            try:
+                kwargs[name] = kind(value)
+            except (TypeError, ValueError):
+                logger.debug("Ignoring %s=%r for %s", name, value, capability.name)
+        return ToolCall(capability, kwargs)
+
+    def _resolve(self, capability: Capability, asynchronous: bool = False) -> Callable:
+        """The callable for a handler given as a callable, a method name or "module:function\""""
+        key = (capability.name, asynchronous)
+        resolved = self._handlers.get(key)
+        if resolved is None:
+            handler = capability.async_handler if asynchronous else capability.handler
+            if callable(handler):
+                resolved = handler
+            elif ':' in handler:
+                module, _, attribute = handler.partition(':')
+                resolved = getattr(importlib.import_module(module), attribute)
+            else:
+                resolved = getattr(self.owner, handler)
+            self._handlers[key] = resolved
+        return resolved
+
+    def call(self, call: ToolCall) -> str:
+        """Run one tool call in this thread"""
+        capability = call.capability
+        with telemetry.span(f'capability.{capability.name}') as span:
+            try:
+                return self._resolve(capability)(**call.kwargs)
+            except Exception as e:
+                logger.error(f"Capability {capability.name} failed: {e}")
+                span.fail(type(e).__name__)
+                return TOOL_ERROR_REPLY
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=Config.TOOL_WORKERS, thread_name_prefix='tool')
+        return self._executor
+
+    def run(self, calls: List[ToolCall]) -> str:
+        """Run a turn's tool calls, the I/O-bound ones concurrently, and join their replies in order"""
+        if len(calls) == 1:
+            return self.call(calls[0])
+
+        with telemetry.span('tools', calls=len(calls)):
+            started = time.monotonic()
+            futures = {index: self._pool().submit(contextvars.copy_context().run, self.call, call)
+                       for index, call in enumerate(calls) if call.capability.io_bound}
+            replies = [None if index in futures else self.call(call) for index, call in enumerate(calls)]
+            for index, future in futures.items():
+                remaining = started + calls[index].capability.timeout - time.monotonic()
+                done, _ = wait([future], timeout=max(0.0, remaining))
+                if done:
+                    replies[index] = future.result()
+                else:
+                    logger.warning(f"Capability {calls[index].capability.name} timed out")
+                    replies[index] = TOOL_TIMEOUT_REPLY
+            return ' '.join(replies)
+
+    async def call_async(self, call: ToolCall) -> str:
+        """Run one tool call without blocking the event loop"""
+        capability = call.capability
+        if capability.async_handler is not None:
+            with telemetry.span(f'capability.{capability.name}') as span:
+                try:
+                    handler = self._resolve(capability, asynchronous=True)
+                    return await asyncio.wait_for(handler(**call.kwargs), capability.timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Capability {capability.name} timed out")
+                    span.fail('timeout')
+                    return TOOL_TIMEOUT_REPLY
+                except Exception as e:
+                    logger.error(f"Capability {capability.name} failed: {e}")
+                    span.fail(type(e).__name__)
+                    return TOOL_ERROR_REPLY
+        if not capability.io_bound:
+            # Local and fast, so it runs inline
+            return self.call(call)
+
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self._pool(), context.run, self.call, call),
+                                          capability.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Capability {capability.name} timed out")
+            return TOOL_TIMEOUT_REPLY
+
+    async def run_async(self, calls: List[ToolCall]) -> str:
+        """Async version of run(): every call is awaited together"""
+        if len(calls) == 1:
+            return await self.call_async(calls[0])
+        with telemetry.span('tools', calls=len(calls)):
+            return ' '.join(await asyncio.gather(*(self.call_async(call) for call in calls)))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._capabilities
+
+    def __getitem__(self, name: str) -> Capability:
+        return self._capabilities[name]
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._capabilities)
@@ -0,0 +1,293 @@
+import heapq
+import logging
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from config.settings import Config
+from math_engine import NUMBER_WORDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Reminder:
+    id: int
+    text: str
+    due_at: float  # Unix timestamp
+
+
+# ---------------------------------------------------------------------------
+# Time expression parsing
+# ---------------------------------------------------------------------------
+
+UNIT_SECONDS = {'second': 1, 'sec': 1, 'minute': 60, 'min': 60, 'hour': 3600, 'hr': 3600,
+                'day': 86400, 'week': 604800}
+
+RELATIVE_TIME = re.compile(
+    r"\bin\s+(?P<amount>\d+(?:\.\d+)?|an?|half an?|" + '|'.join(NUMBER_WORDS) + r")\s*"
+    r"(?P<unit>seconds?|secs?|minutes?|mins?|hours?|hrs?|days?|weeks?)\b",
+    re.IGNORECASE
+)
+CLOCK_TIME = re.compile(
+    r"\b(?:at\s+)?(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>a\.?m\.?|p\.?m\.?)(?=\W|$)"
+    r"|\bat\s+(?P<hour24>\d{1,2}):(?P<minute24>\d{2})\b"
+    r"|\bat\s+(?P<named>noon|midnight)\b",
+    re.IGNORECASE
+)
+DAY_WORD = re.compile(r"\b(?P<day>today|tonight|tomorrow)\b", re.IGNORECASE)
+REMINDER_PREFIX = re.compile(
+    r"^.*?\b(?:remind\s+me|set\s+(?:a\s+)?reminder|schedule(?:\s+a)?(?:\s+reminder)?)\b\s*(?:to|about|that|for)?\s*",
+    re.IGNORECASE
+)
+
+
+def parse_reminder(query: str, now: Optional[datetime] = None) -> Tuple[Optional[str], Optional[datetime]]:
+    """Split a reminder request into (what, when).
+
+    Understands relative times ("in 10 minutes", "in half an hour"), clock
+    times ("at 5pm", "at 17:30", "at noon") and the day words today, tonight
+    and tomorrow. Either part is None if it couldn't be found.
+    """
+    now = now or datetime.now()
+    due_at = None
+    remaining = query
+
+    relative = RELATIVE_TIME.search(remaining)
+    if relative:
+        amount_text = relative.group('amount').lower()
+        if amount_text.startswith('half'):
+            amount = 0.5
+        elif amount_text in ('a', 'an'):
+            amount = 1
+        elif amount_text in NUMBER_WORDS:
+            amount = NUMBER_WORDS[amount_text]
+        else:
+            amount = float(amount_text)
+        unit = relative.group('unit').lower().rstrip('s')
+        due_at = now + timedelta(seconds=amount * UNIT_SECONDS[unit])
+        remaining = remaining[:relative.start()] + remaining[relative.end():]
+    else:
+        clock = CLOCK_TIME.search(remaining)
+        day = DAY_WORD.search(remaining)
+        if clock or day:
+            hour, minute = 9, 0  # "tomorrow" on its own means tomorrow morning
+            if clock:
+                hour, minute = _clock_from_match(clock)
+                remaining = remaining[:clock.start()] + remaining[clock.end():]
+            elif day.group('day').lower() == 'tonight':
+                hour = 20
+
+            due_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if day and day.group('day').lower() == 'tomorrow':
+                due_at += timedelta(days=1)
+            elif due_at <= now:
+                # "at 8am" after 8am means tomorrow
+                due_at += timedelta(days=1)
+
+            day = DAY_WORD.search(remaining)
+            if day:
+                remaining = remaining[:day.start()] + remaining[day.end():]
+
+    text = REMINDER_PREFIX.sub('', remaining, count=1)
+    text = ' '.join(text.split()).strip(' .,!?')
+    return (text or None), due_at
+
+
+def _clock_from_match(match: re.Match) -> Tuple[int, int]:
+    """Turn a CLOCK_TIME match into 24-hour (hour, minute)"""
+    if match.group('named'):
+        return (12, 0) if match.group('named').lower() == 'noon' else (0, 0)
+    if match.group('hour24'):
+        return int(match.group('hour24')) % 24, int(match.group('minute24')) % 60
+
+    hour = int(match.group('hour')) % 12
+    if match.group('ampm').lower().startswith('p'):
+        hour += 12
+    return hour, int(match.group('minute') or 0) % 60
+
+
+# ---------------------------------------------------------------------------
+# Storage
+# ---------------------------------------------------------------------------
+
+class ReminderStore:
+    """Append-only sqlite store.
+
+    Reminders are only ever inserted; firing or cancelling one appends a row
+    to reminder_events instead of updating it, so writes never rewrite pages
+    of the large reminders table.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS reminders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                due_at REAL NOT NULL,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS reminders_due_at ON reminders (due_at);
+            CREATE TABLE IF NOT EXISTS reminder_events (
+                reminder_id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def add(self, text: str, due_at: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO reminders (due_at, text, created_at) VALUES (?, ?, ?)", (due_at, text, time.time())
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def close_reminder(self, reminder_id: int, kind: str = 'fired'):
+        """Record that a reminder was fired or cancelled"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO reminder_events (reminder_id, kind, at) VALUES (?, ?, ?)",
+                (reminder_id, kind, time.time())
+            )
+            self._conn.commit()
+
+    def pending_between(self, start: float, end: float) -> List[Reminder]:
+        """Open reminders with start < due_at <= end (uses the due_at index)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.id, r.text, r.due_at FROM reminders r "
+                "LEFT JOIN reminder_events e ON e.reminder_id = r.id "
+                "WHERE r.due_at > ? AND r.due_at <= ? AND e.reminder_id IS NULL",
+                (start, end)
+            ).fetchall()
+        return [Reminder(*row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Scheduler
+# ---------------------------------------------------------------------------
+
+class ReminderScheduler:
+    """Fires reminders from a background thread using a min-heap.
+
+    Only reminders due within the next ``horizon`` seconds are held in the
+    heap; later ones stay on disk and are loaded when the window moves
+    forward. Startup therefore reads just the near-term slice of the store,
+    inserts are O(log n) and finding the next due reminder is O(1).
+    """
+
+    def __init__(self, store: ReminderStore, horizon: float = 3600):
+        self.store = store
+        self.horizon = horizon
+        self._heap: List[Tuple[float, int, str]] = []
+        self._cancelled = set()  # ids skipped when they reach the top of the heap
+        self._loaded_until = float('-inf')  # everything due up to here is in the heap
+        self._condition = threading.Condition()
+        self._listeners: List[Callable[[Reminder], None]] = []
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls) -> 'ReminderScheduler':
+        return cls(ReminderStore(Config.REMINDER_DB_PATH), horizon=Config.REMINDER_LOAD_HORIZON)
+
+    def add_listener(self, callback: Callable[[Reminder], None]):
+        """Call callback(reminder) from the scheduler thread when a reminder is due"""
+        self._listeners.append(callback)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='reminder-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def add(self, text: str, due_at: datetime) -> Reminder:
+        """Persist a reminder and schedule it"""
+        timestamp = due_at.timestamp()
+
+        # Insert under the lock too, so a refill can't load the new row and push it a second time
+        with self._condition:
+            reminder_id = self.store.add(text, timestamp)
+            # Reminders beyond the loaded window are picked up from disk later
+            if timestamp <= self._loaded_until:
+                heapq.heappush(self._heap, (timestamp, reminder_id, text))
+                self._condition.notify()
+
+        return Reminder(reminder_id, text, timestamp)
+
+    def cancel(self, reminder_id: int):
+        """Cancel a pending reminder"""
+        self.store.close_reminder(reminder_id, 'cancelled')
+        with self._condition:
+            self._cancelled.add(reminder_id)
+
+    def _refill(self, now: float):
+        """Move the load window forward and push newly covered reminders (lock must be held)"""
+        start = self._loaded_until
+        end = now + self.horizon
+        for reminder in self.store.pending_between(start, end):
+            heapq.heappush(self._heap, (reminder.due_at, reminder.id, reminder.text))
+        self._loaded_until = end
+
+    def _run(self):
+        while not self._stopped.is_set():
+            due: List[Reminder] = []
+            with self._condition:
+                now = time.time()
+                if now + self.horizon / 2 >= self._loaded_until:
+                    try:
+                        self._refill(now)
+                    except Exception as e:
+                        logger.error(f"Failed to load reminders: {e}")
+
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, reminder_id, text = heapq.heappop(self._heap)
+                    if reminder_id in self._cancelled:
+                        self._cancelled.discard(reminder_id)
+                        continue
+                    due.append(Reminder(reminder_id, text, due_at))
+
+                if not due:
+                    # Sleep until the next reminder or the next refill, whichever is first
+                    wake_at = self._loaded_until - self.horizon / 2
+                    if self._heap:
+                        wake_at = min(wake_at, self._heap[0][0])
+                    self._condition.wait(timeout=max(0.0, min(wake_at - now, 60)))
+                    continue
+
+            for reminder in due:
+                self._deliver(reminder)
+
+    def _deliver(self, reminder: Reminder):
+        if not self._listeners:
+            logger.info(f"Reminder due: {reminder.text}")
+        for callback in self._listeners:
+            try:
+                callback(reminder)
+            except Exception as e:
+                logger.error(f"Reminder delivery error: {e}")
+        try:
+            self.store.close_reminder(reminder.id, 'fired')
+        except Exception as e:
+            logger.error(f"Failed to mark reminder as fired: {e}")
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(namespace: str, *parts) -> str:
+    """Build a compact cache key from a namespace and any JSON-serializable parts"""
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return f"{namespace}:{digest[:32]}"
+
+
+class SQLiteCacheStore:
+    """On-disk cache tier backed by a single sqlite table.
+
+    Expired rows are purged when the store is opened and then every
+    ``sweep_interval`` seconds of writes, which also trims the table to
+    ``max_entries`` rows by dropping the ones closest to expiring.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, sweep_interval: float = 60):
+        self.path = path
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        self._conn.commit()
+        self._next_sweep = 0.0
+        self.sweep()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (value, expires_at) or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, key: str, value, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._conn.commit()
+        if time.monotonic() >= self._next_sweep:
+            self.sweep()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def sweep(self) -> int:
+        """Remove expired rows and any beyond max_entries; returns how many were removed"""
+        self._next_sweep = time.monotonic() + self.sweep_interval
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            excess = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at LIMIT ?)", (excess,)
+                ).rowcount
+        if removed:
+            logger.debug("Removed %d rows from the on-disk cache", removed)
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """Bounded in-memory LRU cache with per-entry TTLs and an optional on-disk tier.
+
+    Lookups check memory first, then the store (promoting hits back into
+    memory). Counters for hits, misses, evictions and expirations are kept in
+    ``stats`` so callers can report the cache's effectiveness.
+    """
+
+    def __init__(self, max_entries: int = 1024, store: Optional[SQLiteCacheStore] = None):
+        self.max_entries = max_entries
+        self.store = store
+        self._entries: "OrderedDict[str, Tuple[object, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    @classmethod
+    def from_config(cls) -> Optional['ResponseCache']:
+        """Create the cache described by Config, or None when caching is disabled"""
+        if not Config.CACHE_ENABLED:
+            return None
+
+        store = None
+        if Config.CACHE_DB_PATH:
+            try:
+                store = SQLiteCacheStore(Config.CACHE_DB_PATH, max_entries=Config.CACHE_DB_MAX_ENTRIES)
+            except Exception as e:
+                logger.warning(f"On-disk cache unavailable, using memory only: {e}")
+
+        return cls(max_entries=Config.CACHE_MAX_ENTRIES, store=store)
+
+    def get(self, key: str):
+        """Return the cached value, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                del self._entries[key]
+                self.stats['expirations'] += 1
+
+        if self.store is not None:
+            try:
+                stored = self.store.get(key)
+                if stored is not None:
+                    value, expires_at = stored
+                    if expires_at > now:
+                        with self._lock:
+                            self._insert(key, value, expires_at)
+                            self.stats['hits'] += 1
+                        return value
+                    self.store.delete(key)
+                    with self._lock:
+                        self.stats['expirations'] += 1
+            except Exception as e:
+                logger.error(f"Cache store read error: {e}")
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value, ttl: float):
+        """Cache a value for ttl seconds"""
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._insert(key, value, expires_at)
+
+        if self.store is not None:
+            try:
+                self.store.set(key, value, expires_at)
+            except Exception as e:
+                logger.error(f"Cache store write error: {e}")
+
+    def _insert(self, key: str, value, expires_at: float):
+        """Insert into the LRU, evicting the oldest entries beyond max_entries (lock must be held)"""
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
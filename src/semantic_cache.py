@@ -0,0 +1,375 @@
+import importlib.util
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from config.settings import Config
+from response_cache import make_key
+import telemetry
+
+# numpy (and sentence-transformers, if used) are imported on first use to keep startup fast
+
+logger = logging.getLogger(__name__)
+
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec('sentence_transformers') is not None
+
+SEMANTIC_LOOKUPS = telemetry.counter('assistant_semantic_cache_total',
+                                     "Semantic cache lookups by result (hit, miss, skip)", ('result',))
+
+# Words that make a question depend on who asks, on earlier turns or on when it is asked, and
+# negations, which flip a question's meaning while barely moving its vector; answers to such
+# questions are neither looked up nor shared (nor are ones with a "n't" word)
+UNSHAREABLE_WORDS = frozenset((
+    'i', "i'm", "i've", "i'd", "i'll", 'my', 'mine', 'myself', 'we', 'us', 'our', 'ours',
+    'it', 'its', 'this', 'that', 'these', 'those', 'they', 'them', 'their', 'he', 'him', 'his', 'she', 'her',
+    'again', 'more', 'else', 'another', 'previous', 'above', 'earlier', 'same',
+    'today', 'tonight', 'tomorrow', 'yesterday', 'now', 'currently', 'latest', 'recent', 'news',
+    'not', 'no', 'never', 'nor', 'cannot', 'without', 'except',
+))
+
+# Words that carry no meaning for matching; question words stay, "how" and "why" questions differ
+FILLER_WORDS = frozenset((
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'do', 'does', 'did', 'of', 'to', 'in', 'on',
+    'at', 'for', 'and', 'or', 'can', 'could', 'would', 'you', 'your', 'please', 'tell', 'me', 'know', 'explain',
+    'want', 'like', 'some', 'any', 'about', 'hey', 'hi', 'so', 'just', 'really',
+))
+
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def question_words(text: str) -> List[str]:
+    """Lowercased words of a question, with possessives and plurals folded ("France's" -> "france")"""
+    words = []
+    for word in WORD.findall(text.lower()):
+        if word.endswith("'s"):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith('s') and not word.endswith('ss') and word not in FILLER_WORDS:
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def content_words(words: List[str]) -> List[str]:
+    return [word for word in words if word not in FILLER_WORDS]
+
+
+def is_shareable(words: List[str]) -> bool:
+    """Whether the answer to a question can be reused for anyone asking it in any conversation"""
+    return (bool(words) and len(words) <= Config.SEMANTIC_CACHE_MAX_WORDS and UNSHAREABLE_WORDS.isdisjoint(words)
+            and not any(word.endswith("n't") for word in words))
+
+
+class HashingEmbedder:
+    """Local, dependency-free embedding of a question's wording.
+
+    Content words and their character trigrams are hashed into a fixed-size
+    vector, so rewordings that keep the key words ("capital of France?",
+    "what's France's capital city") land close together. It does not know
+    synonyms and scores "capital of France" close to "capital of Spain", so
+    with it a match may add or drop words but not swap one (see
+    ``exact_words``). Use SentenceTransformerEmbedder for real paraphrases.
+    """
+
+    name = 'hashing'
+    exact_words = True
+
+    def __init__(self, dim: int = 256, trigram_weight: float = 0.5):
+        self.dim = dim
+        self.trigram_weight = trigram_weight
+
+    def _add(self, vector, features: List[str], weight: float):
+        import numpy as np
+        if not features:
+            return
+        part = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            code = zlib.crc32(feature.encode('utf-8'))
+            part[code % self.dim] += 1.0 if code & 0x80000000 else -1.0
+        norm = np.linalg.norm(part)
+        if norm:
+            vector += part * (weight / norm)
+
+    def embed(self, words: List[str]):
+        """Unit-length float32 vector, or None when the question has no content words"""
+        import numpy as np
+        content = content_words(words)
+        if not content:
+            return None
+        vector = np.zeros(self.dim, dtype=np.float32)
+        self._add(vector, content, 1.0)
+        self._add(vector, [f'#{word}#'[i:i + 3] for word in content for i in range(len(word))], self.trigram_weight)
+        return vector / np.linalg.norm(vector)
+
+
+class SentenceTransformerEmbedder:
+    """Embeddings from a local sentence-transformers model (pip install sentence-transformers)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.name = f'sentence-transformers:{model_name}'
+        self.exact_words = False
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, words: List[str]):
+        import numpy as np
+        return self.model.encode(' '.join(words), normalize_embeddings=True).astype(np.float32)
+
+
+def create_embedder(kind: str):
+    """Embedder for a SEMANTIC_CACHE_EMBEDDER value"""
+    if kind == 'hashing':
+        return HashingEmbedder()
+    if kind == 'sentence-transformers':
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise ValueError("SEMANTIC_CACHE_EMBEDDER=sentence-transformers needs the sentence-transformers package")
+        return SentenceTransformerEmbedder(Config.SEMANTIC_CACHE_MODEL)
+    raise ValueError(f"Unknown semantic cache embedder '{kind}'")
+
+
+def split_prompt(messages: list) -> Tuple[Optional[str], str]:
+    """(question, the assistant's system prompt) of a chat request.
+
+    The question is None unless it opens the conversation: after earlier
+    turns (or their summary) even "why?" depends on what came before.
+    """
+    has_prompt = bool(messages) and messages[0].get('role') == 'system'
+    context = messages[0]['content'] if has_prompt else ''
+    turn = messages[1:] if has_prompt else messages
+    if len(turn) != 1 or turn[0].get('role') != 'user':
+        return None, context
+    return turn[0]['content'], context
+
+
+class SemanticCacheFiles:
+    """Keeps a semantic cache across restarts: vectors in a memory-mapped file, answers in sqlite.
+
+    The vector file is mapped rather than read, so a large cache is usable as
+    soon as it is opened. A slot only counts as filled once its row exists,
+    which is written after the vector.
+    """
+
+    def __init__(self, directory: str, embedder_name: str, dim: int, max_entries: int):
+        import numpy as np
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, 'entries.db'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (slot INTEGER PRIMARY KEY, context TEXT NOT NULL, "
+            "question TEXT NOT NULL, answer TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+        # Vectors from another embedder or shape can't be compared with new ones, so start over
+        layout = f"{embedder_name}/{dim}/{max_entries}"
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        vectors_path = os.path.join(directory, 'vectors.f32')
+        fresh = row is None or row[0] != layout or not os.path.exists(vectors_path)
+        if fresh:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('layout', ?)", (layout,))
+        self._conn.commit()
+        self.vectors = np.memmap(vectors_path, dtype=np.float32, mode='w+' if fresh else 'r+',
+                                 shape=(max_entries, dim))
+
+    def entries(self) -> list:
+        """(slot, context, question, answer, expires_at) rows that haven't expired"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT slot, context, question, answer, expires_at FROM entries WHERE expires_at > ?", (time.time(),)
+            ).fetchall()
+
+    def write(self, slot: int, context: str, question: str, answer: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (slot, context, question, answer, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (slot, context, question, answer, expires_at)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.vectors.flush()
+            self._conn.close()
+
+
+class SemanticCache:
+    """LLM answers found again by what a question means rather than its exact text.
+
+    The question that opens a conversation is normalized and embedded; a
+    lookup is one matrix-vector product against every cached question's
+    vector, and the best match is used when its cosine similarity reaches
+    ``threshold``. Later turns and questions that aren't stand-alone (see
+    is_shareable) don't take part, and an answer is only reused under the
+    same system prompt. Entries expire after their TTL;
+    when the cache is full, expired and then least recently used entries are
+    replaced. Counters for hits, misses, skips, evictions and expirations are
+    kept in ``stats``.
+    """
+
+    def __init__(self, embedder=None, threshold: float = 0.8, max_entries: int = 4096,
+                 files: Optional[SemanticCacheFiles] = None):
+        import numpy as np
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.files = files
+        dim = self.embedder.dim
+
+        self._vectors = files.vectors if files is not None else np.zeros((max_entries, dim), dtype=np.float32)
+        self._context_ids = np.full(max_entries, -1, dtype=np.int32)  # -1 marks an empty slot
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._answers: List[Optional[str]] = [None] * max_entries
+        self._words: List[Optional[frozenset]] = [None] * max_entries  # content words, for exact_words embedders
+        self._contexts = {}  # context key -> small id compared in the matrix
+        self._size = 0  # slots below this have been used
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'skipped': 0, 'evictions': 0, 'expirations': 0}
+
+        if files is not None:
+            # Entries from before a restart rank as least recently used until they are hit again
+            for slot, context, question, answer, expires_at in files.entries():
+                self._context_ids[slot] = self._contexts.setdefault(context, len(self._contexts))
+                self._expires[slot] = expires_at
+                self._answers[slot] = answer
+                self._words[slot] = frozenset(content_words(question.split()))
+                self._size = max(self._size, slot + 1)
+
+    @classmethod
+    def from_config(cls) -> Optional['SemanticCache']:
+        """Create the cache described by Config, or None when it is disabled or can't be set up"""
+        if not Config.SEMANTIC_CACHE_ENABLED:
+            return None
+        if not NUMPY_AVAILABLE:
+            logger.warning("Semantic cache needs numpy, continuing without it")
+            return None
+
+        try:
+            embedder = create_embedder(Config.SEMANTIC_CACHE_EMBEDDER)
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled: {e}")
+            return None
+
+        files = None
+        if Config.SEMANTIC_CACHE_DIR:
+            try:
+                files = SemanticCacheFiles(Config.SEMANTIC_CACHE_DIR, embedder.name, embedder.dim,
+                                           Config.SEMANTIC_CACHE_MAX_ENTRIES)
+            except Exception as e:
+                logger.warning(f"Semantic cache files unavailable, using memory only: {e}")
+
+        return cls(embedder, threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+                   max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES, files=files)
+
+    def _prepare(self, messages: list) -> Tuple[Optional[object], List[str], str]:
+        """(question vector or None if the question can't be shared, its words, context key)"""
+        question, context = split_prompt(messages)
+        words = question_words(question) if question is not None else []
+        vector = self.embedder.embed(words) if is_shareable(words) else None
+        return vector, words, make_key('semantic', context)
+
+    def _match(self, vector, words: frozenset, context_id: int, now: float) -> Tuple[Optional[int], float]:
+        """Slot and similarity of the live entry a question matches, if any (lock must be held)"""
+        import numpy as np
+        size = self._size
+        if not size:
+            return None, 0.0
+        scores = self._vectors[:size] @ vector
+        live = (self._context_ids[:size] == context_id) & (self._expires[:size] > now)
+        scores = np.where(live, scores, -1.0)
+        slot = int(np.argmax(scores))
+        similarity = float(scores[slot])
+        if similarity < self.threshold:
+            return None, similarity
+        if getattr(self.embedder, 'exact_words', False):
+            cached = self._words[slot]
+            if words - cached and cached - words:
+                return None, similarity
+        return slot, similarity
+
+    def get(self, messages: list) -> Optional[str]:
+        """Cached answer to a question that means the same as the latest one, or None"""
+        vector, words, context = self._prepare(messages)
+        if vector is None:
+            with self._lock:
+                self.stats['skipped'] += 1
+            SEMANTIC_LOOKUPS.inc(result='skip')
+            return None
+
+        now = time.time()
+        answer = None
+        with self._lock:
+            context_id = self._contexts.get(context)
+            if context_id is not None:
+                slot, similarity = self._match(vector, frozenset(content_words(words)), context_id, now)
+                if slot is not None:
+                    self._last_used[slot] = now
+                    answer = self._answers[slot]
+            self.stats['hits' if answer is not None else 'misses'] += 1
+
+        if answer is None:
+            SEMANTIC_LOOKUPS.inc(result='miss')
+            return None
+        SEMANTIC_LOOKUPS.inc(result='hit')
+        telemetry.current_span().set(semantic_similarity=round(similarity, 3))
+        return answer
+
+    def set(self, messages: list, answer: str, ttl: float):
+        """Remember the answer to the latest question for ttl seconds"""
+        if ttl <= 0 or not answer:
+            return
+        vector, words, context = self._prepare(messages)
+        if vector is None:
+            return
+
+        now = time.time()
+        expires_at = now + ttl
+        content = frozenset(content_words(words))
+        with self._lock:
+            context_id = self._contexts.setdefault(context, len(self._contexts))
+            slot = self._free_slot(vector, content, context_id, now)
+            self._vectors[slot] = vector
+            self._context_ids[slot] = context_id
+            self._expires[slot] = expires_at
+            self._last_used[slot] = now
+            self._answers[slot] = answer
+            self._words[slot] = content
+            if self.files is not None:
+                try:
+                    self.files.write(slot, context, ' '.join(words), answer, expires_at)
+                except Exception as e:
+                    logger.error(f"Semantic cache write error: {e}")
+
+    def _free_slot(self, vector, words: frozenset, context_id: int, now: float) -> int:
+        """Slot for a new entry: the one it duplicates, an unused one, or the one to evict (lock must be held)"""
+        import numpy as np
+        slot, _ = self._match(vector, words, context_id, now)
+        if slot is not None:
+            return slot
+        if self._size < self.max_entries:
+            self._size += 1
+            return self._size - 1
+
+        # Empty slots first, then expired entries, then the least recently used one
+        priority = np.where(self._context_ids < 0, -2.0, np.where(self._expires <= now, -1.0, self._last_used))
+        slot = int(np.argmin(priority))
+        if priority[slot] == -1.0:
+            self.stats['expirations'] += 1
+        elif priority[slot] >= 0:
+            self.stats['evictions'] += 1
+        return slot
+
+    def close(self):
+        if self.files is not None:
+            self.files.close()
+
+    def __len__(self) -> int:
+        return int((self._context_ids[:self._size] >= 0).sum())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Virtual Assistant HTTP/WebSocket Server
+Run this file to serve many conversations from one process
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import uuid
+from contextlib import aclosing
+from pathlib import Path
+
+from aiohttp import web, WSMsgType
+
+# Add src directory to path
+sys.path.append(str(Path(__file__).parent))
+
+from async_assistant import AsyncVirtualAssistant, AssistantBusyError
+from config.settings import Config
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+ASSISTANT_KEY = web.AppKey('assistant', AsyncVirtualAssistant)
+
+
+async def handle_chat(request: web.Request) -> web.Response:
+    """POST /chat with {"session_id": ..., "message": ...}"""
+    try:
+        payload = await request.json()
+    except json.JSONDecodeError:
+        return web.json_response({'error': 'Request body must be JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return web.json_response({'error': 'Request body must be a JSON object'}, status=400)
+
+    message = str(payload.get('message', '')).strip()
+    if not message:
+        return web.json_response({'error': "'message' is required"}, status=400)
+    session_id = str(payload.get('session_id') or uuid.uuid4())
+
+    try:
+        response = await request.app[ASSISTANT_KEY].process_text_input_async(message, session_id)
+    except AssistantBusyError as e:
+        return web.json_response({'error': str(e)}, status=503, headers={'Retry-After': '1'})
+
+    return web.json_response({'session_id': session_id, 'response': response})
+
+
+async def handle_reset(request: web.Request) -> web.Response:
+    """DELETE /sessions/{session_id}"""
+    await request.app[ASSISTANT_KEY].reset_session(request.match_info['session_id'])
+    return web.json_response({'status': 'ok'})
+
+
+async def handle_websocket(request: web.Request) -> web.WebSocketResponse:
+    """GET /ws - one session per connection, responses are streamed token by token"""
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+
+    assistant = request.app[ASSISTANT_KEY]
+    session_id = request.query.get('session_id') or str(uuid.uuid4())
+    await ws.send_json({'type': 'session', 'session_id': session_id})
+
+    try:
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+
+            message = msg.data.strip()
+            if not message:
+                continue
+
+            try:
+                # Closed right away if sending fails, so the partial reply is saved and the session unlocked
+                async with aclosing(assistant.process_text_input_stream_async(message, session_id)) as tokens:
+                    async for token in tokens:
+                        await ws.send_json({'type': 'token', 'content': token})
+                await ws.send_json({'type': 'end'})
+            except AssistantBusyError as e:
+                await ws.send_json({'type': 'error', 'error': str(e)})
+    finally:
+        if request.query.get('keep_session') != 'true':
+            await assistant.reset_session(session_id)
+
+    return ws
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    """GET /health"""
+    assistant = request.app[ASSISTANT_KEY]
+    stored_sessions = await asyncio.to_thread(len, assistant.session_store)
+    return web.json_response({
+        'status': 'ok',
+        'sessions': len(assistant.sessions),
+        'stored_sessions': stored_sessions,
+        'pending_requests': assistant.pending_requests,
+        'cache': dict(assistant.cache.stats) if assistant.cache is not None else None,
+        'semantic_cache': dict(assistant.semantic_cache.stats) if assistant.semantic_cache is not None else None,
+        'circuits': {breaker.name: breaker.state
+                     for breaker in [*assistant.llm.breakers, *assistant.http.breakers.values()]},
+    })
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """GET /metrics in the Prometheus text format"""
+    return web.Response(text=telemetry.render_prometheus(), content_type='text/plain')
+
+
+async def _close_assistant(app: web.Application):
+    await app[ASSISTANT_KEY].close()
+
+
+def create_app() -> web.Application:
+    """Build the aiohttp application"""
+    app = web.Application()
+    app[ASSISTANT_KEY] = AsyncVirtualAssistant()
+    app.router.add_post('/chat', handle_chat)
+    app.router.add_delete('/sessions/{session_id}', handle_reset)
+    app.router.add_get('/ws', handle_websocket)
+    app.router.add_get('/health', handle_health)
+    app.router.add_get('/metrics', handle_metrics)
+    app.on_cleanup.append(_close_assistant)
+    return app
+
+
+def main():
+    """Server entry point"""
+    parser = argparse.ArgumentParser(description="Serve the virtual assistant over HTTP and WebSocket")
+    parser.add_argument('--host', default=Config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT)
+    args = parser.parse_args()
+
+    try:
+        app = create_app()
+    except Exception as e:
+        logger.error(f"Server startup error: {e}")
+        print(f"Failed to start server: {e}")
+        sys.exit(1)
+
+    print(f"🚀 {Config.ASSISTANT_NAME} server listening on http://{args.host}:{args.port}")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import importlib.util
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from conversation_memory import ConversationMemory
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+MSGPACK_AVAILABLE = importlib.util.find_spec('msgpack') is not None
+
+# Record kinds. A message record is keyed by its own sequence number, a summary
+# record by the last message it was written after.
+MESSAGE = 0
+SUMMARY = 1
+
+ROLES = ('user', 'assistant', 'system')
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# (seq, kind, packed data)
+Record = Tuple[int, int, bytes]
+
+
+def pack(data: list) -> bytes:
+    """Serialize a record body; msgpack when installed, compact JSON otherwise"""
+    if MSGPACK_AVAILABLE:
+        import msgpack
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def unpack(data: bytes) -> list:
+    """Read a record body written by pack(), whichever format it used"""
+    if data[:1] == b'[':
+        return json.loads(data)
+    import msgpack
+    return msgpack.unpackb(data, raw=False)
+
+
+def unsaved_records(memory: ConversationMemory) -> Tuple[List[Record], Optional[Tuple[int, int]]]:
+    """Records for what was added to a memory since it was last saved.
+
+    Also returns (summary seq, first message seq) when the memory folded, so
+    the store can drop the records the new summary replaces.
+    """
+    messages, summary = memory.take_unsaved()
+    records = [(m.seq, MESSAGE, pack([ROLE_CODES.get(m.role, m.role), m.content])) for m in messages]
+    compact = None
+    if summary is not None:
+        text, first_seq = summary
+        summary_seq = memory.next_seq - 1
+        records.append((summary_seq, SUMMARY, pack([first_seq, text])))
+        compact = (summary_seq, first_seq)
+    return records, compact
+
+
+def apply_records(memory: ConversationMemory, records: List[Record]):
+    """Replay stored records, in (seq, kind) order, onto a memory"""
+    for seq, kind, data in records:
+        body = unpack(data)
+        if kind == MESSAGE:
+            role = ROLES[body[0]] if isinstance(body[0], int) else body[0]
+            memory.restore_message(seq, role, body[1])
+        elif kind == SUMMARY:
+            memory.restore_summary(body[1], body[0])
+
+
+class SessionStore(ABC):
+    """Conversation histories kept outside the worker that served the last turn.
+
+    A turn appends its new messages, and the new summary if the memory folded,
+    as small packed records; nothing already stored is rewritten. A summary
+    record lets the records it covers be dropped, so each session stays about
+    as small as its ConversationMemory. load() only reads records the given
+    memory hasn't seen yet, so a worker that keeps a session cached picks up
+    turns served by other workers with one cheap query. Sessions idle for
+    longer than ``ttl`` seconds are removed.
+    """
+
+    def __init__(self, ttl: float = 86400, sweep_interval: float = 60):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    @classmethod
+    def from_config(cls) -> 'SessionStore':
+        """Create the store described by Config, falling back to memory if the database can't be opened"""
+        if Config.SESSION_STORE == 'sqlite':
+            try:
+                return SQLiteSessionStore(Config.SESSION_DB_PATH, Config.SESSION_TTL)
+            except Exception as e:
+                logger.warning(f"Session database unavailable, keeping sessions in memory: {e}")
+        elif Config.SESSION_STORE != 'memory':
+            logger.warning(f"Unknown SESSION_STORE '{Config.SESSION_STORE}', keeping sessions in memory")
+        return InMemorySessionStore(Config.SESSION_TTL)
+
+    def load(self, session_id: str, memory: ConversationMemory) -> ConversationMemory:
+        """Bring a memory up to date with what is stored for the session"""
+        records = self._read(session_id, memory.next_seq)
+        if records:
+            apply_records(memory, records)
+        return memory
+
+    def save(self, session_id: str, memory: ConversationMemory):
+        """Append what the memory gained since it was last saved"""
+        records, compact = unsaved_records(memory)
+        if records:
+            self._append(session_id, records, compact)
+        if time.monotonic() >= self._next_sweep:
+            self._next_sweep = time.monotonic() + self.sweep_interval
+            removed = self.evict_idle()
+            if removed:
+                logger.debug("Evicted %d idle sessions", removed)
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Remove a session and everything stored for it"""
+
+    @abstractmethod
+    def evict_idle(self) -> int:
+        """Remove sessions idle for longer than the TTL and return how many were removed"""
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored sessions"""
+
+    @abstractmethod
+    def _read(self, session_id: str, since: int) -> List[Record]:
+        """Records with a sequence number of at least ``since``, in order"""
+
+    @abstractmethod
+    def _append(self, session_id: str, records: List[Record], compact: Optional[Tuple[int, int]]):
+        """Store new records, then drop the ones a new summary replaces when ``compact`` is given"""
+
+
+class _StoredSession:
+    __slots__ = ('records', 'last_used')
+
+    def __init__(self):
+        self.records: List[Record] = []
+        self.last_used = 0.0
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessions kept as packed records in this process; for a single worker"""
+
+    def __init__(self, ttl: float = 86400, sweep_interval: float = 60):
+        super().__init__(ttl, sweep_interval)
+        # Least recently used first, so idle sessions are found at the front
+        self._sessions: "OrderedDict[str, _StoredSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read(self, session_id: str, since: int) -> List[Record]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            return [record for record in session.records if record[0] >= since]
+
+    def _append(self, session_id: str, records: List[Record], compact: Optional[Tuple[int, int]]):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _StoredSession()
+            else:
+                self._sessions.move_to_end(session_id)
+            session.records.extend(records)
+            if compact:
+                summary_seq, first_seq = compact
+                session.records = [(seq, kind, data) for seq, kind, data in session.records
+                                   if seq >= (summary_seq if kind == SUMMARY else first_seq)]
+            session.last_used = time.time()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_idle(self) -> int:
+        cutoff = time.time() - self.ttl
+        removed = 0
+        with self._lock:
+            while self._sessions:
+                session_id, session = next(iter(self._sessions.items()))
+                if session.last_used > cutoff:
+                    break
+                del self._sessions[session_id]
+                removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a sqlite file that several worker processes on one host can share"""
+
+    def __init__(self, path: str, ttl: float = 86400, sweep_interval: float = 60):
+        super().__init__(ttl, sweep_interval)
+        self.path = path
+        self._lock = threading.Lock()
+        # The timeout makes a worker wait for another one's write instead of failing
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_records (session_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+            "kind INTEGER NOT NULL, data BLOB NOT NULL, PRIMARY KEY (session_id, seq, kind)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def _read(self, session_id: str, since: int) -> List[Record]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, kind, data FROM session_records WHERE session_id = ? AND seq >= ? ORDER BY seq, kind",
+                (session_id, since)
+            ).fetchall()
+
+    def _append(self, session_id: str, records: List[Record], compact: Optional[Tuple[int, int]]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO session_records (session_id, seq, kind, data) VALUES (?, ?, ?, ?)",
+                [(session_id, seq, kind, data) for seq, kind, data in records]
+            )
+            if compact:
+                summary_seq, first_seq = compact
+                self._conn.execute(
+                    "DELETE FROM session_records WHERE session_id = ? AND "
+                    "((kind = ? AND seq < ?) OR (kind = ? AND seq < ?))",
+                    (session_id, MESSAGE, first_seq, SUMMARY, summary_seq)
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, last_used) VALUES (?, ?)", (session_id, time.time())
+            )
+
+    def delete(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM session_records WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def evict_idle(self) -> int:
+        cutoff = time.time() - self.ttl
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM session_records WHERE session_id IN (SELECT session_id FROM sessions WHERE last_used <= ?)",
+                (cutoff,)
+            )
+            cursor = self._conn.execute("DELETE FROM sessions WHERE last_used <= ?", (cutoff,))
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
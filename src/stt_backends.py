@@ -0,0 +1,190 @@
+import importlib.util
+import json
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from config.settings import Config
+from audio_capture import Utterance
+import telemetry
+
+# vosk is imported on first use; it is optional (pip install vosk, plus a model from https://alphacephei.com/vosk/models)
+
+logger = logging.getLogger(__name__)
+
+VOSK_AVAILABLE = importlib.util.find_spec('vosk') is not None
+
+
+class RecognitionStream(ABC):
+    """One utterance being decoded; audio is fed in as it is captured"""
+
+    @abstractmethod
+    def accept(self, chunk: bytes) -> Optional[str]:
+        """Decode a chunk and return the partial hypothesis so far (None if the backend has none)"""
+
+    @abstractmethod
+    def finish(self) -> Optional[str]:
+        """Return the final transcript, or None if nothing was understood"""
+
+
+class SpeechRecognizer(ABC):
+    """Speech-to-text backend.
+
+    Streaming backends decode audio while it is captured and report partial
+    hypotheses, which lets the voice pipeline end an utterance as soon as
+    the hypothesis settles instead of waiting out VOICE_PAUSE_THRESHOLD.
+    Non-streaming backends buffer the audio and decode it in finish().
+    """
+
+    name = ''
+    streaming = False
+
+    @abstractmethod
+    def start(self, sample_rate: int, sample_width: int = 2) -> RecognitionStream:
+        """Begin decoding a new utterance"""
+
+    def transcribe(self, utterance: Utterance) -> Optional[str]:
+        """Decode a complete utterance"""
+        stream = self.start(utterance.sample_rate, utterance.sample_width)
+        stream.accept(utterance.pcm)
+        return stream.finish()
+
+
+class _BufferedStream(RecognitionStream):
+    def __init__(self, recognize, sample_rate: int, sample_width: int):
+        self.recognize = recognize
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.chunks: List[bytes] = []
+
+    def accept(self, chunk: bytes) -> Optional[str]:
+        self.chunks.append(chunk)
+        return None
+
+    def finish(self) -> Optional[str]:
+        pcm = b''.join(self.chunks)
+        return self.recognize(Utterance(pcm, self.sample_rate, self.sample_width, time.monotonic()))
+
+
+class GoogleRecognizer(SpeechRecognizer):
+    """Google Web Speech API through speech_recognition (needs a network connection)"""
+
+    name = 'google'
+
+    def __init__(self, voice):
+        self.voice = voice
+
+    def start(self, sample_rate: int, sample_width: int = 2) -> RecognitionStream:
+        return _BufferedStream(self.voice.recognize, sample_rate, sample_width)
+
+
+class _VoskStream(RecognitionStream):
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.segments: List[str] = []  # text of pauses Vosk already finalized inside this utterance
+
+    def accept(self, chunk: bytes) -> Optional[str]:
+        if self.recognizer.AcceptWaveform(chunk):
+            self._add_segment(self.recognizer.Result())
+            return ' '.join(self.segments)
+        partial = json.loads(self.recognizer.PartialResult()).get('partial', '')
+        return ' '.join(self.segments + [partial]) if partial else ' '.join(self.segments)
+
+    def finish(self) -> Optional[str]:
+        self._add_segment(self.recognizer.FinalResult())
+        return ' '.join(self.segments) or None
+
+    def _add_segment(self, result: str):
+        text = json.loads(result).get('text', '')
+        if text:
+            self.segments.append(text)
+
+
+class VoskRecognizer(SpeechRecognizer):
+    """Offline recognition with a local Vosk (Kaldi) model, decoded chunk by chunk on the CPU"""
+
+    name = 'vosk'
+    streaming = True
+
+    def __init__(self, model_path: str):
+        import vosk
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model = vosk.Model(model_path)
+
+    def start(self, sample_rate: int, sample_width: int = 2) -> RecognitionStream:
+        if sample_width != 2:
+            raise ValueError("Vosk needs 16-bit audio")
+        return _VoskStream(self._vosk.KaldiRecognizer(self.model, sample_rate))
+
+
+def create_recognizer(voice, backend: Optional[str] = None) -> SpeechRecognizer:
+    """Build the configured backend (STT_BACKEND), falling back to Google if it can't be loaded"""
+    backend = (backend or Config.STT_BACKEND).lower()
+    if backend == 'vosk':
+        if not VOSK_AVAILABLE:
+            logger.warning("STT_BACKEND=vosk but vosk is not installed (pip install vosk); using Google")
+        else:
+            try:
+                return VoskRecognizer(Config.VOSK_MODEL_PATH)
+            except Exception as e:
+                logger.warning(f"Failed to load Vosk model from {Config.VOSK_MODEL_PATH}: {e}; using Google")
+    elif backend != 'google':
+        logger.warning(f"Unknown STT_BACKEND '{backend}'; using Google")
+    return GoogleRecognizer(voice)
+
+
+class EndpointDetector:
+    """Decides when a streamed utterance is finished before the pause timeout.
+
+    The utterance ends once the speaker has been quiet for stable_seconds and
+    the partial hypothesis has not changed during that time. Energy-based
+    endpointing alone has to wait for the full pause threshold, because it
+    can't tell a finished sentence from a pause for breath.
+    """
+
+    def __init__(self, chunk_seconds: float, stable_seconds: float):
+        self.needed = max(1, math.ceil(stable_seconds / chunk_seconds)) if stable_seconds > 0 else None
+        self._partial: Optional[str] = None
+        self._stable_quiet = 0
+
+    def update(self, partial: Optional[str], loud: bool) -> bool:
+        """Feed the state after one chunk; True once the utterance can be finalized"""
+        if self.needed is None:
+            return False
+        if loud or not partial:
+            self._stable_quiet = 0
+        elif partial == self._partial:
+            self._stable_quiet += 1
+        else:
+            self._stable_quiet = 1
+        self._partial = partial
+        return self._stable_quiet >= self.needed
+
+
+class Transcription:
+    """Decodes one utterance as its chunks arrive and applies early endpointing"""
+
+    def __init__(self, recognizer: SpeechRecognizer, sample_rate: int, sample_width: int, chunk_seconds: float,
+                 early_endpoint: Optional[float] = None):
+        self.stream = recognizer.start(sample_rate, sample_width)
+        self.backend = recognizer.name
+        early_endpoint = Config.STT_EARLY_ENDPOINT if early_endpoint is None else early_endpoint
+        self.endpoint = EndpointDetector(chunk_seconds, early_endpoint) if recognizer.streaming else None
+        self.partial: Optional[str] = None
+        self.settled = False
+
+    def feed(self, chunk: bytes, loud: bool) -> bool:
+        """Decode a chunk; True once the utterance can be finalized without waiting for the pause"""
+        self.partial = self.stream.accept(chunk)
+        self.settled = self.endpoint is not None and self.endpoint.update(self.partial, loud)
+        return self.settled
+
+    def finish(self) -> Optional[str]:
+        """Final text; the span covers only the wait after the utterance ended, which is what the user notices"""
+        with telemetry.span('stt', backend=self.backend, early=self.settled) as span:
+            text = self.stream.finish()
+            span.payload('text', text)
+            return text
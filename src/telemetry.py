@@ -0,0 +1,410 @@
+import bisect
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config.settings import Config
+
+# asyncio and http.server are only needed by the server and the metrics endpoint, so they aren't imported here
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a cache hit (well under 5 ms) up to a slow LLM answer
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+EXPORT_QUEUE_SIZE = 1000
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """A monotonically increasing count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, '')) for name in self.labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {value:g}" for key, value in items]
+
+
+class Histogram:
+    """Observations counted into fixed buckets per label set, plus their sum and count.
+
+    Each observation is one bisect and three increments under a lock; buckets
+    are only made cumulative when rendered.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], list] = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(tuple(str(labels.get(name, '')) for name in self.labels))
+        return sum(entry[:-1]) if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(entry)) for key, entry in self._values.items())
+        lines = []
+        for key, entry in items:
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry[:-1]):
+                total += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {total}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {entry[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {total}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named counters and histograms, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, description, labels)
+
+    def histogram(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, description, labels, buckets=buckets)
+
+    def _get_or_create(self, cls, name, description, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, description, labels, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class Span:
+    """One timed step of a trace; set() adds attributes while it runs"""
+
+    __slots__ = ('name', 'trace', 'parent', 'span_id', 'start', 'duration', 'attrs', 'error')
+
+    def __init__(self, name: str, trace: Optional['_Trace'], parent: Optional['Span'], attrs: dict):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.span_id = trace.next_id() if trace is not None else 0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+        self.duration = 0.0
+        self.start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def elapsed_ms(self) -> float:
+        """Milliseconds since the span started"""
+        return round((time.perf_counter() - self.start) * 1000, 1)
+
+    def payload(self, name: str, text: Optional[str]):
+        """Record text only when TRACE_PAYLOADS is on; otherwise just its length"""
+        if text is None:
+            return
+        if self.trace is not None and self.trace.payloads:
+            self.attrs[name] = text
+        self.attrs[f'{name}_chars'] = len(text)
+
+    def fail(self, error: str):
+        """Mark the span as failed without raising (e.g. an error that was handled with a fallback reply)"""
+        self.error = error
+
+
+class _NoopSpan:
+    __slots__ = ()
+    name = ''
+
+    def set(self, **attrs):
+        pass
+
+    def elapsed_ms(self) -> float:
+        return 0.0
+
+    def payload(self, name, text):
+        pass
+
+    def fail(self, error):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _is_cancelled(error: BaseException) -> bool:
+    """Whether an error is asyncio cancellation; only possible once asyncio has been imported"""
+    asyncio = sys.modules.get('asyncio')
+    return asyncio is not None and isinstance(error, asyncio.CancelledError)
+
+
+class _Trace:
+    """The spans under one root span, kept until the root ends so slow or failed traces can still be exported"""
+
+    __slots__ = ('trace_id', 'sampled', 'payloads', 'started_at', 'origin', 'spans', 'failed', '_ids')
+
+    def __init__(self, sampled: bool, payloads: bool):
+        self.trace_id = uuid.uuid4().hex
+        self.sampled = sampled
+        self.payloads = payloads
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans: List[dict] = []
+        self.failed = False
+        self._ids = 0
+
+    def next_id(self) -> int:
+        self._ids += 1
+        return self._ids
+
+
+_current: ContextVar[Optional[Span]] = ContextVar('telemetry_span', default=None)
+
+
+class JsonlTraceExporter:
+    """Appends one JSON line per trace to a file from a background thread; drops traces if it falls behind"""
+
+    def __init__(self, path: str, on_drop=None):
+        self.path = path
+        self._on_drop = on_drop
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if self._on_drop:
+                self._on_drop()
+
+    def close(self, timeout: float = 2.0):
+        """Flush queued traces"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                f.write(json.dumps(record, default=str) + '\n')
+                if self._queue.empty():
+                    f.flush()
+
+
+class Tracer:
+    """Times spans into histograms and exports sampled traces.
+
+    Every span's duration goes into the ``assistant_span_seconds`` histogram
+    and failures into ``assistant_span_errors_total``, so metrics see all
+    traffic. Whether a whole trace is written to the exporter is decided when
+    its root span starts (sample_rate), but traces slower than slow_ms or
+    containing a failed span are always written.
+    """
+
+    def __init__(self, registry: MetricsRegistry, enabled: bool = True, sample_rate: float = 0.0,
+                 slow_ms: float = 0.0, payloads: bool = False, exporter: Optional[JsonlTraceExporter] = None):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_ms / 1000
+        self.payloads = payloads
+        self.exporter = exporter
+        self.span_seconds = registry.histogram('assistant_span_seconds', "Duration of each traced step", ('span',))
+        self.span_errors = registry.counter('assistant_span_errors_total', "Traced steps that failed", ('span',))
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Span]:
+        """Time a block as a child of the current span, or as the root of a new trace"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        parent = _current.get()
+        if parent is not None:
+            trace = parent.trace
+        elif self.exporter is not None:
+            trace = _Trace(random.random() < self.sample_rate, self.payloads)
+        else:
+            trace = None
+        span = Span(name, trace, parent, attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if isinstance(e, GeneratorExit) or _is_cancelled(e):
+                span.attrs['cancelled'] = True
+            else:
+                span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            try:
+                _current.reset(token)
+            except ValueError:
+                pass  # a generator closed from another context; that context never saw this span
+            self._finish(span)
+
+    def current(self):
+        """The innermost active span, so helpers can add attributes without being passed it"""
+        return _current.get() or NOOP_SPAN
+
+    def _finish(self, span: Span):
+        self.span_seconds.observe(span.duration, span=span.name)
+        if span.error is not None:
+            self.span_errors.inc(span=span.name)
+
+        trace = span.trace
+        if trace is None:
+            return
+        if span.error is not None:
+            trace.failed = True
+        trace.spans.append({
+            'span_id': span.span_id,
+            'parent_id': span.parent.span_id if span.parent is not None else None,
+            'name': span.name,
+            'start_ms': round((span.start - trace.origin) * 1000, 3),
+            'duration_ms': round(span.duration * 1000, 3),
+            'attrs': span.attrs,
+            **({'error': span.error} if span.error is not None else {}),
+        })
+        if span.parent is None and (trace.sampled or trace.failed or
+                                    (self.slow_seconds and span.duration >= self.slow_seconds)):
+            self.exporter.export({
+                'trace_id': trace.trace_id,
+                'name': span.name,
+                'timestamp': trace.started_at,
+                'duration_ms': round(span.duration * 1000, 3),
+                'spans': sorted(trace.spans, key=lambda record: record['start_ms']),
+            })
+
+
+# Process-wide metrics, shared by the CLI, the server and the benches
+REGISTRY = MetricsRegistry()
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """The process-wide tracer, configured from Config on first use"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                exporter = None
+                if Config.TELEMETRY_ENABLED and Config.TRACE_FILE:
+                    try:
+                        dropped = REGISTRY.counter('assistant_traces_dropped_total',
+                                                   "Traces dropped because the exporter fell behind")
+                        exporter = JsonlTraceExporter(Config.TRACE_FILE, on_drop=dropped.inc)
+                    except OSError as e:
+                        logger.warning(f"Trace file unavailable: {e}")
+                _tracer = Tracer(REGISTRY, enabled=Config.TELEMETRY_ENABLED, sample_rate=Config.TRACE_SAMPLE_RATE,
+                                 slow_ms=Config.TRACE_SLOW_MS, payloads=Config.TRACE_PAYLOADS, exporter=exporter)
+    return _tracer
+
+
+def span(name: str, **attrs):
+    """Shortcut for get_tracer().span(); use as ``with telemetry.span('llm', model=...) as s:``"""
+    return get_tracer().span(name, **attrs)
+
+
+def current_span():
+    return get_tracer().current()
+
+
+def counter(name: str, description: str, labels: Tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.counter(name, description, labels)
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render()
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1'):
+    """Serve GET /metrics in a daemon thread (the CLI has no web server of its own); returns the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name='metrics-server', daemon=True).start()
+    return httpd
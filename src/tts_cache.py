@@ -0,0 +1,176 @@
+import logging
+import os
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from config.settings import Config
+from response_cache import make_key
+
+logger = logging.getLogger(__name__)
+
+# Clips are stored as 8-bit G.711 mu-law, half the size of 16-bit PCM and still fine for speech
+SUFFIX = '.ulaw'
+_BIAS = 0x84
+_CLIP = 32635
+
+
+def _encode_sample(sample: int) -> int:
+    sign = 0x80 if sample < 0 else 0
+    magnitude = min(-sample if sign else sample, _CLIP) + _BIAS
+    exponent = max(0, min(7, magnitude.bit_length() - 8))
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return ~(sign | (exponent << 4) | mantissa) & 0xFF
+
+
+def _decode_byte(byte: int) -> int:
+    byte = ~byte & 0xFF
+    magnitude = ((((byte & 0x0F) << 3) + _BIAS) << ((byte >> 4) & 0x07)) - _BIAS
+    return -magnitude if byte & 0x80 else magnitude
+
+
+# Lookup tables: every code to 16-bit PCM, and (built on first encode, it has 65536 entries)
+# every 16-bit sample indexed as unsigned to its code
+_DECODE = [array('h', [_decode_byte(code)]).tobytes() for code in range(256)]
+_ENCODE: Optional[bytes] = None
+
+
+def ulaw_encode(pcm: bytes) -> bytes:
+    """16-bit native-endian PCM to mu-law"""
+    global _ENCODE
+    if _ENCODE is None:
+        _ENCODE = bytes(_encode_sample(value - 65536 if value >= 32768 else value) for value in range(65536))
+    samples = array('H', pcm[:len(pcm) - len(pcm) % 2])
+    return bytes(map(_ENCODE.__getitem__, samples))
+
+
+def ulaw_decode(data: bytes) -> bytes:
+    """mu-law back to 16-bit native-endian PCM"""
+    return b''.join(map(_DECODE.__getitem__, data))
+
+
+class TTSCache:
+    """Synthesized speech on disk, keyed by (text, voice, rate, volume), with an LRU size limit.
+
+    Each clip is one file named ``<key>-<sample rate>.ulaw``. The LRU order
+    is rebuilt from file modification times on startup and hits touch the
+    file, so recency survives restarts. Writes go through a temporary file
+    and a rename, so a crash never leaves a truncated clip behind.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._files: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()  # key -> (file name, size)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(SUFFIX):
+                stat = os.stat(os.path.join(directory, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name.rsplit('-', 1)[0]] = (name, size)
+            self._size += size
+        with self._lock:
+            self._evict()
+
+    @classmethod
+    def from_config(cls) -> Optional['TTSCache']:
+        """Create the cache described by Config, or None when it is disabled or the directory is unusable"""
+        if not Config.TTS_CACHE_ENABLED:
+            return None
+        try:
+            return cls(Config.TTS_CACHE_DIR, int(Config.TTS_CACHE_MAX_MB * 1024 * 1024))
+        except OSError as e:
+            logger.warning(f"TTS cache unavailable: {e}")
+            return None
+
+    @staticmethod
+    def key(text: str, voice: str, rate: int, volume: float) -> str:
+        return make_key('tts', text, voice, rate, volume).split(':', 1)[1]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._files
+
+    @property
+    def size(self) -> int:
+        """Bytes on disk"""
+        return self._size
+
+    def get(self, key: str) -> Optional[Tuple[bytes, int]]:
+        """Return (16-bit mono PCM, sample rate) for a cached clip, or None"""
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._files.move_to_end(key)
+            self.stats['hits'] += 1
+
+        name = entry[0]
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError as e:
+            logger.warning(f"Dropping unreadable TTS clip {name}: {e}")
+            with self._lock:
+                self._forget(key)
+            return None
+        return ulaw_decode(data), int(name[:-len(SUFFIX)].rsplit('-', 1)[1])
+
+    def put(self, key: str, pcm: bytes, sample_rate: int):
+        """Store 16-bit mono PCM, evicting the least recently played clips beyond max_bytes"""
+        data = ulaw_encode(pcm)
+        if len(data) > self.max_bytes:
+            return
+        name = f"{key}-{sample_rate}{SUFFIX}"
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, os.path.join(self.directory, name))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            old = self._files.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+                if old[0] != name:
+                    self._remove(old[0])
+            self._files[key] = (name, len(data))
+            self._size += len(data)
+            self.stats['writes'] += 1
+            self._evict()
+
+    def _evict(self):
+        """Remove the oldest clips until the cache fits (lock must be held)"""
+        while self._size > self.max_bytes and self._files:
+            _, (name, size) = self._files.popitem(last=False)
+            self._size -= size
+            self._remove(name)
+            self.stats['evictions'] += 1
+
+    def _forget(self, key: str):
+        entry = self._files.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def _remove(self, name: str):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError as e:
+            logger.debug(f"Failed to remove TTS clip {name}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._files)
@@ -1,137 +1,368 @@
 import logging
+import re
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 import sys
 import os
 
-import openai
-import requests
+# openai and requests are imported on first use to keep startup fast (see main.py --profile-startup)
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.settings import Config
+from response_cache import ResponseCache, make_key
+from semantic_cache import SemanticCache
+from intent_router import IntentMatch
+from plugins import CapabilityRegistry
+from conversation_memory import ConversationMemory
+from math_engine import MathError, NoExpressionError, evaluate, format_number
+from reminders import ReminderScheduler, parse_reminder
+from http_transport import CircuitOpenError, Coalescer, HttpTransport
+from llm_backends import LLMRouter, LLMUnavailableError
+import telemetry
 
 # Configure logging
 logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL))
 logger = logging.getLogger(__name__)
 
+# Fixed replies, also pre-rendered for speech (see VoiceInterface.prerender)
+TROUBLE_REPLY = "I'm sorry, I'm having trouble processing that right now. Please try again."
+WEATHER_NOT_CONFIGURED = "Weather service is not configured. Please add WEATHER_API_KEY to .env file."
+WEATHER_NEEDS_CITY = "Please specify a city for weather information. For example: 'weather in Paris' or 'London weather'"
+WEATHER_UNAVAILABLE = "Sorry, the weather service is unavailable right now. Please try again in a little while."
+WEATHER_ERROR = "Sorry, I'm having trouble accessing weather information right now."
+NO_EXPRESSION = "I couldn't find a valid mathematical expression in your request."
+CALCULATION_ERROR = "Sorry, I couldn't perform that calculation."
+REMINDERS_UNAVAILABLE = "Reminders are not available right now."
+REMINDER_NEEDS_TIME = "When should I remind you? For example: 'remind me to call mom in 10 minutes' or 'remind me at 5pm to stretch'."
+REMINDER_SAVE_FAILED = "Sorry, I couldn't save that reminder."
+
+JOKES = (
+    "Why don't scientists trust atoms? Because they make up everything!",
+    "Why did the computer go to the doctor? Because it had a virus!",
+    "Why don't programmers like nature? It has too many bugs!",
+    "What do you call a computer that sings? A-Dell!",
+    "Why do robots never panic? They have nerves of steel!"
+)
+
+STATIC_REPLIES = JOKES + (TROUBLE_REPLY, WEATHER_NOT_CONFIGURED, WEATHER_NEEDS_CITY, WEATHER_UNAVAILABLE,
+                          WEATHER_ERROR, NO_EXPRESSION, CALCULATION_ERROR, REMINDERS_UNAVAILABLE, REMINDER_NEEDS_TIME, REMINDER_SAVE_FAILED)
+
+# End of a sentence: terminal punctuation (plus closing quotes/brackets) followed by whitespace, or a line break
+SENTENCE_BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+
+
+def chunk_sentences(tokens: Iterable[str]) -> Iterator[str]:
+    """Group streamed tokens into complete sentences as soon as each one ends"""
+    buffer = ''
+    for token in tokens:
+        buffer += token
+        position = 0
+        for match in SENTENCE_BOUNDARY.finditer(buffer):
+            sentence = buffer[position:match.end()].strip()
+            if sentence:
+                yield sentence
+            position = match.end()
+        buffer = buffer[position:]
+    
+    # Flush whatever is left once the stream ends
+    if buffer.strip():
+        yield buffer.strip()
+
+
 class VirtualAssistant:
+    # Whether this interface announces due reminders to the person who set them
+    delivers_reminders = True
+    
     def __init__(self):
         """Initialize the virtual assistant with configuration"""
         Config.validate()
         
-        # Initialize OpenAI client
-        self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
+        # Language model backends; clients are created on first use
+        self.llm = LLMRouter.from_config()
         
         # Assistant settings
         self.name = Config.ASSISTANT_NAME
-        self.conversation_history = []
-        
-        # Initialize capabilities
-        self.capabilities = {
-            'weather': self._get_weather,
-            'time': self._get_current_time,
-            'calculation': self._calculate,
-            'reminder': self._set_reminder,
-            'joke': self._tell_joke
-        }
+        self.conversation_history = self.new_memory()
         
-        logger.info(f"Virtual Assistant '{self.name}' initialized successfully")
-    
-    def process_text_input(self, user_input: str) -> str:
-        """Process text input and return response"""
-        logger.info(f"Processing input: {user_input}")
+        # Shared cache for weather lookups and LLM answers (None when disabled)
+        self.cache = ResponseCache.from_config()
+        # Answers to reworded stand-alone questions (None when disabled)
+        self.semantic_cache = SemanticCache.from_config()
         
-        # Add to conversation history
-        self.conversation_history.append({"role": "user", "content": user_input})
+        # Pooled outbound HTTP with retries; concurrent lookups of one city share a request
+        self.http = HttpTransport()
+        self.weather_calls = Coalescer()
         
-        # Check for specific capabilities first
-        response = self._check_capabilities(user_input)
+        # Built-in capabilities, plus plugins once the first input is routed
+        self.capabilities = CapabilityRegistry.from_config(self)
+        self.router = self.capabilities.router
         
-        if not response:
-            # Use OpenAI for general conversation
-            response = self._generate_ai_response(user_input)
+        # Reminders fire from a background thread; interfaces subscribe with reminders.add_listener
+        self.reminders = None
+        if Config.REMINDERS_ENABLED and self.delivers_reminders:
+            try:
+                self.reminders = ReminderScheduler.from_config()
+                self.reminders.start()
+            except Exception as e:
+                logger.error(f"Failed to start reminder scheduler: {e}")
         
-        # Add response to history
-        self.conversation_history.append({"role": "assistant", "content": response})
+        logger.info(f"Virtual Assistant '{self.name}' initialized successfully")
+    
+    def warm_up(self):
+        """Load the modules needed for the first request ahead of time (safe to call from a background thread)"""
+        self.llm.warm_up()
+        self.http.session
+        self.capabilities.load_plugins()
+    
+    def process_text_input(self, user_input: str, history: Optional[ConversationMemory] = None) -> str:
+        """Process text input and return response
         
-        # Keep history manageable (last 10 exchanges)
-        if len(self.conversation_history) > 20:
-            self.conversation_history = self.conversation_history[-20:]
+        history defaults to this assistant's own conversation; pass a separate
+        ConversationMemory to serve several conversations from one instance.
+        """
+        logger.debug("Processing input: %s", user_input)
+        if history is None:
+            history = self.conversation_history
         
-        logger.info(f"Generated response: {response}")
-        return response
+        with telemetry.span('turn', stream=False) as span:
+            span.payload('input', user_input)
+            
+            # Add to conversation history
+            history.append({"role": "user", "content": user_input})
+            
+            # Check for specific capabilities first
+            response = self._check_capabilities(user_input)
+            
+            if not response:
+                # Use the language model for general conversation
+                response = self._generate_ai_response(user_input, history)
+            
+            self._remember_response(response, history)
+            span.payload('output', response)
+            return response
+    
+    def process_text_input_stream(self, user_input: str, history: Optional[ConversationMemory] = None) -> Iterator[str]:
+        """Process text input and yield the response incrementally as it is generated"""
+        logger.debug("Processing input (streaming): %s", user_input)
+        if history is None:
+            history = self.conversation_history
+        
+        with telemetry.span('turn', stream=True) as span:
+            span.payload('input', user_input)
+            history.append({"role": "user", "content": user_input})
+            
+            # Capabilities answer instantly, so they are yielded as a single piece
+            response = self._check_capabilities(user_input)
+            parts = []
+            
+            try:
+                if response:
+                    yield response
+                else:
+                    for token in self._generate_ai_response_stream(user_input, history):
+                        parts.append(token)
+                        yield token
+            finally:
+                # A reply cut short (a barge-in closes the stream) is remembered as far as it got
+                if not response:
+                    response = ''.join(parts).strip()
+                self._remember_response(response, history)
+                span.payload('output', response)
+    
+    def _remember_response(self, response: str, history: Optional[ConversationMemory] = None):
+        """Add a response to history (the memory keeps itself within its token budget)"""
+        if history is None:
+            history = self.conversation_history
+        history.append({"role": "assistant", "content": response})
+        
+        logger.debug("Generated response: %s", response)
     
     def _check_capabilities(self, user_input: str) -> Optional[str]:
-        """Check if input matches specific capabilities"""
-        user_input_lower = user_input.lower()
-        
-        if any(word in user_input_lower for word in ['weather', 'temperature', 'forecast']):
-            return self.capabilities['weather'](user_input)
-        elif any(word in user_input_lower for word in ['time', 'clock', 'hour']):
-            return self.capabilities['time']()
-        elif any(word in user_input_lower for word in ['calculate', 'math', '+', '-', '*', '/']):
-            return self.capabilities['calculation'](user_input)
-        elif any(word in user_input_lower for word in ['remind', 'reminder', 'schedule']):
-            return self.capabilities['reminder'](user_input)
-        elif any(word in user_input_lower for word in ['joke', 'funny', 'laugh']):
-            return self.capabilities['joke']()
+        """Check if input matches specific capabilities; several requests in one input run together"""
+        match = self._route(user_input)
+        
+        if match:
+            return self.capabilities.run(self.capabilities.plan(user_input, match))
         
         return None
     
-    def _generate_ai_response(self, user_input: str) -> str:
-        """Generate AI response using OpenAI"""
-        try:
-            # Create system message for context
-            system_message = {
-                "role": "system",
-                "content": f"You are {self.name}, a helpful virtual assistant. "
-                          "Keep responses concise but friendly. "
-                          "If asked about capabilities, mention weather, time, calculations, reminders, and jokes."
-            }
-            
-            # Prepare messages for API call
-            messages = [system_message] + self.conversation_history[-10:]  # Last 5 exchanges
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=150,
-                temperature=0.7
-            )
+    def _route(self, user_input: str) -> Optional[IntentMatch]:
+        """Ask the router which capability, if any, handles the input"""
+        with telemetry.span('route') as span:
+            match = self.capabilities.route(user_input)
+            span.set(intent=match.intent if match else None)
+            return match
+    
+    def new_memory(self) -> ConversationMemory:
+        """Create an empty conversation memory using the configured summarizer"""
+        if Config.MEMORY_SUMMARIZER == 'llm':
+            return ConversationMemory(summarizer=self._summarize_history)
+        return ConversationMemory()
+    
+    def _summarize_history(self, summary: str, aged: list) -> str:
+        """Fold aged-out messages into the running summary using the LLM"""
+        transcript = '\n'.join(f"{message['role']}: {message['content']}" for message in aged)
+        with telemetry.span('llm.summary', messages=len(aged)):
+            # Summarizing is easy work, so it goes to the fast backend when there is one
+            return self.llm.complete(
+                [
+                    {"role": "system", "content": "Update the summary of a conversation with the new messages. "
+                                                  "Keep names, facts and open requests. Reply with the summary only, "
+                                                  f"in at most {Config.MEMORY_SUMMARY_TOKENS} tokens."},
+                    {"role": "user", "content": f"Current summary:\n{summary or '(empty)'}\n\nNew messages:\n{transcript}"}
+                ],
+                simple=True,
+                max_tokens=Config.MEMORY_SUMMARY_TOKENS,
+                temperature=0
+            ).text
+    
+    def _build_messages(self, history: Optional[ConversationMemory] = None) -> list:
+        """Build the message list sent to the chat completions API"""
+        if history is None:
+            history = self.conversation_history
+        
+        # Create system message for context
+        system_message = {
+            "role": "system",
+            "content": f"You are {self.name}, a helpful virtual assistant. "
+                      "Keep responses concise but friendly. "
+                      "If asked about capabilities, mention weather, time, calculations, reminders, and jokes."
+        }
+        
+        # Prepare messages for API call
+        return [system_message] + history.prompt_messages()
+    
+    def _cache_get(self, key: str):
+        """Look up a cached value, if caching is enabled"""
+        return self.cache.get(key) if self.cache is not None else None
+    
+    def _cache_set(self, key: str, value, ttl: float):
+        """Store a value in the cache, if caching is enabled"""
+        if self.cache is not None:
+            self.cache.set(key, value, ttl)
+    
+    def _cached_answer(self, cache_key: str, messages: list) -> Optional[str]:
+        """An answer cached for this exact request, or else one to a question that means the same"""
+        cached = self._cache_get(cache_key)
+        if cached is None and self.semantic_cache is not None:
+            cached = self.semantic_cache.get(messages)
+        return cached
+    
+    def _cache_answer(self, cache_key: str, messages: list, answer: str):
+        """Cache a language model answer for the exact request and by meaning"""
+        self._cache_set(cache_key, answer, Config.LLM_CACHE_TTL)
+        if self.semantic_cache is not None:
+            self.semantic_cache.set(messages, answer, Config.LLM_CACHE_TTL)
+    
+    def _weather_cache_key(self, city: str) -> str:
+        """Cache key for a weather lookup, normalized so 'New  York' and 'new york' match"""
+        return make_key('weather', ' '.join(city.lower().split()))
+    
+    def _generate_ai_response(self, user_input: str, history: Optional[ConversationMemory] = None) -> str:
+        """Generate AI response using the language model backends"""
+        messages = self._build_messages(history)
+        
+        with telemetry.span('llm', stream=False, messages=len(messages)) as span:
+            # Identical system prompt + trimmed history means an identical request
+            cache_key = make_key('llm', messages)
+            cached = self._cached_answer(cache_key, messages)
+            if cached is not None:
+                span.set(cached=True)
+                return cached
             
-            return response.choices[0].message.content.strip()
+            try:
+                content = self.llm.complete(messages).text
+                self._cache_answer(cache_key, messages, content)
+                return content
+                
+            except LLMUnavailableError:
+                logger.warning("Language model is unavailable, not calling it")
+                span.fail('circuit_open')
+                return TROUBLE_REPLY
+            except Exception as e:
+                logger.error(f"Error generating AI response: {e}")
+                span.fail(type(e).__name__)
+                return TROUBLE_REPLY
+    
+    def _generate_ai_response_stream(self, user_input: str, history: Optional[ConversationMemory] = None) -> Iterator[str]:
+        """Generate AI response using the language model backends, yielding tokens as they arrive"""
+        messages = self._build_messages(history)
+        
+        with telemetry.span('llm', stream=True, messages=len(messages)) as span:
+            cache_key = make_key('llm', messages)
+            cached = self._cached_answer(cache_key, messages)
+            if cached is not None:
+                span.set(cached=True)
+                yield cached
+                return
             
-        except Exception as e:
-            logger.error(f"Error generating AI response: {e}")
-            return "I'm sorry, I'm having trouble processing that right now. Please try again."
+            received_any = False
+            try:
+                parts = []
+                for token in self.llm.stream(messages):
+                    if not received_any:
+                        span.set(first_token_ms=span.elapsed_ms())
+                    received_any = True
+                    parts.append(token)
+                    yield token
+                
+                self._cache_answer(cache_key, messages, ''.join(parts).strip())
+                
+            except LLMUnavailableError:
+                logger.warning("Language model is unavailable, not calling it")
+                span.fail('circuit_open')
+                yield TROUBLE_REPLY
+            except Exception as e:
+                logger.error(f"Error streaming AI response: {e}")
+                span.fail(type(e).__name__)
+                # Only apologise if nothing was said yet; otherwise keep the partial answer
+                if not received_any:
+                    yield TROUBLE_REPLY
     
-    def _get_weather(self, query: str) -> str:
+    def _get_weather(self, query: str, city: Optional[str] = None) -> str:
         """Get weather information"""
         if not Config.WEATHER_API_KEY:
-            return "Weather service is not configured. Please add WEATHER_API_KEY to .env file."
+            return WEATHER_NOT_CONFIGURED
         
-        # Extract city from query
-        city = self._extract_city_from_query(query)
+        # Extract city from query, unless the router already found it
+        city = city or self._extract_city_from_query(query)
         if not city:
-            return "Please specify a city for weather information. For example: 'weather in Paris' or 'London weather'"
+            return WEATHER_NEEDS_CITY
+        
+        cache_key = self._weather_cache_key(city)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={Config.WEATHER_API_KEY}&units=metric"
-            response = requests.get(url, timeout=5)
-            data = response.json()
-            
-            if response.status_code == 200:
-                temp = data['main']['temp']
-                description = data['weather'][0]['description']
-                city_name = data['name']
-                country = data['sys']['country']
-                return f"The weather in {city_name}, {country} is {temp}°C with {description}."
-            else:
-                return f"Sorry, I couldn't find weather information for '{city}'. Please check the city name and try again."
-                
+            return self.weather_calls.do(cache_key, lambda: self._fetch_weather(city, cache_key))
+        except CircuitOpenError:
+            return WEATHER_UNAVAILABLE
         except Exception as e:
             logger.error(f"Weather API error: {e}")
-            return "Sorry, I'm having trouble accessing weather information right now."
+            return WEATHER_ERROR
+    
+    def _fetch_weather(self, city: str, cache_key: str) -> str:
+        """Call the weather API (the key goes in the query parameters over HTTPS) and cache good answers"""
+        params = {'q': city, 'appid': Config.WEATHER_API_KEY, 'units': 'metric'}
+        status, data = self.http.get_json(Config.WEATHER_API_URL, params)
+        answer = self._format_weather(city, status, data)
+        
+        # Only successful lookups are cached so typos can be retried right away
+        if status == 200:
+            self._cache_set(cache_key, answer, Config.WEATHER_CACHE_TTL)
+        return answer
+    
+    def _format_weather(self, city: str, status_code: int, data: dict) -> str:
+        """Turn a weather API response into a spoken-style answer"""
+        if status_code == 200:
+            temp = data['main']['temp']
+            description = data['weather'][0]['description']
+            city_name = data['name']
+            country = data['sys']['country']
+            return f"The weather in {city_name}, {country} is {temp}°C with {description}."
+        else:
+            return f"Sorry, I couldn't find weather information for '{city}'. Please check the city name and try again."
     
     def _extract_city_from_query(self, query: str) -> str:
         """Extract city name from weather query"""
@@ -156,43 +387,42 @@ class VirtualAssistant:
         return f"The current time is {now.strftime('%H:%M:%S')} on {now.strftime('%Y-%m-%d')}."
     
     def _calculate(self, query: str) -> str:
-        """Perform basic calculations"""
+        """Perform calculations, unit conversions and percentages (see math_engine)"""
         try:
-            # Extract mathematical expression (basic implementation)
-            # This is a simplified version - in production, use a proper math parser
-            import re
-            
-            # Find numbers and operators
-            expression = re.sub(r'[^\d+\-*/().\s]', '', query)
-            expression = expression.strip()
-            
-            if expression:
-                # Safe evaluation (limited scope)
-                allowed_chars = set('0123456789+-*/(). ')
-                if all(c in allowed_chars for c in expression):
-                    result = eval(expression)
-                    return f"The result is: {result}"
-            
-            return "I couldn't find a valid mathematical expression in your request."
+            # The engine skips filler words, so the whole query can be passed in
+            result = evaluate(query)
+            return f"The result is: {format_number(result)}"
             
+        except NoExpressionError:
+            return NO_EXPRESSION
+        except MathError as e:
+            logger.info(f"Calculation rejected: {e}")
+            return f"Sorry, I couldn't perform that calculation. {e}."
         except Exception as e:
             logger.error(f"Calculation error: {e}")
-            return "Sorry, I couldn't perform that calculation."
+            return CALCULATION_ERROR
     
     def _set_reminder(self, query: str) -> str:
-        """Set a simple reminder (basic implementation)"""
-        # This is a simplified version - in production, integrate with calendar APIs
-        logger.info(f"Reminder requested: {query}")
-        return "I've noted your reminder request. In a full implementation, this would integrate with your calendar system."
+        """Store a reminder and schedule it"""
+        if self.reminders is None:
+            return REMINDERS_UNAVAILABLE
+        
+        text, due_at = parse_reminder(query)
+        if due_at is None:
+            return REMINDER_NEEDS_TIME
+        
+        try:
+            self.reminders.add(text or "Reminder", due_at)
+        except Exception as e:
+            logger.error(f"Reminder error: {e}")
+            return REMINDER_SAVE_FAILED
+        
+        when = due_at.strftime('%H:%M') if due_at.date() == datetime.now().date() else due_at.strftime('%H:%M on %Y-%m-%d')
+        if text:
+            return f"Okay, I'll remind you at {when}: {text}."
+        return f"Okay, I'll remind you at {when}."
     
     def _tell_joke(self) -> str:
         """Tell a random joke"""
-        jokes = [
-            "Why don't scientists trust atoms? Because they make up everything!",
-            "Why did the computer go to the doctor? Because it had a virus!",
-            "Why don't programmers like nature? It has too many bugs!",
-            "What do you call a computer that sings? A-Dell!",
-            "Why do robots never panic? They have nerves of steel!"
-        ]
         import random
-        return random.choice(jokes)
\ No newline at end of file
+        return random.choice(JOKES)
\ No newline at end of file
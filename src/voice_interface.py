@@ -1,41 +1,89 @@
+import importlib.util
 import logging
+import os
+import queue
 import subprocess
 import platform
-import time
-from typing import Optional
+import tempfile
+import threading
+import wave
+from array import array
+from collections import OrderedDict
+from typing import Iterable, Optional
 
 from config.settings import Config
+from audio_capture import spectral_vad_enabled
+from tts_cache import TTSCache
+import telemetry
 
 logger = logging.getLogger(__name__)
 
-# Initialize voice availability flag
-VOICE_AVAILABLE = False
+# Availability is checked without importing, the libraries themselves load in load_voice_modules()
+VOICE_AVAILABLE = importlib.util.find_spec('speech_recognition') is not None
+TTS_AVAILABLE = importlib.util.find_spec('pyttsx3') is not None
+# Cached clips are played directly through PyAudio (imported on first playback)
+PLAYBACK_AVAILABLE = importlib.util.find_spec('pyaudio') is not None
 
-try:
-    import speech_recognition as sr
-    VOICE_AVAILABLE = True
-    logger.info("Speech recognition library loaded successfully")
-except ImportError:
+# Frames written to the output stream at a time; stop_speaking() takes effect between writes
+PLAYBACK_CHUNK = 1024
+# A reply is rendered into the TTS cache the second time it is spoken
+SEEN_TEXTS = 512
+
+if not VOICE_AVAILABLE:
     logger.warning("Speech recognition not installed. Install speech-recognition for voice features.")
-except Exception as e:
-    logger.warning(f"Speech recognition available but failed to initialize: {e}")
 
-# Try to import pyttsx3, but don't make it required
-TTS_AVAILABLE = False
-try:
-    import pyttsx3
-    TTS_AVAILABLE = True
-    logger.info("pyttsx3 TTS library loaded successfully")
-except ImportError:
-    logger.info("pyttsx3 not available, will use system TTS")
-except Exception as e:
-    logger.warning(f"pyttsx3 available but failed to load: {e}")
+sr = None
+pyttsx3 = None
+
+
+def load_voice_modules():
+    """Import the speech libraries on first use (safe to call more than once or from a warm-up thread)"""
+    global sr, pyttsx3, VOICE_AVAILABLE, TTS_AVAILABLE
+    
+    if VOICE_AVAILABLE and sr is None:
+        try:
+            import speech_recognition
+            sr = speech_recognition
+            logger.info("Speech recognition library loaded successfully")
+        except Exception as e:
+            logger.warning(f"Speech recognition available but failed to initialize: {e}")
+            VOICE_AVAILABLE = False
+    
+    # Try to import pyttsx3, but don't make it required
+    if TTS_AVAILABLE and pyttsx3 is None:
+        try:
+            import pyttsx3 as tts_module
+            pyttsx3 = tts_module
+            logger.info("pyttsx3 TTS library loaded successfully")
+        except Exception as e:
+            logger.warning(f"pyttsx3 available but failed to load: {e}")
+            TTS_AVAILABLE = False
+    
+    return VOICE_AVAILABLE
 
 class VoiceInterface:
-    def __init__(self):
-        self.available = VOICE_AVAILABLE
+    def __init__(self, use_microphone: bool = True):
+        """Set up recognition and TTS; use_microphone=False skips the microphone (e.g. for WAV file input)"""
+        self.available = load_voice_modules()
         self.tts_engine = None
         self.use_system_tts = False
+        self.microphone = None
+        
+        # The process or engine currently speaking, so stop_speaking() can cut it off from another thread
+        self._speech_lock = threading.Lock()
+        self._say_process: Optional[subprocess.Popen] = None
+        self._interrupted = threading.Event()
+        # pyttsx3 drives one engine per process; speaking and rendering to file take turns
+        self._engine_lock = threading.Lock()
+        
+        # Rendered speech: played directly, filled in the background (see prerender)
+        self.tts_cache: Optional[TTSCache] = None
+        self._audio_out = None
+        self._render_queue: "queue.Queue[str]" = queue.Queue(maxsize=64)
+        self._render_thread: Optional[threading.Thread] = None
+        self._rendering = threading.Event()
+        self._pending = set()
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
         
         if not self.available:
             logger.warning("Voice libraries not available. Install speech_recognition for voice features.")
@@ -43,7 +91,6 @@ class VoiceInterface:
         
         try:
             self.recognizer = sr.Recognizer()
-            self.microphone = sr.Microphone()
             
             # Try to initialize pyttsx3 TTS
             if TTS_AVAILABLE:
@@ -62,16 +109,23 @@ class VoiceInterface:
             if self.use_system_tts and platform.system() == "Darwin":
                 logger.info("Using macOS system TTS (say command)")
             
-            # Calibrate for ambient noise and adjust settings
-            with self.microphone as source:
-                logger.info("Calibrating for ambient noise...")
-                self.recognizer.adjust_for_ambient_noise(source, duration=1)
+            if PLAYBACK_AVAILABLE and (self.tts_engine or (self.use_system_tts and platform.system() == "Darwin")):
+                self.tts_cache = TTSCache.from_config()
             
             # Adjust recognition settings for better speech capture
             self.recognizer.pause_threshold = Config.VOICE_PAUSE_THRESHOLD  # Seconds of silence before considering phrase complete
-            self.recognizer.energy_threshold = 300  # Minimum audio energy to consider for recording
+            self.recognizer.energy_threshold = Config.VOICE_ENERGY_THRESHOLD  # Minimum audio energy to consider for recording
             self.recognizer.dynamic_energy_threshold = True  # Automatically adjust energy threshold
             
+            if use_microphone:
+                self.microphone = sr.Microphone()
+                # The spectral VAD estimates the noise floor continuously, so the one-second calibration is only
+                # needed for the fixed energy threshold (this raises or lowers energy_threshold)
+                if not spectral_vad_enabled():
+                    with self.microphone as source:
+                        logger.info("Calibrating for ambient noise...")
+                        self.recognizer.adjust_for_ambient_noise(source, duration=1)
+            
             logger.info("Voice interface initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize voice interface: {e}")
@@ -80,7 +134,7 @@ class VoiceInterface:
     
     def listen_for_speech(self, timeout: int = None) -> Optional[str]:
         """Listen for speech input with improved timing"""
-        if not self.available:
+        if not self.available or self.microphone is None:
             return None
         
         # Use config values or provided timeout
@@ -100,14 +154,26 @@ class VoiceInterface:
                 )
             
             print("Processing speech...")
-            # Use Google's speech recognition
-            text = self.recognizer.recognize_google(audio)
-            logger.info(f"Recognized speech: {text}")
-            return text
+            with telemetry.span('stt', backend='google'):
+                return self._recognize_audio_data(audio)
             
         except sr.WaitTimeoutError:
             print("No speech detected within timeout")
             return None
+    
+    def recognize(self, utterance) -> Optional[str]:
+        """Transcribe an audio_capture.Utterance"""
+        if not self.available:
+            return None
+        audio = sr.AudioData(utterance.pcm, utterance.sample_rate, utterance.sample_width)
+        return self._recognize_audio_data(audio)
+    
+    def _recognize_audio_data(self, audio) -> Optional[str]:
+        """Send recorded audio to Google's speech recognition"""
+        try:
+            text = self.recognizer.recognize_google(audio)
+            logger.debug("Recognized speech: %s", text)
+            return text
         except sr.UnknownValueError:
             print("Sorry, I couldn't understand what you said")
             return None
@@ -116,29 +182,179 @@ class VoiceInterface:
             print("Sorry, there was an error with the speech recognition service")
             return None
     
-    def speak(self, text: str):
-        """Convert text to speech"""
+    def speak(self, text: str) -> bool:
+        """Convert text to speech, returning once playback has finished.
+        
+        Returns False if stop_speaking() cut the speech short.
+        """
         if not self.available:
             print(f"Assistant: {text}")
-            return
-            
+            return True
+        
+        with telemetry.span('tts', chars=len(text)) as span:
+            finished = self._speak(text, span)
+            span.set(interrupted=not finished)
+            return finished
+    
+    def _speak(self, text: str, span) -> bool:
+        self._interrupted.clear()
         try:
+            if self.tts_cache is not None:
+                key = self._cache_key(text)
+                try:
+                    played = self._play_cached(key)
+                except Exception as e:
+                    logger.warning(f"Can't play cached speech, disabling the TTS cache: {e}")
+                    self.tts_cache = None
+                else:
+                    span.set(cached=played is not None)
+                    if played is not None:
+                        return played
+                    self._note_spoken(text, key)
+            
             if self.tts_engine:
                 # Use pyttsx3 TTS (synchronous)
-                self.tts_engine.say(text)
-                self.tts_engine.runAndWait()
+                with self._engine_lock:
+                    self.tts_engine.say(text)
+                    self.tts_engine.runAndWait()
                 
             elif self.use_system_tts and platform.system() == "Darwin":
                 # Use macOS built-in say command (synchronous)
-                subprocess.run(['say', text], check=False)
+                process = subprocess.Popen(['say', text])
+                with self._speech_lock:
+                    self._say_process = process
+                process.wait()
+                with self._speech_lock:
+                    self._say_process = None
                 
             else:
                 # Fallback to text output
                 print(f"Assistant: {text}")
             
-            # Small delay to ensure TTS is completely finished
-            time.sleep(0.5)
+            return not self._interrupted.is_set()
             
         except Exception as e:
             logger.error(f"TTS error: {e}")
-            print(f"Assistant: {text}")  # Fallback to text output
\ No newline at end of file
+            print(f"Assistant: {text}")  # Fallback to text output
+            return True
+    
+    def stop_speaking(self):
+        """Interrupt speech in progress (called from another thread, e.g. on barge-in)"""
+        self._interrupted.set()
+        try:
+            if self.tts_engine and not self._rendering.is_set():
+                self.tts_engine.stop()
+            with self._speech_lock:
+                if self._say_process is not None:
+                    self._say_process.terminate()
+        except Exception as e:
+            logger.debug(f"Failed to stop speech: {e}")
+    
+    # -- TTS cache -----------------------------------------------------------
+    
+    def prerender(self, phrases: Iterable[str]):
+        """Render phrases into the TTS cache on a background thread (e.g. fixed replies at startup)"""
+        if self.tts_cache is None:
+            return
+        for text in phrases:
+            if self._cache_key(text) not in self.tts_cache:
+                self._schedule_render(text)
+    
+    def _cache_key(self, text: str) -> str:
+        if self.tts_engine:
+            voice = f"pyttsx3:{self.tts_engine.getProperty('voice')}"
+        else:
+            voice = 'say'
+        return TTSCache.key(text, voice, Config.VOICE_RATE, Config.VOICE_VOLUME)
+    
+    def _note_spoken(self, text: str, key: str):
+        """Remember a cache miss; render the text once it has been spoken twice"""
+        if key in self._seen:
+            del self._seen[key]
+            self._schedule_render(text)
+            return
+        self._seen[key] = None
+        if len(self._seen) > SEEN_TEXTS:
+            self._seen.popitem(last=False)
+    
+    def _schedule_render(self, text: str):
+        if text in self._pending:
+            return
+        try:
+            self._render_queue.put_nowait(text)
+        except queue.Full:
+            return
+        self._pending.add(text)
+        if self._render_thread is None:
+            self._render_thread = threading.Thread(target=self._render_worker, name='tts-render', daemon=True)
+            self._render_thread.start()
+    
+    def _render_worker(self):
+        while True:
+            text = self._render_queue.get()
+            cache = self.tts_cache
+            try:
+                key = self._cache_key(text)
+                if cache is not None and key not in cache:
+                    rendered = self._render(text)
+                    if rendered is not None:
+                        cache.put(key, *rendered)
+            except Exception as e:
+                logger.warning(f"Failed to render speech for the TTS cache: {e}")
+            finally:
+                self._pending.discard(text)
+    
+    def _render(self, text: str):
+        """Synthesize text to (16-bit mono PCM, sample rate) without playing it"""
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            if self.tts_engine:
+                with self._engine_lock:
+                    self._rendering.set()
+                    try:
+                        self.tts_engine.save_to_file(text, path)
+                        self.tts_engine.runAndWait()
+                    finally:
+                        self._rendering.clear()
+            else:
+                subprocess.run(['say', '-o', path, '--data-format=LEI16@22050', text], check=True,
+                               capture_output=True)
+            
+            try:
+                wav = wave.open(path, 'rb')
+            except (wave.Error, EOFError) as e:
+                logger.debug(f"Not caching speech the engine didn't render as WAV: {e}")
+                return None
+            with wav:
+                if wav.getsampwidth() != 2:
+                    logger.debug(f"Not caching {wav.getsampwidth() * 8}-bit speech")
+                    return None
+                pcm = wav.readframes(wav.getnframes())
+                if wav.getnchannels() > 1:
+                    pcm = array('h', pcm)[::wav.getnchannels()].tobytes()
+                return (pcm, wav.getframerate()) if pcm else None
+        finally:
+            os.remove(path)
+    
+    def _play_cached(self, key: str) -> Optional[bool]:
+        """Play a cached clip; None if it isn't cached, otherwise whether it played to the end"""
+        clip = self.tts_cache.get(key)
+        if clip is None:
+            return None
+        pcm, sample_rate = clip
+        
+        import pyaudio
+        if self._audio_out is None:
+            self._audio_out = pyaudio.PyAudio()
+        stream = self._audio_out.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, output=True)
+        try:
+            step = PLAYBACK_CHUNK * 2
+            for offset in range(0, len(pcm), step):
+                if self._interrupted.is_set():
+                    return False
+                stream.write(pcm[offset:offset + step])
+        finally:
+            stream.stop_stream()
+            stream.close()
+        return not self._interrupted.is_set()
@@ -0,0 +1,326 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from config.settings import Config
+from audio_capture import create_segmenter
+from stt_backends import SpeechRecognizer, Transcription, create_recognizer
+from virtual_assistant import chunk_sentences
+
+logger = logging.getLogger(__name__)
+
+STOP_PHRASES = ('stop listening', 'text mode')
+EXIT_PHRASES = ('goodbye', 'quit', 'exit')
+GOODBYE = "Goodbye! Have a great day!"
+
+# How often blocked stages check whether the pipeline was stopped
+POLL_INTERVAL = 0.1
+
+
+@dataclass
+class _AudioEvent:
+    kind: str  # 'start', 'audio', 'end' or 'cancel'
+    segment: int
+    pcm: bytes = b''
+    loud: bool = False
+    at: float = 0.0  # time.monotonic() at capture
+
+
+@dataclass
+class _Transcript:
+    text: str
+    ended_at: float  # when the user stopped speaking
+
+
+@dataclass
+class _Sentence:
+    epoch: int
+    text: Optional[str]
+    ended_at: Optional[float] = None
+    last: bool = False  # end of this turn
+    then: Optional[str] = None  # stop the pipeline with this outcome after playing
+
+
+class VoicePipeline:
+    """Voice conversation loop split into four overlapping stages.
+
+    capture -> recognition -> generation -> playback each run on their own
+    thread, joined by bounded queues, so the next sentence is generated while
+    the current one is spoken and the microphone keeps listening throughout.
+
+    Speech that lasts VOICE_BARGE_IN_MIN_SPEECH seconds while the assistant is
+    answering counts as barge-in: playback stops, queued sentences are dropped
+    and generation of the interrupted answer is abandoned. Every queued item
+    carries the epoch it belongs to, and barge-in starts a new epoch, which
+    is how stale work is recognized in each stage.
+
+    Capture streams each utterance's audio to the recognition stage chunk by
+    chunk. A streaming recognizer decodes it as it arrives, and once its
+    partial hypothesis is stable over STT_EARLY_ENDPOINT seconds of quiet the
+    utterance is finalized and capture is told to cut it there.
+
+    The source is anything with chunks(), close(), sample_rate, sample_width
+    and chunk_size, such as audio_capture.MicrophoneSource or WavFileSource.
+    """
+
+    def __init__(self, assistant, voice, source, recognizer: Optional[SpeechRecognizer] = None,
+                 energy_threshold: Optional[float] = None, barge_in: Optional[bool] = None,
+                 display: Callable[[str], None] = print, on_partial: Optional[Callable[[str], None]] = None):
+        self.assistant = assistant
+        self.voice = voice
+        self.source = source
+        self.recognizer = recognizer or create_recognizer(voice)
+        self.on_partial = on_partial
+        self.barge_in_enabled = Config.VOICE_BARGE_IN if barge_in is None else barge_in
+        self.display = display
+
+        # energy_threshold only applies to VAD_BACKEND=energy; the spectral VAD tracks the noise floor itself
+        self.segmenter = create_segmenter(source.sample_rate, source.sample_width, source.chunk_size,
+                                          energy_threshold)
+
+        # Audio events are per chunk, so this queue holds several seconds of audio
+        self.audio: "queue.Queue[Optional[_AudioEvent]]" = queue.Queue(maxsize=256)
+        self.transcripts: "queue.Queue[Optional[_Transcript]]" = queue.Queue(maxsize=4)
+        self.playback: "queue.Queue[Optional[_Sentence]]" = queue.Queue(maxsize=8)
+
+        self._epoch = 0
+        self._segment = 0  # id of the utterance being captured
+        self._cut_segment = -1  # set by recognition when it has endpointed an utterance early
+        self._responding = threading.Event()  # set from the start of an answer until its last sentence is played
+        self._stopped = threading.Event()
+        self.outcome: Optional[str] = None
+
+        # Seconds from the end of the user's speech to the first spoken sentence, per turn
+        self.latencies: List[float] = []
+
+    def run(self) -> str:
+        """Run until a stage stops the pipeline.
+
+        Returns 'text' (switch to text mode), 'exit' (user said goodbye),
+        'end-of-input' (the source ran out), 'interrupted' or 'error'.
+        """
+        threads = [
+            threading.Thread(target=self._stage, args=(name, target), name=f'voice-{name}', daemon=True)
+            for name, target in (('capture', self._capture), ('recognition', self._recognition),
+                                 ('generation', self._generation), ('playback', self._playback))
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while not self._stopped.wait(timeout=POLL_INTERVAL):
+                pass
+        except KeyboardInterrupt:
+            self.stop('interrupted')
+
+        for thread in threads:
+            thread.join(timeout=2)
+        return self.outcome
+
+    def stop(self, outcome: str):
+        """Stop all stages; the first outcome wins"""
+        if self.outcome is None:
+            self.outcome = outcome
+        self._stopped.set()
+        self.source.close()
+        self.voice.stop_speaking()
+
+    def say(self, text: str):
+        """Speak a message outside a turn (e.g. a reminder) after what is already queued"""
+        self._responding.set()
+        self._put(self.playback, _Sentence(self._epoch, text, last=True))
+
+    def barge_in(self):
+        """Cut off the current answer"""
+        self._epoch += 1
+        self._responding.clear()
+        self.voice.stop_speaking()
+        while True:
+            try:
+                self.playback.get_nowait()
+            except queue.Empty:
+                break
+        logger.info("Barge-in: stopped speaking")
+
+    # -- helpers -------------------------------------------------------------
+
+    def _stage(self, name: str, target: Callable[[], None]):
+        try:
+            target()
+        except Exception as e:
+            logger.error(f"Voice {name} stage failed: {e}")
+            self.stop('error')
+
+    def _get(self, source_queue: queue.Queue):
+        """Next item, or None once the pipeline is stopped"""
+        while not self._stopped.is_set():
+            try:
+                return source_queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    def _put(self, target_queue: queue.Queue, item) -> bool:
+        """Put an item, waiting for room unless the pipeline is stopped"""
+        while not self._stopped.is_set():
+            try:
+                target_queue.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # -- stages --------------------------------------------------------------
+
+    def _capture(self):
+        barged = False
+        for chunk in self.source.chunks():
+            if self._stopped.is_set():
+                return
+            now = time.monotonic()
+
+            responding = self._responding.is_set()
+            if responding and not self.barge_in_enabled:
+                # Don't record the assistant's own voice
+                if self.segmenter.in_speech:
+                    self.segmenter.reset()
+                    self._put(self.audio, _AudioEvent('cancel', self._segment))
+                continue
+
+            if self._cut_segment == self._segment and self.segmenter.in_speech:
+                # The recognizer already has the whole utterance
+                self.segmenter.cut()
+                self._put(self.audio, _AudioEvent('end', self._segment, at=now))
+
+            # While the assistant talks, only clearly louder speech counts
+            self.segmenter.threshold_scale = Config.VOICE_BARGE_IN_FACTOR if responding else 1.0
+            was_in_speech = self.segmenter.in_speech
+            started, utterance = self.segmenter.process(chunk)
+
+            if started:
+                barged = False
+                self._segment += 1
+                self._put(self.audio, _AudioEvent('start', self._segment, at=now))
+                pieces = self.segmenter.speech_chunks
+                for piece in pieces[:-1]:
+                    self._put(self.audio, _AudioEvent('audio', self._segment, piece, False, now))
+                self._put(self.audio, _AudioEvent('audio', self._segment, pieces[-1], True, now))
+            elif was_in_speech:
+                self._put(self.audio, _AudioEvent('audio', self._segment, chunk, self.segmenter.last_loud, now))
+                if utterance is not None:
+                    self._put(self.audio, _AudioEvent('end', self._segment, at=now))
+                elif not self.segmenter.in_speech:
+                    self._put(self.audio, _AudioEvent('cancel', self._segment))  # too short to be speech
+
+            if (responding and not barged and self.segmenter.in_speech
+                    and self.segmenter.speech_duration >= Config.VOICE_BARGE_IN_MIN_SPEECH):
+                barged = True
+                self.barge_in()
+
+        self._put(self.audio, None)
+
+    def _recognition(self):
+        chunk_seconds = self.source.chunk_size / self.source.sample_rate
+        transcription = None
+        segment = -1
+        while True:
+            event = self._get(self.audio)
+            if event is None:
+                break
+
+            if event.kind == 'start':
+                transcription = Transcription(self.recognizer, self.source.sample_rate, self.source.sample_width,
+                                              chunk_seconds)
+                segment = event.segment
+                last_partial = None
+                last_loud_at = event.at
+                continue
+            if transcription is None or event.segment != segment:
+                continue  # already finalized or cancelled
+
+            if event.kind == 'audio':
+                if event.loud:
+                    last_loud_at = event.at
+                settled = transcription.feed(event.pcm, event.loud)
+                if transcription.partial and transcription.partial != last_partial and self.on_partial:
+                    self.on_partial(transcription.partial)
+                last_partial = transcription.partial
+                if not settled:
+                    continue
+                self._cut_segment = segment
+            elif event.kind == 'cancel':
+                transcription = None
+                continue
+
+            # End of the utterance: either the pause was long enough or the hypothesis settled
+            text, transcription = transcription.finish(), None
+            if text:
+                self.display(f"You said: {text}")
+                self._put(self.transcripts, _Transcript(text, last_loud_at))
+        self._put(self.transcripts, None)
+
+    def _generation(self):
+        while True:
+            transcript = self._get(self.transcripts)
+            if transcript is None:
+                break
+
+            lowered = transcript.text.lower()
+            if any(phrase in lowered for phrase in STOP_PHRASES):
+                self.display("Switching to text mode...")
+                self.stop('text')
+                return
+
+            epoch = self._epoch
+            self._responding.set()
+
+            if any(phrase in lowered for phrase in EXIT_PHRASES):
+                self._put(self.playback, _Sentence(epoch, GOODBYE, transcript.ended_at, last=True, then='exit'))
+                continue
+
+            if Config.STREAM_RESPONSES:
+                stream = self.assistant.process_text_input_stream(transcript.text)
+            else:
+                stream = iter([self.assistant.process_text_input(transcript.text)])
+            try:
+                for sentence in chunk_sentences(stream):
+                    if epoch != self._epoch:
+                        break  # barged in; stop generating the old answer
+                    self._put(self.playback, _Sentence(epoch, sentence, transcript.ended_at))
+            finally:
+                if hasattr(stream, 'close'):
+                    stream.close()
+
+            self._put(self.playback, _Sentence(epoch, None, last=True))
+
+        self._put(self.playback, None)
+
+    def _playback(self):
+        first_in_turn = True
+        while True:
+            item = self._get(self.playback)
+            if item is None:
+                if not self._stopped.is_set():
+                    self.stop('end-of-input')
+                return
+            if item.epoch != self._epoch:
+                first_in_turn = True
+                continue
+
+            if item.text:
+                if first_in_turn and item.ended_at is not None:
+                    self.latencies.append(time.monotonic() - item.ended_at)
+                first_in_turn = False
+                self.display(f"{Config.ASSISTANT_NAME}: {item.text}")
+                self.voice.speak(item.text)
+
+            if item.last and item.epoch == self._epoch:
+                first_in_turn = True
+                self._responding.clear()
+                if item.then:
+                    self.stop(item.then)
+                    return
+                self.display("🎤 Ready to listen again...")
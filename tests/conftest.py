@@ -0,0 +1,18 @@
+import os
+import sys
+from pathlib import Path
+
+# Answer from the built-in fake backend and keep every optional service off, before Config is imported
+os.environ.update({
+    'LLM_BACKEND': 'fake',
+    'LLM_FAST_BACKEND': '',
+    'FAKE_LLM_LATENCY': '0',
+    'CACHE_ENABLED': 'false',
+    'SEMANTIC_CACHE_ENABLED': 'false',
+    'REMINDERS_ENABLED': 'false',
+    'SESSION_STORE': 'memory',
+    'TRACE_FILE': '',
+})
+
+ROOT = Path(__file__).parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / 'src'), str(ROOT / 'bench')]
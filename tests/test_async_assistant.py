@@ -0,0 +1,41 @@
+import asyncio
+
+from async_assistant import AsyncVirtualAssistant
+from config.settings import Config
+from virtual_assistant import REMINDERS_UNAVAILABLE
+
+
+def run_with_assistant(scenario):
+    async def run():
+        assistant = AsyncVirtualAssistant()
+        try:
+            return await scenario(assistant)
+        finally:
+            await assistant.close()
+    return asyncio.run(run())
+
+
+def test_server_sessions_are_not_offered_reminders(monkeypatch):
+    monkeypatch.setattr(Config, 'REMINDERS_ENABLED', True)
+
+    async def scenario(assistant):
+        assert assistant.reminders is None
+        return await assistant.process_text_input_async('remind me to stretch in 10 minutes', 's')
+
+    assert run_with_assistant(scenario) == REMINDERS_UNAVAILABLE
+
+
+def test_closing_a_stream_early_keeps_the_partial_reply():
+    async def scenario(assistant):
+        stream = assistant.process_text_input_stream_async('tell me a long story', 's')
+        first = [await stream.__anext__(), await stream.__anext__()]
+        await stream.aclose()
+        assert not assistant.session_locks['s'].locked()
+
+        # A fresh memory picks the turn up from the session store
+        stored = assistant.session_store.load('s', assistant.new_memory())
+        return first, stored.prompt_messages()
+
+    first, messages = run_with_assistant(scenario)
+    assert messages[-2] == {'role': 'user', 'content': 'tell me a long story'}
+    assert messages[-1] == {'role': 'assistant', 'content': ''.join(first).strip()}
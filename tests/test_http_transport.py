@@ -0,0 +1,82 @@
+import asyncio
+
+import aiohttp
+import httpx
+import openai
+import pytest
+import requests
+
+from http_transport import CircuitBreaker, RetryableStatusError, is_provider_failure
+from llm_backends import FakeBackend
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+NETWORK_ERRORS = [
+    ConnectionResetError(),
+    TimeoutError(),
+    asyncio.TimeoutError(),
+    requests.ConnectionError(),
+    requests.ReadTimeout(),
+    aiohttp.ServerDisconnectedError(),
+    aiohttp.ClientPayloadError('truncated'),
+    httpx.ConnectError('refused'),
+    httpx.ReadTimeout('slow'),
+    openai.APIConnectionError(request=httpx.Request('POST', 'http://llm')),
+    openai.APITimeoutError(request=httpx.Request('POST', 'http://llm')),
+    RetryableStatusError(503),
+    StatusError(429),
+    StatusError(500),
+]
+
+OTHER_ERRORS = [
+    TypeError('bad argument'),
+    KeyError('choices'),
+    ValueError('not JSON'),
+    FileNotFoundError('prompts.yaml'),
+    requests.exceptions.InvalidURL(),
+    StatusError(400),
+    StatusError(404),
+]
+
+
+@pytest.mark.parametrize('error', NETWORK_ERRORS, ids=lambda e: type(e).__name__)
+def test_network_errors_are_provider_failures(error):
+    assert is_provider_failure(error)
+
+
+@pytest.mark.parametrize('error', OTHER_ERRORS, ids=lambda e: type(e).__name__)
+def test_other_errors_are_not_provider_failures(error):
+    assert not is_provider_failure(error)
+
+
+def failing_backend(error: Exception) -> FakeBackend:
+    backend = FakeBackend()
+    backend.breaker = CircuitBreaker('fake', failure_threshold=2, reset_timeout=60)
+
+    def complete(*args):
+        raise error
+    backend._complete = complete
+    return backend
+
+
+@pytest.mark.parametrize('error', [TypeError('bad argument'), KeyError('choices')], ids=lambda e: type(e).__name__)
+def test_non_network_errors_leave_the_breaker_closed(error):
+    backend = failing_backend(error)
+    for _ in range(3):
+        with pytest.raises(type(error)):
+            backend.complete([{'role': 'user', 'content': 'hi'}])
+    assert backend.breaker.state == 'closed'
+    assert backend.breaker.failures == 0
+
+
+def test_connection_errors_open_the_breaker():
+    backend = failing_backend(ConnectionRefusedError())
+    for _ in range(2):
+        with pytest.raises(ConnectionRefusedError):
+            backend.complete([{'role': 'user', 'content': 'hi'}])
+    assert backend.breaker.state == 'open'
@@ -0,0 +1,25 @@
+import math
+
+import pytest
+
+from math_engine import MathError, evaluate
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('calculate 15 + 27', 42),
+    ('what is fifteen plus twenty seven', 42),
+    ("what's 20% of 150", 30),
+    ('can you do some math: 7 * 8', 56),
+    ('convert 5 km in miles', 5 / 1.609344),
+    ('2 pi', 2 * math.pi),
+    ('2(3 + 4)', 14),
+    ('3 sqrt(4)', 6),
+])
+def test_evaluate(text, expected):
+    assert evaluate(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('text', ['factorial 5', '5 factorial', 'factorial(5)', '2 apples plus 3 apples'])
+def test_unknown_words_next_to_values_are_rejected(text):
+    with pytest.raises(MathError, match='Unknown word'):
+        evaluate(text)
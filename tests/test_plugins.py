@@ -0,0 +1,33 @@
+import pytest
+
+from plugins import CapabilityRegistry
+
+
+@pytest.fixture(scope='module')
+def registry():
+    return CapabilityRegistry()
+
+
+def planned(registry, text):
+    return [(call.capability.name, call.kwargs.get('city')) for call in registry.plan(text, registry.route(text))]
+
+
+def test_bare_place_names_are_separate_weather_requests(registry):
+    assert planned(registry, "weather in Paris and London, and the time") == [
+        ('weather', 'Paris'), ('weather', 'London'), ('time', None)]
+    assert planned(registry, "weather in Tokyo and Oslo and Lima") == [
+        ('weather', 'Tokyo'), ('weather', 'Oslo'), ('weather', 'Lima')]
+
+
+@pytest.mark.parametrize('text, city', [
+    ("what's the weather in Bosnia and Herzegovina", 'Bosnia and Herzegovina'),
+    ("weather in Trinidad and Tobago today", 'Trinidad and Tobago'),
+])
+def test_place_names_with_and_stay_whole(registry, text, city):
+    assert planned(registry, text) == [('weather', city)]
+
+
+def test_clauses_that_are_not_requests_stay_with_the_last_one(registry):
+    assert planned(registry, "weather in Rome, thanks and the time") == [('weather', 'Rome'), ('time', None)]
+    assert planned(registry, "remind me to buy milk and eggs in 10 minutes") == [('reminder', None)]
+    assert planned(registry, "weather in Rome and is it raining") == [('weather', 'Rome')]
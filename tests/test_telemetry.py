@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+import telemetry
+from async_assistant import AsyncVirtualAssistant
+from virtual_assistant import TROUBLE_REPLY, VirtualAssistant
+
+
+@pytest.fixture
+def telemetry_disabled(monkeypatch):
+    monkeypatch.setattr(telemetry, '_tracer', telemetry.Tracer(telemetry.REGISTRY, enabled=False))
+
+
+def test_noop_span_has_the_span_interface(telemetry_disabled):
+    with telemetry.span('turn') as span:
+        span.set(a=1)
+        span.payload('input', 'hi')
+        assert span.elapsed_ms() == 0.0
+
+
+def test_turns_answer_with_telemetry_disabled(telemetry_disabled):
+    assistant = VirtualAssistant()
+    history = assistant.new_memory()
+    assert assistant.process_text_input('tell me about owls', history) != TROUBLE_REPLY
+    streamed = ''.join(assistant.process_text_input_stream('and about bats', history))
+    assert streamed and streamed != TROUBLE_REPLY
+
+
+def test_async_turns_answer_with_telemetry_disabled(telemetry_disabled):
+    async def run():
+        assistant = AsyncVirtualAssistant()
+        try:
+            reply = await assistant.process_text_input_async('tell me about owls', 's')
+            streamed = ''.join([token async for token in assistant.process_text_input_stream_async('and bats', 's')])
+        finally:
+            await assistant.close()
+        return reply, streamed
+
+    reply, streamed = asyncio.run(run())
+    assert reply != TROUBLE_REPLY
+    assert streamed and streamed != TROUBLE_REPLY